@@ -1,5 +1,5 @@
-# Import the OpenAI chat model wrapper from LangChain
-from langchain_openai import ChatOpenAI
+# Import functools to build the agent once, on first use
+from functools import cache
 
 # Import utilities to load environment variables from a `.env` file
 from dotenv import load_dotenv
@@ -11,41 +11,86 @@ from typing import TypedDict, Annotated
 # Import LangGraph classes and helpers
 from langgraph.graph import StateGraph, END, add_messages
 
+# Import the router that picks a model for each turn
+from model_router import LARGE, ROUTER_SMALL_MODEL, SMALL, ModelRouter
+
+# Import the resilience layer that bounds, retries and falls back LLM calls
+from llm_resilience import LLM_FALLBACK, LLM_TIMEOUT, LLMResilience
+
 # ✅ Load environment variables (like OPENAI_API_KEY) from a .env file
 load_dotenv()
 
 # Set the desired OpenAI model
 openai_api_model = "gpt-4-turbo"
 
-# ✅ Initialize the OpenAI language model
-llm = ChatOpenAI(model=openai_api_model)
+# ✅ The OpenAI language models are created on first use, not at import
+# Importing langchain_openai and building the clients is the slowest part of starting up,
+# so importing this module stays fast (benchmarks may also put stand-in models here)
+llm = None  # Large model, for turns that need it
+small_llm = None  # Small, fast and cheap model, for simple turns
+
+def get_llm(route: str = LARGE):
+    global llm, small_llm
+    from langchain_openai import ChatOpenAI  # Imported here: it is slow to import
+    if route == LARGE:
+        if llm is None:
+            llm = ChatOpenAI(model=openai_api_model, timeout=LLM_TIMEOUT, max_retries=0)
+        return llm
+    if small_llm is None:
+        small_llm = ChatOpenAI(model=ROUTER_SMALL_MODEL, timeout=LLM_TIMEOUT, max_retries=0)
+    return small_llm
+
+# ✅ Every LLM call goes through the resilience layer (LLM_* variables, see llm_resilience.py)
+# It gives up after a deadline, retries errors like timeouts and rate limits after a random
+# pause, and when the chosen model keeps failing, asks the other model instead
+# (the clients above don't retry themselves, so retries are not multiplied)
+llm_resilience = LLMResilience()
+
+def fallback_llm(route: str):
+    return get_llm(SMALL if route == LARGE else LARGE) if LLM_FALLBACK else None
 
 # ✅ Define the structure of the chat state using a TypedDict
 # `messages` holds the conversation history
 # `add_messages` is a LangGraph helper to track message updates
 class BasicChatState(TypedDict):
     messages: Annotated[list, add_messages]
+    route: str  # Model chosen by the router for the current turn
+
+# ✅ Define the router node
+# It looks at the latest message and the history size and picks the small or the large model
+# (the rules are configured with the ROUTER_* environment variables, see model_router.py)
+model_router = ModelRouter()
+
+def router(state: BasicChatState):
+    return {"route": model_router.route(state["messages"]).route}
 
 # ✅ Define the core chatbot node function
 # It receives the current state, calls the LLM with the message history,
 # and returns the updated list of messages (including the assistant's response)
 def chatbot(state: BasicChatState):
+    route = state.get("route", LARGE)
     return {
-        "messages": [llm.invoke(state["messages"])]
+        "messages": [llm_resilience.invoke(get_llm(route), state["messages"], fallback=fallback_llm(route))]
     }
 
 # ✅ Create the LangGraph and define nodes and transitions
 graph = StateGraph(BasicChatState)
 
-# Add the chatbot function as a graph node
+# Add the router and the chatbot functions as graph nodes
+graph.add_node("router", router)
 graph.add_node("chatbot", chatbot)
 
+# The router runs first and hands over to the chatbot
+graph.add_edge("router", "chatbot")
+
 # Define that after the chatbot node finishes, the graph should end
 graph.add_edge("chatbot", END)
 
-# Set the chatbot node as the starting point of the graph
-graph.set_entry_point("chatbot")
+# Set the router node as the starting point of the graph
+graph.set_entry_point("router")
 
-# ✅ Compile the graph into a runnable chat agent
+# ✅ Compile the graph into a runnable chat agent, once, when it is first needed
 # This produces an executable agent that can be called with input state
-chat_agent = graph.compile()  # 🔧 Fixed typo: 'Compile()' → 'compile()'
+@cache
+def get_chat_agent():
+    return graph.compile()
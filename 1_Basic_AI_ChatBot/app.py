@@ -2,7 +2,15 @@
 import streamlit as st  # Streamlit is used to build interactive web UIs
 from dataclasses import dataclass  # Provides a decorator and functions for creating data classes
 from langchain.schema import HumanMessage  # Represents user message input for the LangChain agent
-from agent import chat_agent  # Import the pre-compiled LangGraph chat agent from a local module
+from agent import get_chat_agent  # Builds the LangGraph chat agent (defined in a local module) on first use
+import logging  # Logs per-turn latency
+import time  # High-resolution timer for latency measurement
+from collections import deque  # Bounded buffer of recent latency samples
+from statistics import median  # p50 of the recent latency samples
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
 # Define a simple data structure for storing chat messages
 @dataclass
@@ -15,6 +23,42 @@ USER = "user"
 ASSISTANT = "ai"
 MESSAGES = "messages"
 
+# ✅ Build the chat agent on the first request instead of at import, once per process
+# Shared by every session and kept across reruns
+@st.cache_resource
+def load_chat_agent():
+    return get_chat_agent()
+
+# ✅ Rolling latency samples shared by every session served by this process
+# Time-to-first-token and total turn latency are tracked separately
+LATENCY_WINDOW = 500
+
+@st.cache_resource
+def get_latency_samples():
+    return {"ttft": deque(maxlen=LATENCY_WINDOW), "total": deque(maxlen=LATENCY_WINDOW)}
+
+def record_latency(metric: str, seconds: float):
+    samples = get_latency_samples()[metric]
+    samples.append(seconds)
+    logger.info("%s: %.3fs (p50 over last %d turns: %.3fs)", metric, seconds, len(samples), median(samples))
+
+# ✅ Stream the assistant's reply token by token from the "chatbot" node
+# Message-level streaming yields LLM tokens as they are generated,
+# instead of waiting for the whole completion to return
+def stream_response(prompt: str, config: dict | None = None):
+    start = time.perf_counter()
+    first_token = True
+    for chunk, metadata in load_chat_agent().stream({
+        "messages": [HumanMessage(content=prompt)]
+    }, config=config, stream_mode="messages"):
+        if metadata.get("langgraph_node") != "chatbot" or not chunk.content:
+            continue
+        if first_token:
+            record_latency("ttft", time.perf_counter() - start)
+            first_token = False
+        yield chunk.content
+    record_latency("total", time.perf_counter() - start)
+
 # ✅ Set Streamlit page title and icon
 st.set_page_config(page_title="AI Chatbot", page_icon="🤖")
 
@@ -38,12 +82,6 @@ if prompt := st.chat_input("Type your message..."):
     st.session_state[MESSAGES].append(Message(actor=USER, payload=prompt))
     st.chat_message(USER).write(prompt)
 
-    # Call the backend chat agent with the user input wrapped in a HumanMessage
-    result = chat_agent.invoke({
-        "messages": [HumanMessage(content=prompt)]
-    })
-
-    # Extract assistant response from result and display it
-    response: str = result["messages"][-1].content
+    # Stream the assistant response into the chat as tokens arrive, then keep it in the history
+    response: str = st.chat_message(ASSISTANT).write_stream(stream_response(prompt))
     st.session_state[MESSAGES].append(Message(actor=ASSISTANT, payload=response))
-    st.chat_message(ASSISTANT).write(response)
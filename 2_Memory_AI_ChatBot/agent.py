@@ -1,8 +1,10 @@
 # Import necessary modules and classes
+from functools import cache  # For building the agent once, on first use
 from typing import TypedDict, Annotated  # For defining structured state with type annotations
 from langgraph.graph import StateGraph, END, add_messages  # For creating and managing LangGraph state machines
-from langgraph.checkpoint.memory import MemorySaver  # For in-memory checkpointing (no disk persistence)
-from langchain_openai import ChatOpenAI  # OpenAI LLM wrapper for LangChain
+from bounded_memory import BoundedMemorySaver  # For in-memory checkpointing with bounded size (no disk persistence)
+from model_router import LARGE, ROUTER_SMALL_MODEL, SMALL, ModelRouter  # For picking a model for each turn
+from llm_resilience import LLM_FALLBACK, LLM_TIMEOUT, LLMResilience  # For deadlines, retries and fallback of LLM calls
 from dotenv import load_dotenv  # To load environment variables from a .env file
 from os import getenv  # For accessing environment variables
 
@@ -12,35 +14,74 @@ load_dotenv()
 # Define the model to use; gpt-4-turbo is more efficient and cheaper than regular GPT-4
 openai_api_model = "gpt-4-turbo"
 
-# Initialize the OpenAI language model with the specified model name
-llm = ChatOpenAI(model=openai_api_model)
+# The OpenAI language models are created on first use, not at import
+# Importing langchain_openai and building the clients is the slowest part of starting up,
+# so importing this module stays fast (benchmarks may also put stand-in models here)
+llm = None  # Large model, for turns that need it
+small_llm = None  # Small, fast and cheap model, for simple turns
+
+def get_llm(route: str = LARGE):
+    global llm, small_llm
+    from langchain_openai import ChatOpenAI  # OpenAI LLM wrapper for LangChain, slow to import
+    if route == LARGE:
+        if llm is None:
+            llm = ChatOpenAI(model=openai_api_model, timeout=LLM_TIMEOUT, max_retries=0)
+        return llm
+    if small_llm is None:
+        small_llm = ChatOpenAI(model=ROUTER_SMALL_MODEL, timeout=LLM_TIMEOUT, max_retries=0)
+    return small_llm
+
+# Every LLM call goes through the resilience layer (LLM_* variables, see llm_resilience.py):
+# it gives up after a deadline, retries transient errors with a random backoff, and asks the
+# other model when the chosen one keeps failing (the clients above don't retry on their own)
+llm_resilience = LLMResilience()
+
+def fallback_llm(route: str):
+    return get_llm(SMALL if route == LARGE else LARGE) if LLM_FALLBACK else None
 
 # Initialize a memory-based checkpoint system (does not persist data between sessions)
-memory = MemorySaver()
+# Only the latest checkpoint of each thread is kept, and idle or least recently used
+# threads are evicted (see MEMORY_MAX_THREADS, MEMORY_MAX_BYTES and MEMORY_IDLE_TTL)
+memory = BoundedMemorySaver()
 
 # Define the shape of the chat state using TypedDict
 # The `messages` key will hold a list of messages, and `add_messages` will help LangGraph track changes
 class BasicChatState(TypedDict):
     messages: Annotated[list, add_messages]
+    route: str  # Model chosen by the router for the current turn
+
+# Define the router function (LangGraph node)
+# It picks the small or the large model from the latest message and the history size
+# (rules configured with the ROUTER_* environment variables, see model_router.py)
+model_router = ModelRouter()
+
+def router(state: BasicChatState):
+    return {"route": model_router.route(state["messages"]).route}
 
 # Define the main chatbot function (LangGraph node)
 # It takes in the current state and returns the updated messages after LLM invocation
 def chatbot(state: BasicChatState):
+    route = state.get("route", LARGE)
     return {
-        "messages": [llm.invoke(state["messages"])]  # Generate response based on current conversation
+        "messages": [llm_resilience.invoke(get_llm(route), state["messages"], fallback=fallback_llm(route))]  # Generate response based on current conversation
     }
 
 # Create a stateful graph using LangGraph to represent the chat flow
 graph = StateGraph(BasicChatState)
 
-# Add a single node named "chatbot" that runs the chatbot function
+# Add a "router" node that picks the model, followed by the "chatbot" node that runs it
+graph.add_node("router", router)
 graph.add_node("chatbot", chatbot)
+graph.add_edge("router", "chatbot")
 
 # Define that after "chatbot" node runs, the graph ends (no further transitions)
 graph.add_edge("chatbot", END)
 
-# Set the entry point of the graph to the "chatbot" node
-graph.set_entry_point("chatbot")
+# Set the entry point of the graph to the "router" node
+graph.set_entry_point("router")
 
 # Compile the graph into a runnable agent, providing the in-memory checkpointing mechanism
-chat_agent = graph.compile(checkpointer=memory)
+# Compiled once, when the agent is first needed
+@cache
+def get_chat_agent():
+    return graph.compile(checkpointer=memory)
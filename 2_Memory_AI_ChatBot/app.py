@@ -1,25 +1,61 @@
 # Import Streamlit for building the web UI
 import streamlit as st
 
-# Import dataclass for structured message handling
-from dataclasses import dataclass
-
 # Import HumanMessage schema from LangChain to wrap user input
 from langchain.schema import HumanMessage
 
-# Import the compiled LangGraph agent (defined in agent.py)
-from agent import chat_agent
+# Import the compiled LangGraph agent and its checkpointer (defined in agent.py)
+from agent import get_chat_agent, memory
+
+# Import the chat history helpers (history is read from the checkpointer, one page at a time)
+from chat_history import ASSISTANT, USER, render_history
+
+# Import helpers for measuring and logging per-turn latency
+import logging
+import time
+import uuid
+from collections import deque
+from statistics import median
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ✅ Build the chat agent on the first request instead of at import, once per process
+# Shared by every session and kept across reruns
+@st.cache_resource
+def load_chat_agent():
+    return get_chat_agent()
+
+# ✅ Rolling latency samples shared by every session served by this process
+# Time-to-first-token and total turn latency are tracked separately
+LATENCY_WINDOW = 500
 
-# Define a message structure to track who sent what
-@dataclass
-class Message:
-    actor: str  # Either "user" or "ai"
-    payload: str  # Text content of the message
+@st.cache_resource
+def get_latency_samples():
+    return {"ttft": deque(maxlen=LATENCY_WINDOW), "total": deque(maxlen=LATENCY_WINDOW)}
 
-# Constants to represent user and assistant actors
-USER = "user"
-ASSISTANT = "ai"
-MESSAGES = "messages"
+def record_latency(metric: str, seconds: float):
+    samples = get_latency_samples()[metric]
+    samples.append(seconds)
+    logger.info("%s: %.3fs (p50 over last %d turns: %.3fs)", metric, seconds, len(samples), median(samples))
+
+# ✅ Stream the assistant's reply token by token from the "chatbot" node
+# Message-level streaming yields LLM tokens as they are generated,
+# instead of waiting for the whole completion to return
+def stream_response(prompt: str, config: dict | None = None):
+    start = time.perf_counter()
+    first_token = True
+    for chunk, metadata in load_chat_agent().stream({
+        "messages": [HumanMessage(content=prompt)]
+    }, config=config, stream_mode="messages"):
+        if metadata.get("langgraph_node") != "chatbot" or not chunk.content:
+            continue
+        if first_token:
+            record_latency("ttft", time.perf_counter() - start)
+            first_token = False
+        yield chunk.content
+    record_latency("total", time.perf_counter() - start)
 
 # Set Streamlit page configuration
 st.set_page_config(page_title="AI Chatbot", page_icon="🤖")
@@ -27,39 +63,27 @@ st.set_page_config(page_title="AI Chatbot", page_icon="🤖")
 # Page title
 st.title("🤖 First AI Chatbot")
 
-# ✅ Initialize chat history in session state (Streamlit remembers this per session)
-# If it's the first visit or reload, start with a welcome message from the assistant
-if MESSAGES not in st.session_state:
-    st.session_state[MESSAGES] = [
-        Message(actor=ASSISTANT, payload="Hi! How can I help you?")
-    ]
-
-# Render all messages from the chat history
-for msg in st.session_state[MESSAGES]:
-    st.chat_message(msg.actor).write(msg.payload)
-
-# Create a simple static config for the agent
-# Here, thread_id is hardcoded to '1' for demo purposes
-agent_config = {
-    "configurable": {
-        "thread_id": 1
+# ✅ Give every browser session its own conversation thread
+# The checkpointer keeps one history per thread_id, so a shared id would mix all users together
+if "agent_config" not in st.session_state:
+    st.session_state["agent_config"] = {
+        "configurable": {
+            "thread_id": str(uuid.uuid4())
+        }
     }
-}
+    logger.info("New session initialized with thread_id: %s (checkpointer: %s)",
+                st.session_state["agent_config"]["configurable"]["thread_id"], memory.stats())
+agent_config = st.session_state["agent_config"]
+
+# ✅ Render the conversation stored by the checkpointer
+# Only the latest page of messages is rendered; "Load older messages" fetches more on demand
+render_history(load_chat_agent(), agent_config)
 
 # Input box for user's new message (bottom of the chat)
 if prompt := st.chat_input("Type your message..."):
-    # Add user message to the chat history
-    st.session_state[MESSAGES].append(Message(actor=USER, payload=prompt))
+    # Show the user's message
     st.chat_message(USER).write(prompt)
 
-    # Invoke the chat agent with the new user input
-    result = chat_agent.invoke({
-        "messages": [HumanMessage(content=prompt)]
-    }, config=agent_config)
-
-    # Extract assistant's reply from the agent response
-    response: str = result["messages"][-1].content
-
-    # Add assistant response to chat history
-    st.session_state[MESSAGES].append(Message(actor=ASSISTANT, payload=response))
-    st.chat_message(ASSISTANT).write(response)
+    # Stream the assistant's reply into the chat as tokens arrive
+    # The checkpointer still stores the final message once, when the node finishes
+    st.chat_message(ASSISTANT).write_stream(stream_response(prompt, agent_config))
@@ -0,0 +1,283 @@
+# In-process checkpointer with bounded memory, a drop-in replacement for MemorySaver
+import threading
+import time
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from os import getenv
+from typing import Any, AsyncIterator, Iterator, Sequence
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ✅ Limits, overridable from the environment (.env)
+MEMORY_MAX_THREADS = int(getenv("MEMORY_MAX_THREADS", 10_000))  # Least recently used threads are evicted first
+MEMORY_MAX_BYTES = int(getenv("MEMORY_MAX_BYTES", 256 * 1024 * 1024))  # Serialized checkpoints and writes
+MEMORY_IDLE_TTL = int(getenv("MEMORY_IDLE_TTL", 3600))  # Seconds without reads or writes, 0 = never expire
+
+@dataclass
+class MemoryStats:
+    threads: int = 0
+    bytes: int = 0
+    peak_bytes: int = 0
+    evicted_lru: int = 0  # Over MEMORY_MAX_THREADS
+    evicted_bytes: int = 0  # Over MEMORY_MAX_BYTES
+    evicted_idle: int = 0  # Idle for longer than MEMORY_IDLE_TTL
+
+class _Latest:
+    """The latest checkpoint of one thread namespace, with the pending writes made on top of it."""
+    __slots__ = ("checkpoint_id", "parent_id", "checkpoint", "metadata", "writes")
+
+    def __init__(self, checkpoint_id, parent_id, checkpoint, metadata):
+        self.checkpoint_id = checkpoint_id
+        self.parent_id = parent_id
+        self.checkpoint = checkpoint  # (type, bytes) including channel values
+        self.metadata = metadata
+        self.writes = {}  # (task_id, idx) -> (task_id, channel, (type, bytes), task_path)
+
+    def size(self) -> int:
+        return (len(self.checkpoint[1]) + len(self.metadata[1])
+                + sum(len(value[1]) for _, _, value, _ in self.writes.values()))
+
+class _Thread:
+    __slots__ = ("namespaces", "size", "touched")
+
+    def __init__(self):
+        self.namespaces = {}  # checkpoint_ns -> _Latest
+        self.size = 0
+        self.touched = time.monotonic()
+
+class BoundedMemorySaver(BaseCheckpointSaver):
+    """
+    Keeps only the latest checkpoint of every thread, in process memory.
+
+    Threads are kept in least-recently-used order and evicted when there are more than
+    `max_threads` of them, when their serialized size adds up to more than `max_bytes`,
+    or after `idle_ttl` seconds without being read or written. An evicted thread simply
+    starts over with an empty history, as it would after a restart with MemorySaver.
+
+    Checkpoint history (`get_state_history`, time travel) is not available: every put
+    replaces the previous checkpoint of the thread.
+    """
+
+    def __init__(self, max_threads: int = MEMORY_MAX_THREADS, max_bytes: int = MEMORY_MAX_BYTES,
+                 idle_ttl: float = MEMORY_IDLE_TTL, serde=None):
+        super().__init__(serde=serde)
+        self.max_threads = max_threads
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self._threads = OrderedDict()  # thread_id -> _Thread, least recently used first
+        self._stats = MemoryStats()
+        self._lock = threading.Lock()  # Streamlit serves every session from its own thread
+
+    # ✅ Eviction
+    def _evict(self, thread_id: str, reason: str):
+        thread = self._threads.pop(thread_id)
+        self._stats.bytes -= thread.size
+        setattr(self._stats, f"evicted_{reason}", getattr(self._stats, f"evicted_{reason}") + 1)
+
+    def _expire_idle(self, now: float):
+        if not self.idle_ttl:
+            return
+        while self._threads:
+            thread_id, thread = next(iter(self._threads.items()))
+            if now - thread.touched < self.idle_ttl:
+                break
+            self._evict(thread_id, "idle")
+
+    def _enforce_limits(self, keep: str):
+        """Evict least recently used threads until within limits, never the one just written."""
+        while len(self._threads) > 1:
+            if len(self._threads) > self.max_threads:
+                reason = "lru"
+            elif self._stats.bytes > self.max_bytes:
+                reason = "bytes"
+            else:
+                break
+            oldest = next(iter(self._threads))
+            if oldest == keep:
+                self._threads.move_to_end(oldest)
+                oldest = next(iter(self._threads))
+            self._evict(oldest, reason)
+
+    def _touch(self, thread_id: str, create: bool = False) -> _Thread | None:
+        """Look a thread up, moving it to the most recently used end; expired threads are dropped."""
+        now = time.monotonic()
+        self._expire_idle(now)
+        thread = self._threads.get(thread_id)
+        if thread is None and create:
+            thread = self._threads[thread_id] = _Thread()
+        if thread is not None:
+            thread.touched = now
+            self._threads.move_to_end(thread_id)
+        return thread
+
+    def _resize(self, thread_id: str, thread: _Thread):
+        size = sum(latest.size() for latest in thread.namespaces.values())
+        self._stats.bytes += size - thread.size
+        self._stats.peak_bytes = max(self._stats.peak_bytes, self._stats.bytes)
+        thread.size = size
+        self._enforce_limits(keep=thread_id)
+
+    # ✅ Reads
+    def _tuple(self, thread_id: str, checkpoint_ns: str, latest: _Latest, config: RunnableConfig | None = None):
+        return CheckpointTuple(
+            config=config or {
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": latest.checkpoint_id,
+                }
+            },
+            checkpoint=self.serde.loads_typed(latest.checkpoint),
+            metadata=self.serde.loads_typed(latest.metadata),
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed(value))
+                for task_id, channel, value, _ in sorted(latest.writes.values(), key=lambda w: (w[3], w[0]))
+            ],
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": latest.parent_id,
+                    }
+                }
+                if latest.parent_id
+                else None
+            ),
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        with self._lock:
+            thread = self._touch(thread_id)
+            latest = thread.namespaces.get(checkpoint_ns) if thread else None
+            if latest is None or (checkpoint_id and checkpoint_id != latest.checkpoint_id):
+                return None
+        return self._tuple(thread_id, checkpoint_ns, latest, config if checkpoint_id else None)
+
+    def list(self, config: RunnableConfig | None, *, filter: dict[str, Any] | None = None,
+             before: RunnableConfig | None = None, limit: int | None = None) -> Iterator[CheckpointTuple]:
+        with self._lock:
+            if config:
+                thread_ids = [config["configurable"]["thread_id"]]
+            else:
+                thread_ids = list(self._threads)
+            found = []
+            for thread_id in thread_ids:
+                thread = self._threads.get(thread_id)
+                if thread is None:
+                    continue
+                for checkpoint_ns, latest in thread.namespaces.items():
+                    if config and config["configurable"].get("checkpoint_ns", checkpoint_ns) != checkpoint_ns:
+                        continue
+                    if config and (checkpoint_id := get_checkpoint_id(config)) and checkpoint_id != latest.checkpoint_id:
+                        continue
+                    if before and (before_id := get_checkpoint_id(before)) and latest.checkpoint_id >= before_id:
+                        continue
+                    found.append((thread_id, checkpoint_ns, latest))
+        for thread_id, checkpoint_ns, latest in found:
+            if limit is not None and limit <= 0:
+                break
+            checkpoint_tuple = self._tuple(thread_id, checkpoint_ns, latest)
+            if filter and not all(checkpoint_tuple.metadata.get(k) == v for k, v in filter.items()):
+                continue
+            if limit is not None:
+                limit -= 1
+            yield checkpoint_tuple
+
+    # ✅ Writes
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        latest = _Latest(
+            checkpoint["id"],
+            config["configurable"].get("checkpoint_id"),
+            self.serde.dumps_typed(checkpoint),
+            self.serde.dumps_typed(get_checkpoint_metadata(config, metadata)),
+        )
+        with self._lock:
+            thread = self._touch(thread_id, create=True)
+            thread.namespaces[checkpoint_ns] = latest  # Replaces the previous checkpoint and its writes
+            self._resize(thread_id, thread)
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        serialized = [
+            ((task_id, WRITES_IDX_MAP.get(channel, idx)), channel, self.serde.dumps_typed(value))
+            for idx, (channel, value) in enumerate(writes)
+        ]
+        with self._lock:
+            thread = self._touch(thread_id)
+            latest = thread.namespaces.get(checkpoint_ns) if thread else None
+            if latest is None or latest.checkpoint_id != checkpoint_id:
+                return  # Superseded or evicted checkpoint: nothing will read these writes
+            for key, channel, value in serialized:
+                if key[1] >= 0 and key in latest.writes:
+                    continue
+                latest.writes[key] = (task_id, channel, value, task_path)
+            self._resize(thread_id, thread)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            if thread_id in self._threads:
+                self._stats.bytes -= self._threads.pop(thread_id).size
+
+    # ✅ Async API: everything is in memory, so the sync methods are used directly
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        return self.get_tuple(config)
+
+    async def alist(self, config: RunnableConfig | None, *, filter: dict[str, Any] | None = None,
+                    before: RunnableConfig | None = None, limit: int | None = None) -> AsyncIterator[CheckpointTuple]:
+        for item in self.list(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        return self.put_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return self.delete_thread(thread_id)
+
+    # ✅ Memory usage
+    def stats(self) -> dict:
+        """Threads held, serialized bytes and evictions by reason."""
+        with self._lock:
+            self._expire_idle(time.monotonic())
+            self._stats.threads = len(self._threads)
+            return asdict(self._stats) | {
+                "max_threads": self.max_threads,
+                "max_bytes": self.max_bytes,
+                "idle_ttl": self.idle_ttl,
+            }
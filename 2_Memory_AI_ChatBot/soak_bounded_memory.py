@@ -0,0 +1,76 @@
+"""
+Soak test of the in-process checkpointer: drives many short sessions through the real graph
+(ChatOpenAI replaced by a canned fake model, no network) and samples resident memory.
+
+With BoundedMemorySaver the RSS levels off once MEMORY_MAX_THREADS / MEMORY_MAX_BYTES is
+reached; with --saver unbounded (the previous MemorySaver) it keeps growing with every session.
+Exits with status 1 when the RSS growth over the second half of the run exceeds --max-growth.
+
+Usage:
+    python soak_bounded_memory.py [--sessions 100000] [--turns 2] [--saver bounded|unbounded]
+        [--max-threads 2000] [--max-bytes 16777216] [--sample-every 10000] [--max-growth 0.10]
+"""
+import argparse
+import gc
+import os
+import resource
+import sys
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-offline-soak")
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.memory import MemorySaver
+
+import agent
+from bounded_memory import BoundedMemorySaver
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:  # Not Linux: fall back to the peak
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=100_000)
+    parser.add_argument("--turns", type=int, default=2, help="Turns per session")
+    parser.add_argument("--saver", choices=["bounded", "unbounded"], default="bounded")
+    parser.add_argument("--max-threads", type=int, default=2000)
+    parser.add_argument("--max-bytes", type=int, default=16 * 1024 * 1024)
+    parser.add_argument("--sample-every", type=int, default=10_000, help="Sessions between RSS samples")
+    parser.add_argument("--max-growth", type=float, default=0.10,
+                        help="Allowed relative RSS growth between the middle and the end of the run")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    saver = (BoundedMemorySaver(max_threads=args.max_threads, max_bytes=args.max_bytes)
+             if args.saver == "bounded" else MemorySaver())
+    agent.llm = agent.small_llm = FakeListChatModel(responses=["A canned answer of a realistic length. " * 8])
+    chat_agent = agent.graph.compile(checkpointer=saver)
+
+    samples = []
+    start = time.perf_counter()
+    for session in range(1, args.sessions + 1):
+        config = {"configurable": {"thread_id": f"soak-{session}"}}
+        for turn in range(args.turns):
+            chat_agent.invoke({"messages": [HumanMessage(content=f"Session {session}, turn {turn}")]}, config)
+        if session % args.sample_every == 0 or session == args.sessions:
+            gc.collect()
+            samples.append((session, rss_bytes()))
+            stats = saver.stats() if args.saver == "bounded" else {"threads": len(saver.storage), "bytes": 0}
+            print(f"{session:>8,} sessions  {time.perf_counter() - start:>7.1f}s  "
+                  f"RSS {samples[-1][1] / 2**20:>8.1f} MiB  "
+                  f"threads {stats['threads']:>7,}  "
+                  f"checkpoint bytes {stats['bytes']:>12,}", flush=True)
+
+    middle = samples[len(samples) // 2][1]
+    growth = (samples[-1][1] - middle) / middle
+    print(f"RSS growth over the second half: {growth:+.1%} (allowed {args.max_growth:.0%})")
+    sys.exit(1 if growth > args.max_growth else 0)
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,11 @@
+from functools import cache
 from typing import TypedDict, Annotated
 from langgraph.graph import StateGraph, END, add_messages
-from langgraph.checkpoint.memory import MemorySaver
-from langchain_openai import ChatOpenAI
 from dotenv import load_dotenv
 from os import getenv
-from redis_checkpoint import redis_checkpoint_saver
+from redis_checkpoint import get_checkpoint_saver
+from model_router import LARGE, ROUTER_SMALL_MODEL, SMALL, ModelRouter
+from llm_resilience import LLM_FALLBACK, LLM_TIMEOUT, LLMResilience
 import logging
 
 # -------------------- Setup Logging --------------------
@@ -15,13 +16,52 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 openai_api_model = "gpt-4-turbo"
 
-# Initialize OpenAI model  
-llm = ChatOpenAI(model= openai_api_model)
+# OpenAI models, created on first use: langchain_openai is slow to import and the clients
+# slow to build, and neither is needed to import this module
+llm = None  # Large model
+small_llm = None  # Small, fast model for simple turns
+
+def get_llm(route: str = LARGE):
+    global llm, small_llm
+    if route == LARGE and llm is None:
+        from langchain_openai import ChatOpenAI
+        llm = ChatOpenAI(model=openai_api_model, timeout=LLM_TIMEOUT, max_retries=0)
+        logger.info("OpenAI Chat model initialized: %s", openai_api_model)
+    elif route == SMALL and small_llm is None:
+        from langchain_openai import ChatOpenAI
+        small_llm = ChatOpenAI(model=ROUTER_SMALL_MODEL, timeout=LLM_TIMEOUT, max_retries=0)
+        logger.info("OpenAI Chat model initialized: %s", ROUTER_SMALL_MODEL)
+    return llm if route == LARGE else small_llm
+
+# -------------------- LLM Resilience --------------------
+# Every LLM call is bounded by a deadline, retried on transient errors with jittered backoff
+# and sent to the other model when the chosen one fails (LLM_* variables, see llm_resilience.py).
+# The clients above don't retry on their own so that retries are not multiplied.
+llm_resilience = LLMResilience()
+logger.info("LLM resilience: timeout=%ss, retries=%d, hedging=%s, fallback=%s",
+            llm_resilience.timeout, llm_resilience.retries, llm_resilience.hedge, LLM_FALLBACK)
+
+def fallback_llm(route: str):
+    """The model a failing call falls back to: the other route's model."""
+    return get_llm(SMALL if route == LARGE else LARGE) if LLM_FALLBACK else None
 
 # -------------------- Define Chat State --------------------
 class BasicChatState(TypedDict):
     # The state holds a list of messages, which will be passed between nodes
     messages: Annotated[list, add_messages]
+    # Model chosen by the router for the current turn
+    route: str
+
+# -------------------- Define Router Node --------------------
+# Picks the small or the large model for the turn from cheap features of the conversation
+# (ROUTER_* environment variables, see model_router.py)
+model_router = ModelRouter()
+logger.info("Model routing policy: %s, small model: %s", model_router.policy, ROUTER_SMALL_MODEL)
+
+def router(state: BasicChatState):
+    decision = model_router.route(state["messages"])
+    logger.info("Turn routed to the %s model (%s).", decision.route, decision.reason)
+    return {"route": decision.route}
 
 # -------------------- Define Chatbot Node --------------------
 def chatbot(state: BasicChatState):
@@ -31,7 +71,8 @@ def chatbot(state: BasicChatState):
     after invoking the LLM.
     """
     logger.info("Invoking LLM with current messages.")
-    response = llm.invoke(state["messages"])
+    route = state.get("route", LARGE)
+    response = llm_resilience.invoke(get_llm(route), state["messages"], fallback=fallback_llm(route))
     logger.info("LLM response received.")
     return {
         "messages": [response]
@@ -41,19 +82,26 @@ def chatbot(state: BasicChatState):
 logger.info("Creating LangGraph...")
 graph = StateGraph(BasicChatState)
 
-# Add chatbot node to the graph
+# Add router and chatbot nodes to the graph
+graph.add_node("router", router)
 graph.add_node("chatbot", chatbot)
-logger.info("Node 'chatbot' added to the graph.")
+logger.info("Nodes 'router' and 'chatbot' added to the graph.")
+
+# The router picks the model before every LLM call
+graph.add_edge("router", "chatbot")
 
 # Define the edge from chatbot to END (terminal node)
 graph.add_edge("chatbot", END)
 logger.info("Edge from 'chatbot' to END added.")
 
 # Set the entry point of the graph
-graph.set_entry_point("chatbot")
-logger.info("Entry point set to 'chatbot'.")
+graph.set_entry_point("router")
+logger.info("Entry point set to 'router'.")
 
-# Compile the graph with Redis-based checkpointing
-chat_agent = graph.compile(checkpointer=redis_checkpoint_saver)
-logger.info("LangGraph compiled with Redis checkpointing.")
-chat_agent= graph.compile(checkpointer= redis_checkpoint_saver)
+# Compile the graph with Redis-based checkpointing, once, when the agent is first needed
+# (this is also when the Redis connection is made)
+@cache
+def get_chat_agent():
+    chat_agent = graph.compile(checkpointer=get_checkpoint_saver())
+    logger.info("LangGraph compiled with Redis checkpointing.")
+    return chat_agent
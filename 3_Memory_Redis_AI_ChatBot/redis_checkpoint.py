@@ -1,14 +1,20 @@
 import os
-import redis
-from langgraph.checkpoint.redis import RedisSaver
+from functools import cache
 
 # Define your Redis URI
 REDIS_HOST = 'localhost'
 REDIS_PORT = 6379
 REDIS_DB = int(os.getenv("REDIS_DB", 0))
 
-# Create Redis client 
-redis_client = redis.Redis(host= REDIS_HOST, port= REDIS_PORT, db= REDIS_DB)
+# Create Redis client, on first use
+@cache
+def get_redis_client():
+    import redis
+    return redis.Redis(host= REDIS_HOST, port= REDIS_PORT, db= REDIS_DB)
 
-# Create Redis based checkpoint 
-redis_checkpoint_saver = RedisSaver(redis_client= redis_client)
+# Create Redis based checkpoint, on first use (RedisSaver connects and checks its indexes
+# when it is created, so importing this module does not need Redis to be up)
+@cache
+def get_checkpoint_saver():
+    from langgraph.checkpoint.redis import RedisSaver
+    return RedisSaver(redis_client= get_redis_client())
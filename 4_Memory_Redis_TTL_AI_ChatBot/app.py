@@ -1,9 +1,12 @@
 import streamlit as st
-from dataclasses import dataclass
 from langchain.schema import HumanMessage
-from agent import chat_agent
+from agent import get_chat_agent
+from chat_history import ASSISTANT, USER, render_history
 import uuid
 import logging
+import time
+from collections import deque
+from statistics import median
 # -------------------- Setup Logging --------------------
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -20,46 +23,66 @@ if "agent_config" not in st.session_state:
 else:
     logger.info("Existing session loaded with thread_id: %s", st.session_state["agent_config"]["configurable"]["thread_id"])
 
-# -------------------- Message Data Structure --------------------
-@dataclass
-class Message:
-    actor: str
-    payload: str
+# -------------------- Chat Agent --------------------
+# Built on the first request instead of at import (LLM client, checkpointer connections,
+# graph compilation), once per process, and shared by every session across reruns
+@st.cache_resource
+def load_chat_agent():
+    return get_chat_agent()
 
-# Constants for message roles
-USER = "user"
-ASSISTANT = "ai"
-MESSAGES = "messages"
+# -------------------- Latency Tracking --------------------
+# Rolling latency samples shared by every session served by this process.
+# Time-to-first-token and total turn latency are tracked separately so the
+# perceived latency (first token) can be watched independently of the LLM completion time.
+LATENCY_WINDOW = 500
+
+@st.cache_resource
+def get_latency_samples():
+    return {"ttft": deque(maxlen=LATENCY_WINDOW), "total": deque(maxlen=LATENCY_WINDOW)}
+
+def record_latency(metric: str, seconds: float):
+    samples = get_latency_samples()[metric]
+    samples.append(seconds)
+    logger.info("%s: %.3fs (p50 over last %d turns: %.3fs)", metric, seconds, len(samples), median(samples))
+
+# -------------------- Streaming Response --------------------
+def stream_response(prompt: str, config: dict):
+    """
+    Stream the assistant's reply token by token.
+    Uses the graph's message-level streaming so tokens from the 'chatbot' node are
+    yielded as soon as the LLM produces them; the checkpointer still stores the
+    final message once, when the node finishes.
+    """
+    start = time.perf_counter()
+    first_token = True
+    for chunk, metadata in load_chat_agent().stream({
+        "messages": [HumanMessage(content=prompt)]
+    }, config=config, stream_mode="messages"):
+        if metadata.get("langgraph_node") != "chatbot" or not chunk.content:
+            continue
+        if first_token:
+            record_latency("ttft", time.perf_counter() - start)
+            first_token = False
+        yield chunk.content
+    record_latency("total", time.perf_counter() - start)
 
 # -------------------- Streamlit UI Setup --------------------
 st.set_page_config(page_title="AI Chatbot", page_icon="🤖")
 st.title("🤖 AI Chatbot with Redis - TTL")
 
-# -------------------- Initialize Chat History --------------------
-if MESSAGES not in st.session_state:
-    st.session_state[MESSAGES] = [Message(actor=ASSISTANT, payload="Hi! How can I help you?")]
-    logger.info("Chat history initialized with welcome message.")
-
 # -------------------- Display Chat History --------------------
-for msg in st.session_state[MESSAGES]:
-    st.chat_message(msg.actor).write(msg.payload)
+# The history is read from the checkpointer, the single source of truth; only the latest
+# page is rendered, older messages are loaded on demand
+render_history(load_chat_agent(), st.session_state["agent_config"])
 
 # -------------------- Handle User Input --------------------
 if prompt := st.chat_input("Type your message..."):
     logger.info("User input received: %s", prompt)
 
-    # Append user message to chat history
-    st.session_state[MESSAGES].append(Message(actor=USER, payload=prompt))
     st.chat_message(USER).write(prompt)
 
-    # Invoke the LangGraph agent with the user message
-    result = chat_agent.invoke({
-        "messages": [HumanMessage(content=prompt)]
-    }, config=st.session_state["agent_config"])
-
-    # Extract and display the assistant's response
-    response: str = result["messages"][-1].content
+    # Stream the assistant's response into the chat as tokens arrive
+    response: str = st.chat_message(ASSISTANT).write_stream(
+        stream_response(prompt, st.session_state["agent_config"])
+    )
     logger.info("Assistant response: %s", response)
-
-    st.session_state[MESSAGES].append(Message(actor=ASSISTANT, payload=response))
-    st.chat_message(ASSISTANT).write(response)
\ No newline at end of file
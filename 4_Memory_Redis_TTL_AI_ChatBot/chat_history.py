@@ -0,0 +1,73 @@
+from dataclasses import dataclass
+from os import getenv
+
+import streamlit as st
+
+# -------------------- History Configuration --------------------
+HISTORY_PAGE_SIZE = int(getenv("HISTORY_PAGE_SIZE", 20))  # Messages rendered at first, and per "load older"
+HISTORY_VISIBLE = "history_visible"  # Session state key: number of most recent messages shown
+
+# Constants for message roles
+USER = "user"
+ASSISTANT = "ai"
+WELCOME_MESSAGE = "Hi! How can I help you?"
+
+# -------------------- Message Data Structure --------------------
+@dataclass(frozen=True)
+class Message:
+    actor: str
+    payload: str
+
+def content_markdown(content) -> str:
+    """Markdown of a message's content: a string, or a list of content blocks."""
+    if isinstance(content, str):
+        return content
+    return "\n\n".join(
+        block if isinstance(block, str) else block.get("text", "")
+        for block in content
+        if isinstance(block, str) or block.get("type") == "text"
+    )
+
+@st.cache_data(max_entries=10_000, show_spinner=False)
+def message_markdown(message_id: str, _content) -> str:
+    # Messages never change once checkpointed, so their id is enough of a cache key
+    return content_markdown(_content)
+
+def to_message(message) -> Message | None:
+    """Chat bubble for a LangChain message; tool calls, system prompts and empty messages are skipped."""
+    if message.type not in ("human", "ai") or not message.content:
+        return None
+    payload = message_markdown(message.id, message.content) if message.id else content_markdown(message.content)
+    return Message(actor=USER if message.type == "human" else ASSISTANT, payload=payload)
+
+# -------------------- History From The Checkpointer --------------------
+def history_page(chat_agent, config: dict, visible: int) -> tuple[list, int]:
+    """
+    Return the `visible` most recent chat messages of the thread, read from the checkpointer
+    (the single source of truth), and the number of older messages not shown yet.
+    Only the returned page is converted, walking back from the newest message.
+    """
+    messages = chat_agent.get_state(config).values.get("messages", [])
+    page, index = [], len(messages)
+    while index > 0 and len(page) < visible:
+        index -= 1
+        if (message := to_message(messages[index])) is not None:
+            page.append(message)
+    page.reverse()
+    return page, index
+
+@st.fragment
+def render_history(chat_agent, config: dict):
+    """
+    Render the latest page of the conversation. "Load older messages" reruns this fragment
+    only, so paging through a long thread does not rerun (or re-render) the rest of the app.
+    """
+    visible = st.session_state.setdefault(HISTORY_VISIBLE, HISTORY_PAGE_SIZE)
+    page, older = history_page(chat_agent, config, visible)
+    if older and st.button("Load older messages", key="load_older_messages"):
+        st.session_state[HISTORY_VISIBLE] = visible = visible + HISTORY_PAGE_SIZE
+        page, older = history_page(chat_agent, config, visible)
+    if not older:
+        st.chat_message(ASSISTANT).write(WELCOME_MESSAGE)
+    for msg in page:
+        st.chat_message(msg.actor).write(msg.payload)
@@ -1,7 +1,8 @@
 import os
-import redis
-from langgraph.checkpoint.redis import RedisSaver
 import logging
+import threading
+from contextlib import contextmanager
+from functools import cache, wraps
 
 # -------------------- Setup Logging --------------------
 logging.basicConfig(level=logging.INFO)
@@ -13,10 +14,13 @@ REDIS_HOST = 'localhost'
 REDIS_PORT = 6379
 SESSION_TTL = 1  # TTL in minute
 REDIS_DB = int(os.getenv("REDIS_DB", 0))  # Default to DB 0 if not set
-logger.info("Connecting to Redis at %s:%d (DB: %d)", REDIS_HOST, REDIS_PORT, REDIS_DB)
 
-# Create Redis client instance
-redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB)
+# Create the Redis client instance on first use
+@cache
+def get_redis_client():
+    import redis
+    logger.info("Connecting to Redis at %s:%d (DB: %d)", REDIS_HOST, REDIS_PORT, REDIS_DB)
+    return redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB)
 
 # -------------------- TTL Configuration --------------------
 # TTL (Time-To-Live) settings for checkpoints
@@ -26,7 +30,84 @@ ttl_config = {
 }
 logger.info("TTL configuration set: %s", ttl_config)
 
+# -------------------- Pipelined Writes --------------------
+# RedisSaver sends the EXPIRE of every key it writes, and with refresh_on_read of every key
+# it reads, in a round trip of its own: the more pending writes a thread has, the more round
+# trips a turn costs. With pipelining, the commands whose replies RedisSaver never looks at
+# (EXPIRE, SET of the latest-checkpoint pointer, ZADD to the write-key registry) are queued
+# and sent together in one pipeline when get_tuple, put or put_writes returns.
+REDIS_PIPELINE = os.getenv("REDIS_PIPELINE", "pipeline")  # off | pipeline | multi (pipeline in MULTI/EXEC)
+DEFERRED_COMMANDS = ("set", "expire", "zadd")
+
+class DeferringRedisClient:
+    """Redis client that queues DEFERRED_COMMANDS while a batch is open in the calling thread."""
+
+    def __init__(self, client, transaction: bool = False):
+        self.client = client
+        self.transaction = transaction
+        self._local = threading.local()
+
+    def __getattr__(self, name):
+        queue = getattr(self._local, "queue", None)
+        if queue is not None and name in DEFERRED_COMMANDS:
+            return lambda *args, **kwargs: queue.append((name, args, kwargs))
+        return getattr(self.client, name)
+
+    @contextmanager
+    def batch(self):
+        if getattr(self._local, "queue", None) is not None:  # Nested call: the outer batch sends
+            yield
+            return
+        self._local.queue = []
+        try:
+            yield
+        finally:
+            queue, self._local.queue = self._local.queue, None
+            if queue:
+                self.send(queue)
+
+    def send(self, queue: list):
+        try:
+            with self.client.pipeline(transaction=self.transaction) as pipeline:
+                for name, args, kwargs in queue:
+                    getattr(pipeline, name)(*args, **kwargs)
+                results = pipeline.execute(raise_on_error=False)
+        except Exception as e:  # e.g. EXECABORT: fall back to one command at a time
+            logger.warning("Redis pipeline failed (%s), sending its %d commands one by one.", e, len(queue))
+            results = [e] * len(queue)
+        # Best effort, like RedisSaver's own EXPIREs: retry failed commands once, on their own
+        for (name, args, kwargs), result in zip(queue, results):
+            if isinstance(result, Exception):
+                try:
+                    getattr(self.client, name)(*args, **kwargs)
+                except Exception:
+                    logger.warning("Redis %s %s failed.", name.upper(), args[0] if args else "", exc_info=True)
+
+def with_pipelined_writes(saver, transaction: bool = False):
+    """Route the saver's Redis commands through a DeferringRedisClient, one batch per call."""
+    client = DeferringRedisClient(saver._redis, transaction)
+    saver._redis = client
+    if saver._key_registry is not None:
+        saver._key_registry._redis = client
+    for name in ("get_tuple", "put", "put_writes"):
+        method = getattr(saver, name)
+
+        @wraps(method)
+        def batched(*args, _method=method, **kwargs):
+            with client.batch():
+                return _method(*args, **kwargs)
+
+        setattr(saver, name, batched)
+    return saver
+
 # -------------------- Initialize RedisSaver --------------------
-# Create a RedisSaver instance for LangGraph checkpointing
-redis_checkpoint_saver = RedisSaver(redis_client=redis_client, ttl=ttl_config)
-logger.info("Redis checkpoint saver initialized.")
\ No newline at end of file
+# Create a RedisSaver instance for LangGraph checkpointing, on first use: it connects and
+# checks its indexes when created, so importing this module does not need Redis to be up
+@cache
+def get_checkpoint_saver():
+    from langgraph.checkpoint.redis import RedisSaver
+    redis_checkpoint_saver = RedisSaver(redis_client=get_redis_client(), ttl=ttl_config)
+    if REDIS_PIPELINE != "off":
+        with_pipelined_writes(redis_checkpoint_saver, transaction=REDIS_PIPELINE == "multi")
+    logger.info("Redis checkpoint saver initialized (pipelining: %s).", REDIS_PIPELINE)
+    return redis_checkpoint_saver
\ No newline at end of file
@@ -1,8 +1,15 @@
-from langchain_openai import ChatOpenAI
+from functools import cache
+from langchain_core.runnables import RunnableLambda
 from typing import TypedDict, Annotated
 from langgraph.graph import StateGraph, END, add_messages
 from dotenv import load_dotenv
-from mongo_checkpoint import mongodb_memory
+from os import getenv
+from mongo_checkpoint import get_mongodb_memory, get_async_mongodb_memory
+import sqlite_checkpoint
+from instrumentation import (LLM_CIRCUIT_STATE, LLM_RESILIENCE_EVENTS, ROUTER_DECISIONS, llm_metrics_callback,
+                             timed_node)
+from llm_resilience import CIRCUIT_STATES, LLM_FALLBACK, LLM_TIMEOUT, LLMResilience
+from model_router import LARGE, ROUTER_SMALL_MODEL, SMALL, ModelRouter
 import logging
 
 # -------------------- Setup Logging --------------------
@@ -14,16 +21,67 @@ load_dotenv()
 openai_api_model = "gpt-4-turbo"
 logger.info("Environment variables loaded. Using OpenAI model: %s", openai_api_model)
 
-# -------------------- Initialize OpenAI Chat Model --------------------
-llm = ChatOpenAI(model=openai_api_model)
-logger.info("OpenAI Chat model initialized.")
+# -------------------- OpenAI Chat Models --------------------
+# Created on first use: langchain_openai is slow to import and the clients slow to build,
+# and neither is needed to import this module
+llm = None  # Large model
+small_llm = None  # Small, fast model for simple turns
+
+def get_llm(route: str = LARGE):
+    global llm, small_llm
+    if route == LARGE and llm is None:
+        from langchain_openai import ChatOpenAI
+        # The metrics callback records time to first token, total time and token counts of every call
+        llm = ChatOpenAI(model=openai_api_model, callbacks=[llm_metrics_callback],
+                         timeout=LLM_TIMEOUT, max_retries=0)
+        logger.info("OpenAI Chat model initialized: %s", openai_api_model)
+    elif route == SMALL and small_llm is None:
+        from langchain_openai import ChatOpenAI
+        small_llm = ChatOpenAI(model=ROUTER_SMALL_MODEL, callbacks=[llm_metrics_callback],
+                               timeout=LLM_TIMEOUT, max_retries=0)
+        logger.info("OpenAI Chat model initialized: %s", ROUTER_SMALL_MODEL)
+    return llm if route == LARGE else small_llm
+
+# -------------------- LLM Resilience --------------------
+# Every LLM call is bounded by a deadline, retried on transient errors with jittered backoff
+# and sent to the other model when the chosen one fails (LLM_* variables, see llm_resilience.py).
+# The clients above don't retry on their own so that retries are not multiplied.
+llm_resilience = LLMResilience(
+    on_event=lambda model, event: LLM_RESILIENCE_EVENTS.inc(model=model, event=event),
+    on_circuit=lambda model, state: LLM_CIRCUIT_STATE.set(CIRCUIT_STATES[state], model=model),
+)
+logger.info("LLM resilience: timeout=%ss, retries=%d, hedging=%s, fallback=%s",
+            llm_resilience.timeout, llm_resilience.retries, llm_resilience.hedge, LLM_FALLBACK)
+
+def fallback_llm(route: str):
+    """The model a failing call falls back to: the other route's model."""
+    return get_llm(SMALL if route == LARGE else LARGE) if LLM_FALLBACK else None
 
 # -------------------- Define Chat State --------------------
 class BasicChatState(TypedDict):
     # The state holds a list of messages, which will be passed between nodes
     messages: Annotated[list, add_messages]
+    # Model chosen by the router for the current turn
+    route: str
+
+# -------------------- Define Router Node --------------------
+# Picks the small or the large model for the turn from cheap features of the conversation
+# (ROUTER_* environment variables, see model_router.py)
+model_router = ModelRouter()
+logger.info("Model routing policy: %s, small model: %s", model_router.policy, ROUTER_SMALL_MODEL)
+
+@timed_node("router")
+def router(state: BasicChatState):
+    decision = model_router.route(state["messages"])
+    ROUTER_DECISIONS.inc(route=decision.route, reason=decision.reason)
+    return {"route": decision.route}
+
+async def arouter(state: BasicChatState):
+    # Pure computation: run it on the event loop instead of a worker thread
+    return router(state)
 
 # -------------------- Define Chatbot Node --------------------
+@timed_node("chatbot")
 def chatbot(state: BasicChatState):
     """
     This function represents a node in the LangGraph.
@@ -31,7 +89,19 @@ def chatbot(state: BasicChatState):
     after invoking the LLM.
     """
     logger.info("Invoking LLM with current messages.")
-    response = llm.invoke(state["messages"])
+    route = state.get("route", LARGE)
+    response = llm_resilience.invoke(get_llm(route), state["messages"], fallback=fallback_llm(route))
+    logger.info("LLM response received.")
+    return {
+        "messages": [response]
+    }
+
+@timed_node("chatbot")
+async def achatbot(state: BasicChatState):
+    """Async variant of chatbot: awaits the LLM so the event loop can serve other sessions meanwhile."""
+    logger.info("Invoking LLM asynchronously with current messages.")
+    route = state.get("route", LARGE)
+    response = await llm_resilience.ainvoke(get_llm(route), state["messages"], fallback=fallback_llm(route))
     logger.info("LLM response received.")
     return {
         "messages": [response]
@@ -41,18 +111,46 @@ def chatbot(state: BasicChatState):
 logger.info("Creating LangGraph...")
 graph = StateGraph(BasicChatState)
 
-# Add chatbot node to the graph
-graph.add_node("chatbot", chatbot)
-logger.info("Node 'chatbot' added to the graph.")
+# Add router and chatbot nodes to the graph
+# invoke/stream run the sync implementations, ainvoke/astream the async ones
+graph.add_node("router", RunnableLambda(router, afunc=arouter))
+graph.add_node("chatbot", RunnableLambda(chatbot, afunc=achatbot))
+logger.info("Nodes 'router' and 'chatbot' added to the graph.")
+
+# The router picks the model before every LLM call
+graph.add_edge("router", "chatbot")
 
 # Define the edge from chatbot to END (terminal node)
 graph.add_edge("chatbot", END)
 logger.info("Edge from 'chatbot' to END added.")
 
 # Set the entry point of the graph
-graph.set_entry_point("chatbot")
-logger.info("Entry point set to 'chatbot'.")
+graph.set_entry_point("router")
+logger.info("Entry point set to 'router'.")
+
+# -------------------- Checkpoint Backend --------------------
+# 'mongodb' or 'sqlite' (a local file, for single-node deployments without a MongoDB server)
+CHECKPOINT_BACKEND = getenv("CHECKPOINT_BACKEND", "mongodb")
+
+# Compile the graph with the checkpoint backend, once, when the agent is first needed
+# (this is also when MongoDB is connected to, or the SQLite file opened)
+@cache
+def get_chat_agent():
+    if CHECKPOINT_BACKEND == "sqlite":
+        checkpointer = sqlite_checkpoint.get_checkpoint_saver()
+    else:
+        checkpointer = get_mongodb_memory()
+    chat_agent = graph.compile(checkpointer=checkpointer)
+    logger.info("LangGraph compiled with %s checkpointing.", CHECKPOINT_BACKEND)
+    return chat_agent
 
-# Compile the graph with MongoDB-based checkpointing
-chat_agent = graph.compile(checkpointer= mongodb_memory)
-logger.info("LangGraph compiled with MongoDB checkpointing.")
+# Compile the same graph with the native async checkpointer for use on an event loop
+@cache
+def get_async_chat_agent():
+    if CHECKPOINT_BACKEND == "sqlite":
+        async_checkpointer = sqlite_checkpoint.get_async_checkpoint_saver()
+    else:
+        async_checkpointer = get_async_mongodb_memory()
+    async_chat_agent = graph.compile(checkpointer=async_checkpointer)
+    logger.info("LangGraph compiled with async %s checkpointing.", CHECKPOINT_BACKEND)
+    return async_chat_agent
@@ -0,0 +1,74 @@
+"""
+Benchmark of checkpoint compaction on the MongoDB checkpointer.
+
+For each conversation length, one thread is played with compaction off (full history) and
+one with inline keep-latest compaction, against the database in MONGODB_URI. Reports the
+BSON size of the thread's checkpoint and write documents and the latency of loading the
+latest checkpoint (get_tuple), which every turn pays before calling the LLM.
+
+Usage:
+    python bench_checkpoint_compaction.py [--turns 10 50 100 200] [--reads 200]
+"""
+import argparse
+import statistics
+import time
+import uuid
+
+import bson
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.messages import HumanMessage
+
+import agent
+from checkpoint_compaction import CHECKPOINT_KEEP_LAST, CompactingCheckpointSaver
+from mongo_checkpoint import get_mongodb_saver
+
+mongodb_saver = get_mongodb_saver()
+
+def play(saver, turns: int) -> dict:
+    """Run `turns` chat turns on a new thread and return its config."""
+    chat_agent = agent.graph.compile(checkpointer=saver)
+    config = {"configurable": {"thread_id": f"bench:{uuid.uuid4()}"}}
+    for turn in range(turns):
+        chat_agent.invoke({"messages": [HumanMessage(content=f"Question {turn}")]}, config=config)
+    return config
+
+def stored_bytes(thread_id: str) -> tuple:
+    documents, size = 0, 0
+    for collection in (mongodb_saver.checkpoint_collection, mongodb_saver.writes_collection):
+        for doc in collection.find({"thread_id": thread_id}):
+            documents += 1
+            size += len(bson.encode(doc))
+    return documents, size
+
+def read_latency_ms(saver, config: dict, reads: int) -> float:
+    samples = []
+    for _ in range(reads):
+        start = time.perf_counter()
+        saver.get_tuple(config)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 50, 100, 200])
+    parser.add_argument("--reads", type=int, default=200, help="get_tuple calls per measurement")
+    args = parser.parse_args()
+
+    # Replace the OpenAI model so only the checkpointer is measured
+    agent.llm = agent.small_llm = FakeListChatModel(responses=["A short answer from the stub model."])
+
+    savers = {
+        "off": mongodb_saver,
+        f"keep {CHECKPOINT_KEEP_LAST}": CompactingCheckpointSaver(mongodb_saver, mode="inline"),
+    }
+    print(f"{'turns':>6} {'compaction':>11} {'docs':>7} {'bytes':>11} {'get_tuple p50':>14}")
+    for turns in args.turns:
+        for label, saver in savers.items():
+            config = play(saver, turns)
+            documents, size = stored_bytes(config["configurable"]["thread_id"])
+            latency = read_latency_ms(saver, config, args.reads)
+            print(f"{turns:>6} {label:>11} {documents:>7} {size:>11,} {latency:>12.2f}ms")
+            mongodb_saver.delete_thread(config["configurable"]["thread_id"])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Latency of the latest-checkpoint lookup on a large checkpoint collection, with and without
+the indexes created by mongo_checkpoint.ensure_indexes().
+
+Fills a scratch database (--db, dropped at the start and the end) of MONGODB_URI with
+--documents checkpoint documents, spread over threads of --per-thread checkpoints each,
+then times the query every turn starts with (the newest checkpoint of a random thread:
+thread_id + checkpoint_ns, sorted by checkpoint_id descending) on the bare collection, and
+again after ensure_indexes(). Reports p50/p99 latency and the documents the server
+examined per lookup (from explain()).
+
+Usage:
+    python bench_mongo_indexes.py [--documents 1000000] [--per-thread 20] [--payload 1024]
+        [--lookups 200] [--db bench_indexes]
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+
+from bson import Binary
+from langgraph.checkpoint.base.id import uuid6
+
+import mongo_checkpoint
+from mongo_checkpoint import CHECKPOINT_COLLECTION_NAME, ensure_indexes, get_mongodb_client
+
+def fill(collection, documents: int, per_thread: int, payload: int, batch: int = 10_000):
+    """Insert `documents` checkpoints, interleaving threads as concurrent conversations would."""
+    threads = max(documents // per_thread, 1)
+    blob = Binary(os.urandom(payload))
+    docs = []
+    for i in range(documents):
+        docs.append({
+            "thread_id": f"bench-{i % threads}",
+            "checkpoint_ns": "",
+            "checkpoint_id": str(uuid6()),
+            "parent_checkpoint_id": None,
+            "type": "msgpack",
+            "checkpoint": blob,
+            "metadata": {},
+        })
+        if len(docs) == batch:
+            collection.insert_many(docs, ordered=False)
+            docs = []
+    if docs:
+        collection.insert_many(docs, ordered=False)
+    return threads
+
+def latest(collection, thread_id: str):
+    return collection.find({"thread_id": thread_id, "checkpoint_ns": ""}).sort("checkpoint_id", -1).limit(1)
+
+def measure(collection, threads: int, lookups: int, rng: random.Random) -> dict:
+    latencies = []
+    for _ in range(lookups):
+        thread_id = f"bench-{rng.randrange(threads)}"
+        start = time.perf_counter()
+        doc = next(latest(collection, thread_id), None)
+        latencies.append(time.perf_counter() - start)
+        assert doc is not None
+    try:
+        stats = latest(collection, "bench-0").explain()["executionStats"]
+        examined = stats["totalDocsExamined"]
+    except Exception:  # explain() is not available everywhere (e.g. mongomock)
+        examined = None
+    return {
+        "p50": statistics.median(latencies),
+        "p99": statistics.quantiles(latencies, n=100)[98] if len(latencies) > 1 else latencies[0],
+        "examined": examined,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=1_000_000)
+    parser.add_argument("--per-thread", type=int, default=20, help="Checkpoints per thread")
+    parser.add_argument("--payload", type=int, default=1024, help="Bytes of serialized checkpoint per document")
+    parser.add_argument("--lookups", type=int, default=200)
+    parser.add_argument("--db", default="bench_indexes", help="Scratch database, dropped before and after")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    client = get_mongodb_client()
+    client.drop_database(args.db)
+    db = client[args.db]
+    collection = db[CHECKPOINT_COLLECTION_NAME]
+    try:
+        start = time.perf_counter()
+        threads = fill(collection, args.documents, args.per_thread, args.payload)
+        print(f"Inserted {args.documents:,} checkpoints of {threads:,} threads in {time.perf_counter() - start:.1f}s")
+
+        results = [("no index", measure(collection, threads, args.lookups, random.Random(args.seed)))]
+        start = time.perf_counter()
+        ensure_indexes(db, expiry=mongo_checkpoint.MONGODB_EXPIRY)
+        print(f"ensure_indexes() took {time.perf_counter() - start:.1f}s")
+        results.append(("indexed", measure(collection, threads, args.lookups, random.Random(args.seed))))
+
+        print(f"{'':>9} {'p50':>10} {'p99':>10} {'docs examined':>14}")
+        for label, result in results:
+            examined = "-" if result["examined"] is None else f"{result['examined']:,}"
+            print(f"{label:>9} {result['p50'] * 1000:>8.2f}ms {result['p99'] * 1000:>8.2f}ms {examined:>14}")
+    finally:
+        client.drop_database(args.db)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import threading
+import logging
+from os import getenv
+
+from langgraph.checkpoint.base import BaseCheckpointSaver
+
+# -------------------- Setup Logging --------------------
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# -------------------- Compaction Configuration --------------------
+# 'inline' prunes from the saver itself after every CHECKPOINT_COMPACT_EVERY checkpoints of a thread,
+# 'background' prunes recently written threads from a daemon thread, 'off' keeps the full history
+CHECKPOINT_COMPACTION = getenv("CHECKPOINT_COMPACTION", "inline")
+CHECKPOINT_KEEP_LAST = int(getenv("CHECKPOINT_KEEP_LAST", 2))  # Checkpoints retained per thread
+CHECKPOINT_COMPACT_EVERY = int(getenv("CHECKPOINT_COMPACT_EVERY", 6))  # ~2 turns of the chat graph
+CHECKPOINT_COMPACT_INTERVAL = float(getenv("CHECKPOINT_COMPACT_INTERVAL", 30))  # Seconds, background mode
+
+# -------------------- Compacting Checkpoint Saver --------------------
+class CompactingCheckpointSaver(BaseCheckpointSaver):
+    """
+    Wraps a checkpoint saver and keeps only the latest `keep_last` checkpoints (and their
+    pending writes) of every thread it writes to. The wrapped saver must implement
+    `prune(thread_ids, keep_last=...)` (and `aprune` for the async path).
+
+    Compaction is amortized: a thread is pruned once every `compact_every` checkpoints,
+    so storage per thread stays bounded by keep_last + compact_every checkpoints.
+
+    Background compaction runs on a plain thread and calls the synchronous `prune`; async-only
+    savers pass a sync saver on the same storage as `pruner`.
+    """
+
+    def __init__(self, saver: BaseCheckpointSaver, keep_last: int = CHECKPOINT_KEEP_LAST,
+                 compact_every: int = CHECKPOINT_COMPACT_EVERY, mode: str = CHECKPOINT_COMPACTION,
+                 pruner: BaseCheckpointSaver | None = None):
+        super().__init__(serde=saver.serde)
+        if keep_last < 1:
+            raise ValueError("keep_last must be at least 1, the latest checkpoint is still in use")
+        self.saver = saver
+        self.pruner = pruner or saver
+        self.keep_last = keep_last
+        self.compact_every = compact_every
+        self.mode = mode
+        self._pending = {}  # thread_id -> checkpoints written since its last compaction
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        # Expose everything else of the wrapped saver (setup, asetup, loop, ...)
+        if name == "saver":
+            raise AttributeError(name)
+        return getattr(self.saver, name)
+
+    @property
+    def config_specs(self) -> list:
+        return self.saver.config_specs
+
+    def get_next_version(self, current, channel):
+        return self.saver.get_next_version(current, channel)
+
+    def _record_put(self, thread_id: str) -> bool:
+        """Count a checkpoint for the thread; return True when it is due for inline compaction."""
+        with self._lock:
+            count = self._pending.get(thread_id, 0) + 1
+            if self.mode == "inline" and count >= self.compact_every:
+                self._pending.pop(thread_id, None)
+                return True
+            self._pending[thread_id] = count
+            return False
+
+    def _take_pending(self) -> list:
+        with self._lock:
+            thread_ids, self._pending = list(self._pending), {}
+        return thread_ids
+
+    # ---- Compaction ----
+    def compact(self, thread_ids: list):
+        """Prune the given threads down to the latest keep_last checkpoints."""
+        self.pruner.prune(thread_ids, keep_last=self.keep_last)
+
+    async def acompact(self, thread_ids: list):
+        await self.saver.aprune(thread_ids, keep_last=self.keep_last)
+
+    def compact_pending(self) -> int:
+        """Compact every thread written since the last run; returns the number of threads."""
+        thread_ids = self._take_pending()
+        if thread_ids:
+            self.compact(thread_ids)
+        return len(thread_ids)
+
+    def start_background_compaction(self, interval: float = CHECKPOINT_COMPACT_INTERVAL):
+        """Start a daemon thread compacting recently written threads every `interval` seconds."""
+        def run():
+            stop = threading.Event()
+            while not stop.wait(interval):
+                try:
+                    count = self.compact_pending()
+                    if count:
+                        logger.info("Background compaction pruned %d threads.", count)
+                except Exception:
+                    logger.exception("Background checkpoint compaction failed.")
+
+        worker = threading.Thread(target=run, name="checkpoint-compaction", daemon=True)
+        worker.start()
+        return worker
+
+    # ---- Delegated checkpoint API ----
+    def get_tuple(self, config):
+        return self.saver.get_tuple(config)
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        return self.saver.list(config, filter=filter, before=before, limit=limit)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        next_config = self.saver.put(config, checkpoint, metadata, new_versions)
+        thread_id = config["configurable"]["thread_id"]
+        if self._record_put(thread_id):
+            self.compact([thread_id])
+        return next_config
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        self.saver.put_writes(config, writes, task_id, task_path)
+
+    def delete_thread(self, thread_id):
+        self.saver.delete_thread(thread_id)
+
+    async def aget_tuple(self, config):
+        return await self.saver.aget_tuple(config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        async for item in self.saver.alist(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        next_config = await self.saver.aput(config, checkpoint, metadata, new_versions)
+        thread_id = config["configurable"]["thread_id"]
+        if self._record_put(thread_id):
+            await self.acompact([thread_id])
+        return next_config
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        await self.saver.aput_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        await self.saver.adelete_thread(thread_id)
+
+def with_compaction(saver: BaseCheckpointSaver, mode: str = CHECKPOINT_COMPACTION,
+                    pruner: BaseCheckpointSaver | None = None):
+    """Apply the configured compaction mode to a saver."""
+    if mode == "off":
+        return saver
+    compacting_saver = CompactingCheckpointSaver(saver, mode=mode, pruner=pruner)
+    if mode == "background":
+        compacting_saver.start_background_compaction()
+    logger.info("Checkpoint compaction: mode=%s, keep_last=%d", mode, compacting_saver.keep_last)
+    return compacting_saver
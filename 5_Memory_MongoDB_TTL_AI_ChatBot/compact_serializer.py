@@ -0,0 +1,106 @@
+import threading
+import logging
+from os import getenv
+
+import ormsgpack
+import zstandard
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+# -------------------- Setup Logging --------------------
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# -------------------- Serializer Configuration --------------------
+# 'compact' stores checkpoint payloads as zstd-compressed msgpack, 'default' keeps the saver's own format.
+# Reads always accept both, so the setting can be switched at any time.
+CHECKPOINT_SERIALIZER = getenv("CHECKPOINT_SERIALIZER", "default")
+COMPACT_ZSTD_LEVEL = int(getenv("COMPACT_ZSTD_LEVEL", 3))
+COMPACT_MIN_BYTES = int(getenv("COMPACT_MIN_BYTES", 64))  # Smaller payloads are stored as plain msgpack
+
+# -------------------- Shared Envelope Dictionary --------------------
+# Strings repeated in every serialized LangChain message. Packed as msgpack strings they are
+# byte-identical to what appears in the payloads, so zstd can reference them even in the
+# first message of a thread instead of spelling every envelope out.
+# Stored payloads depend on these exact bytes: never edit this list, add a new version instead.
+ENVELOPE_STRINGS_V1 = (
+    "langchain_core.messages.human", "HumanMessage",
+    "langchain_core.messages.ai", "AIMessage",
+    "langchain_core.messages.system", "SystemMessage",
+    "langchain_core.messages.tool", "ToolMessage", "tool_call_id", "artifact", "status", "success",
+    "model_validate_json", "content", "additional_kwargs", "response_metadata", "type", "name", "id",
+    "human", "ai", "system", "tool", "tool_calls", "invalid_tool_calls", "usage_metadata",
+    "input_tokens", "output_tokens", "total_tokens", "input_token_details", "output_token_details",
+    "token_usage", "completion_tokens", "prompt_tokens", "completion_tokens_details",
+    "prompt_tokens_details", "cached_tokens", "audio", "reasoning_tokens",
+    "model_name", "finish_reason", "stop", "length", "system_fingerprint", "logprobs", "service_tier",
+    "model_provider", "openai", "gpt-4-turbo", "messages", "summary", "summarized_upto",
+)
+
+def _envelope_dictionary_v1() -> zstandard.ZstdCompressionDict:
+    content = b"".join(ormsgpack.packb(value) for value in ENVELOPE_STRINGS_V1)
+    return zstandard.ZstdCompressionDict(content, dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+
+COMPACT_TYPE = "msgpack+zstd.v1"  # Type tag stored next to every compact payload
+
+# -------------------- Compact Serializer --------------------
+class CompactSerializer(SerializerProtocol):
+    """
+    Checkpoint serializer storing values as msgpack compressed with zstd and a shared
+    dictionary of message envelopes.
+
+    Payloads of any other type (JSON, plain msgpack, ...) are handed to `fallback`, the
+    saver's original serializer, so checkpoints written before the switch stay readable.
+
+    RedisSaver keeps checkpoints and metadata as RedisJSON documents (they are indexed and
+    searched), so with `compact_documents=False` dicts are left to the fallback and only
+    channel values and pending writes are compacted.
+    """
+
+    def __init__(self, fallback: SerializerProtocol | None = None, compact_documents: bool = True,
+                 level: int = COMPACT_ZSTD_LEVEL, min_bytes: int = COMPACT_MIN_BYTES):
+        self.fallback = fallback or JsonPlusSerializer()
+        self.compact_documents = compact_documents
+        self.level = level
+        self.min_bytes = min_bytes
+        self._msgpack = JsonPlusSerializer()
+        self._dictionary = _envelope_dictionary_v1()
+        self._dictionary.precompute_compress(level=level)
+        # zstd contexts are not thread-safe and checkpoints are written from worker threads
+        self._local = threading.local()
+
+    def _contexts(self):
+        if not hasattr(self._local, "compressor"):
+            self._local.compressor = zstandard.ZstdCompressor(level=self.level, dict_data=self._dictionary)
+            self._local.decompressor = zstandard.ZstdDecompressor(dict_data=self._dictionary)
+        return self._local.compressor, self._local.decompressor
+
+    def __getattr__(self, name):
+        # Savers also call helpers of their own serializer (e.g. RedisSaver's _revive_if_needed)
+        if name in ("fallback", "_local"):
+            raise AttributeError(name)
+        return getattr(self.fallback, name)
+
+    def dumps_typed(self, obj) -> tuple[str, bytes]:
+        if obj is None or isinstance(obj, (bytes, bytearray)) or (isinstance(obj, dict) and not self.compact_documents):
+            return self.fallback.dumps_typed(obj)
+        type_, data = self._msgpack.dumps_typed(obj)
+        if type_ != "msgpack" or len(data) < self.min_bytes:
+            return type_, data
+        compressor, _ = self._contexts()
+        return COMPACT_TYPE, compressor.compress(data)
+
+    def loads_typed(self, data: tuple[str, bytes]):
+        type_, payload = data
+        if type_ == COMPACT_TYPE:
+            _, decompressor = self._contexts()
+            return self._msgpack.loads_typed(("msgpack", decompressor.decompress(payload)))
+        return self.fallback.loads_typed(data)
+
+def compact_serializer(fallback: SerializerProtocol | None = None, compact_documents: bool = True,
+                       serializer: str = CHECKPOINT_SERIALIZER) -> SerializerProtocol:
+    """Serializer for a checkpoint saver according to CHECKPOINT_SERIALIZER."""
+    if serializer != "compact":
+        return fallback or JsonPlusSerializer()
+    logger.info("Compact checkpoint serializer enabled (%s).", COMPACT_TYPE)
+    return CompactSerializer(fallback, compact_documents=compact_documents)
@@ -0,0 +1,503 @@
+import asyncio
+import contextvars
+import random
+import threading
+import time
+import logging
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from os import getenv
+
+from langchain_core.callbacks import BaseCallbackHandler, BaseCallbackManager
+from langchain_core.runnables.config import ensure_config
+
+# -------------------- Setup Logging --------------------
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# -------------------- Resilience Configuration --------------------
+LLM_TIMEOUT = float(getenv("LLM_TIMEOUT", 60))  # Deadline of one LLM call in seconds, retries included
+LLM_RETRIES = int(getenv("LLM_RETRIES", 2))  # Retries per model after the first attempt
+LLM_RETRY_BASE_DELAY = float(getenv("LLM_RETRY_BASE_DELAY", 0.5))  # Backoff: random delay up to base * 2^retry
+LLM_RETRY_MAX_DELAY = float(getenv("LLM_RETRY_MAX_DELAY", 8))
+LLM_RETRY_BUDGET = float(getenv("LLM_RETRY_BUDGET", 0.2))  # Extra attempts (retries + hedges) per call, on average
+LLM_HEDGE = getenv("LLM_HEDGE", "false").lower() == "true"  # Send a second request when the first is slow
+LLM_HEDGE_DELAY = float(getenv("LLM_HEDGE_DELAY", 0))  # Seconds; 0 = p95 of the model's recent response times
+LLM_FALLBACK = getenv("LLM_FALLBACK", "true").lower() == "true"  # Fall back to the other model when one fails
+LLM_BREAKER_FAILURES = int(getenv("LLM_BREAKER_FAILURES", 5))  # Consecutive failures that open a model's circuit
+LLM_BREAKER_RESET = float(getenv("LLM_BREAKER_RESET", 30))  # Seconds an open circuit waits before a trial call
+LLM_ATTEMPT_WORKERS = int(getenv("LLM_ATTEMPT_WORKERS", 64))  # Threads running the attempts of sync calls
+
+HEDGE_MIN_SAMPLES = 20  # Response times needed before the p95 hedge delay is trusted
+LATENCY_WINDOW = 200  # Response times kept per model
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+CIRCUIT_STATES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}  # Numeric values, for metrics
+
+class LLMTimeoutError(TimeoutError):
+    """No model answered before the call's deadline."""
+
+class CircuitOpenError(RuntimeError):
+    """The model failed repeatedly and is not being called until its circuit closes again."""
+
+class _Superseded(Exception):
+    """Raised inside an attempt that lost the race, to stop it at its first token."""
+
+def is_retryable(error: BaseException) -> bool:
+    """Timeouts, connection errors, 408/409/429 and 5xx responses; not bad requests or bugs."""
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in (408, 409, 429) or status >= 500
+    return (isinstance(error, (TimeoutError, ConnectionError))
+            or type(error).__name__ in ("APIConnectionError", "APITimeoutError"))
+
+def model_name(llm) -> str:
+    return getattr(llm, "model_name", None) or type(llm).__name__
+
+# -------------------- Circuit Breaker --------------------
+class CircuitBreaker:
+    """
+    Closed: calls go through. After `failures` consecutive failed calls the circuit opens and
+    calls are rejected at once, for `reset` seconds. Then one trial call is let through
+    (half-open): its success closes the circuit, its failure opens it again.
+
+    A call is recorded once, however many attempts it made: retry_allowed() tells whether it
+    may make another one, which the trial call may not.
+    """
+
+    def __init__(self, failures: int = LLM_BREAKER_FAILURES, reset: float = LLM_BREAKER_RESET, on_change=None):
+        self.failures = failures
+        self.reset = reset
+        self.on_change = on_change
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def _set(self, state: str):
+        if state != self.state:
+            logger.info("Circuit %s -> %s", self.state, state)
+            self.state = state
+            if self.on_change is not None:
+                self.on_change(state)
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self._opened_at < self.reset:
+                    return False
+                self._set(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._trial_running:
+                    return False
+                self._trial_running = True
+            return True
+
+    def retry_allowed(self) -> bool:
+        """Whether a call allow() let through may retry a failed attempt: only while closed."""
+        with self._lock:
+            return self.state == CLOSED
+
+    def record(self, success: bool | None):
+        """
+        Outcome of a call that allow() let through. None when it was given up without one
+        (cancelled): a half-open circuit then lets the next call through as its trial.
+        """
+        with self._lock:
+            self._trial_running = False
+            if success is None:
+                return
+            if success:
+                self.consecutive_failures = 0
+                self._set(CLOSED)
+                return
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.consecutive_failures >= self.failures):
+                self._opened_at = time.monotonic()
+                self._set(OPEN)
+
+# -------------------- Retry Budget --------------------
+class RetryBudget:
+    """
+    Every call deposits `ratio` tokens and every retry or hedge withdraws one, so extra
+    attempts stay below `ratio` of the traffic: when the provider is down, retries cannot
+    multiply the load on it. Up to `reserve` tokens are kept for bursts of failures.
+    """
+
+    def __init__(self, ratio: float = LLM_RETRY_BUDGET, reserve: float = 10.0):
+        self.ratio = ratio
+        self.reserve = reserve
+        self.balance = reserve
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self.balance = min(self.reserve, self.balance + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self.balance < 1:
+                return False
+            self.balance -= 1
+            return True
+
+# -------------------- Attempts --------------------
+class _Attempt:
+    def __init__(self, hedge: bool):
+        self.hedge = hedge
+        self.first_token_at = None
+
+class _Call:
+    """
+    One logical LLM call. Its attempts race: the first to stream a token, or to finish
+    without streaming, wins. Tokens of any other attempt never reach the user.
+    """
+
+    def __init__(self):
+        self.winner = None
+        self.closed = False
+        self._lock = threading.Lock()
+
+    def claim(self, attempt: _Attempt) -> bool:
+        with self._lock:
+            if self.winner is None and not self.closed:
+                self.winner = attempt
+            return self.winner is attempt and not self.closed
+
+    def close(self):
+        """Deadline passed: no attempt may win or stream any more."""
+        with self._lock:
+            self.closed = True
+
+class _AttemptWatch(BaseCallbackHandler):
+    """First handler of a streaming attempt: claims the call at the first token, or stops the attempt."""
+
+    raise_error = True
+    run_inline = True
+
+    def __init__(self, call: _Call, attempt: _Attempt):
+        self.call = call
+        self.attempt = attempt
+
+    def on_llm_new_token(self, token, **kwargs):
+        if not self.call.claim(self.attempt):
+            raise _Superseded()
+        if self.attempt.first_token_at is None:
+            self.attempt.first_token_at = time.monotonic()
+
+def _is_stream_handler(handler) -> bool:
+    # The handler behind stream_mode="messages", which forwards tokens to the UI
+    return type(handler).__name__ == "StreamMessagesHandler"
+
+def _attempt_config(config: dict, watch: _AttemptWatch | None) -> dict:
+    """
+    The run config of one attempt. The streaming attempt keeps the caller's handlers, with
+    the watch in front of them. Other attempts (hedges) run without the token streaming
+    handler: if one wins, its reply reaches the UI as a whole when the node returns.
+    """
+    callbacks = config.get("callbacks")
+    if isinstance(callbacks, BaseCallbackManager):
+        callbacks = callbacks.copy()
+        if watch is None:
+            callbacks.handlers = [h for h in callbacks.handlers if not _is_stream_handler(h)]
+            callbacks.inheritable_handlers = [h for h in callbacks.inheritable_handlers if not _is_stream_handler(h)]
+        else:
+            callbacks.handlers = [watch] + callbacks.handlers
+    else:
+        callbacks = [h for h in callbacks or [] if watch is not None or not _is_stream_handler(h)]
+        if watch is not None:
+            callbacks.insert(0, watch)
+    return {**config, "callbacks": callbacks}
+
+class _ModelState:
+    def __init__(self, name: str, resilience):
+        self.breaker = CircuitBreaker(resilience.breaker_failures, resilience.breaker_reset,
+                                      on_change=lambda state: resilience._circuit(name, state))
+        self.latencies = deque(maxlen=LATENCY_WINDOW)  # Seconds to first token or to the reply
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self.latencies.append(seconds)
+
+    def hedge_delay(self, fixed: float) -> float | None:
+        if fixed:
+            return fixed
+        with self._lock:
+            if len(self.latencies) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+# -------------------- Resilience Layer --------------------
+class LLMResilience:
+    """
+    Deadline, retries, hedging, fallback and circuit breaking around LLM calls, shared by
+    every session of the process (breaker state, retry budget and latency samples are kept
+    per model name).
+
+    A call runs rounds: the model, then the fallback model. Each round is allowed by the
+    model's circuit breaker, which counts it as one call, and retried with jittered
+    exponential backoff on retryable errors, within the retry budget and while the circuit
+    stays closed. With hedging on, a round that has neither streamed a
+    token nor answered after the model's p95 response time sends a second request and
+    takes whichever answers first. The whole call is bounded by `timeout`.
+
+    Once a token has been streamed to the user the call is committed: if that attempt
+    fails or the deadline passes, the error is raised rather than retried, since a second
+    reply would be appended to the partial one.
+
+    `on_event(model, event)` receives 'retry', 'hedge', 'hedge_won', 'fallback' (counted
+    against the model that failed), 'timeout', 'rejected' (circuit open) and 'error';
+    `on_circuit(model, state)` receives circuit changes.
+    """
+
+    def __init__(self, timeout: float = LLM_TIMEOUT, retries: int = LLM_RETRIES,
+                 base_delay: float = LLM_RETRY_BASE_DELAY, max_delay: float = LLM_RETRY_MAX_DELAY,
+                 retry_budget: float = LLM_RETRY_BUDGET, hedge: bool = LLM_HEDGE, hedge_delay: float = LLM_HEDGE_DELAY,
+                 breaker_failures: int = LLM_BREAKER_FAILURES, breaker_reset: float = LLM_BREAKER_RESET,
+                 on_event=None, on_circuit=None, workers: int = LLM_ATTEMPT_WORKERS):
+        self.timeout = timeout
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.breaker_failures = breaker_failures
+        self.breaker_reset = breaker_reset
+        self.on_event = on_event
+        self.on_circuit = on_circuit
+        self.budget = RetryBudget(retry_budget)
+        self._models = {}
+        self._events = Counter()  # (model, event) -> count
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm-attempt")
+        self._lock = threading.Lock()
+
+    def _state(self, llm) -> _ModelState:
+        name = model_name(llm)
+        with self._lock:
+            if name not in self._models:
+                self._models[name] = _ModelState(name, self)
+            return self._models[name]
+
+    def _event(self, llm, event: str):
+        name = model_name(llm)
+        with self._lock:
+            self._events[(name, event)] += 1
+        if self.on_event is not None:
+            self.on_event(name, event)
+
+    def _circuit(self, name: str, state: str):
+        logger.warning("LLM circuit of %s is now %s.", name, state)
+        if self.on_circuit is not None:
+            self.on_circuit(name, state)
+
+    def _backoff(self, retry: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (retry - 1)))
+
+    def bind(self, llm, fallback=None) -> "ResilientModel":
+        """The model as an object with invoke/ainvoke, e.g. for LLMScheduler."""
+        return ResilientModel(self, llm, fallback)
+
+    # ---- Sync ----
+    def _submit(self, call: _Call, llm, messages: list, config: dict, hedge: bool):
+        attempt = _Attempt(hedge)
+        attempt_config = _attempt_config(config, None if hedge else _AttemptWatch(call, attempt))
+        context = contextvars.copy_context()
+        return self._pool.submit(context.run, llm.invoke, messages, attempt_config), attempt
+
+    def _round(self, call: _Call, llm, messages: list, config: dict, deadline: float, state: _ModelState):
+        start = time.monotonic()
+        future, attempt = self._submit(call, llm, messages, config, hedge=False)
+        attempts = {future: attempt}
+        hedge_delay = state.hedge_delay(self.hedge_delay) if self.hedge else None
+        hedge_at = start + hedge_delay if hedge_delay is not None else None
+        error = None
+        while attempts:
+            wake = deadline if hedge_at is None else min(deadline, hedge_at)
+            done, _ = wait(attempts, timeout=max(0.0, wake - time.monotonic()), return_when=FIRST_COMPLETED)
+            for future in done:
+                attempt = attempts.pop(future)
+                if future.exception() is None:
+                    if call.claim(attempt):
+                        state.observe((attempt.first_token_at or time.monotonic()) - start)
+                        if attempt.hedge:
+                            self._event(llm, "hedge_won")
+                        return future.result()
+                elif call.winner is attempt:
+                    raise future.exception()  # Failed while streaming
+                elif not isinstance(future.exception(), _Superseded):
+                    error = future.exception()
+            if done:
+                continue
+            if time.monotonic() >= deadline:
+                call.close()  # Attempts still running are abandoned; a stream stops at its next token
+                raise LLMTimeoutError(f"{model_name(llm)} did not answer within {self.timeout}s")
+            if hedge_at is not None and time.monotonic() >= hedge_at:
+                hedge_at = None
+                if call.winner is None and self.budget.withdraw():
+                    self._event(llm, "hedge")
+                    future, attempt = self._submit(call, llm, messages, config, hedge=True)
+                    attempts[future] = attempt
+        raise error
+
+    def invoke(self, llm, messages: list, config: dict | None = None, fallback=None):
+        config = ensure_config(config)
+        call, deadline = _Call(), time.monotonic() + self.timeout
+        self.budget.deposit()
+        error = None
+        for index, model in enumerate([llm] if fallback is None else [llm, fallback]):
+            if index:
+                self._event(llm, "fallback")
+            state = self._state(model)
+            if not state.breaker.allow():
+                self._event(model, "rejected")
+                error = CircuitOpenError(f"Circuit of {model_name(model)} is open")
+                continue
+            success = None  # Recorded once per model, whatever ends its attempts (cancellation included)
+            try:
+                for retry in range(self.retries + 1):
+                    if retry:
+                        delay = self._backoff(retry)
+                        if (not state.breaker.retry_allowed() or time.monotonic() + delay >= deadline
+                                or not self.budget.withdraw()):
+                            break
+                        self._event(model, "retry")
+                        time.sleep(delay)
+                    try:
+                        response = self._round(call, model, messages, config, deadline, state)
+                    except Exception as exc:
+                        error, success = exc, False
+                        self._event(model, "timeout" if isinstance(exc, LLMTimeoutError) else "error")
+                        if call.winner is not None or isinstance(exc, LLMTimeoutError):
+                            raise  # Already streaming to the user, or out of time
+                        if not is_retryable(exc):
+                            break
+                        continue
+                    success = True
+                    return response
+            finally:
+                state.breaker.record(success)
+        raise error
+
+    # ---- Async ----
+    def _start(self, call: _Call, llm, messages: list, config: dict, hedge: bool):
+        attempt = _Attempt(hedge)
+        attempt_config = _attempt_config(config, None if hedge else _AttemptWatch(call, attempt))
+        return asyncio.ensure_future(llm.ainvoke(messages, attempt_config)), attempt
+
+    async def _around(self, call: _Call, llm, messages: list, config: dict, deadline: float, state: _ModelState):
+        start = time.monotonic()
+        task, attempt = self._start(call, llm, messages, config, hedge=False)
+        attempts = {task: attempt}
+        hedge_delay = state.hedge_delay(self.hedge_delay) if self.hedge else None
+        hedge_at = start + hedge_delay if hedge_delay is not None else None
+        error = None
+        try:
+            while attempts:
+                wake = deadline if hedge_at is None else min(deadline, hedge_at)
+                done, _ = await asyncio.wait(attempts, timeout=max(0.0, wake - time.monotonic()),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    attempt = attempts.pop(task)
+                    if task.exception() is None:
+                        if call.claim(attempt):
+                            state.observe((attempt.first_token_at or time.monotonic()) - start)
+                            if attempt.hedge:
+                                self._event(llm, "hedge_won")
+                            return task.result()
+                    elif call.winner is attempt:
+                        raise task.exception()
+                    elif not isinstance(task.exception(), _Superseded):
+                        error = task.exception()
+                if done:
+                    continue
+                if time.monotonic() >= deadline:
+                    call.close()
+                    raise LLMTimeoutError(f"{model_name(llm)} did not answer within {self.timeout}s")
+                if hedge_at is not None and time.monotonic() >= hedge_at:
+                    hedge_at = None
+                    if call.winner is None and self.budget.withdraw():
+                        self._event(llm, "hedge")
+                        task, attempt = self._start(call, llm, messages, config, hedge=True)
+                        attempts[task] = attempt
+            raise error
+        finally:
+            for task in attempts:  # Losers and abandoned attempts
+                task.cancel()
+
+    async def ainvoke(self, llm, messages: list, config: dict | None = None, fallback=None):
+        config = ensure_config(config)
+        call, deadline = _Call(), time.monotonic() + self.timeout
+        self.budget.deposit()
+        error = None
+        for index, model in enumerate([llm] if fallback is None else [llm, fallback]):
+            if index:
+                self._event(llm, "fallback")
+            state = self._state(model)
+            if not state.breaker.allow():
+                self._event(model, "rejected")
+                error = CircuitOpenError(f"Circuit of {model_name(model)} is open")
+                continue
+            success = None  # Recorded once per model, whatever ends its attempts (cancellation included)
+            try:
+                for retry in range(self.retries + 1):
+                    if retry:
+                        delay = self._backoff(retry)
+                        if (not state.breaker.retry_allowed() or time.monotonic() + delay >= deadline
+                                or not self.budget.withdraw()):
+                            break
+                        self._event(model, "retry")
+                        await asyncio.sleep(delay)
+                    try:
+                        response = await self._around(call, model, messages, config, deadline, state)
+                    except Exception as exc:
+                        error, success = exc, False
+                        self._event(model, "timeout" if isinstance(exc, LLMTimeoutError) else "error")
+                        if call.winner is not None or isinstance(exc, LLMTimeoutError):
+                            raise
+                        if not is_retryable(exc):
+                            break
+                        continue
+                    success = True
+                    return response
+            finally:
+                state.breaker.record(success)
+        raise error
+
+    def stats(self) -> dict:
+        """Circuit state, hedge delay and event counts per model, for health checks."""
+        with self._lock:
+            models = dict(self._models)
+            events = dict(self._events)
+        return {
+            "retry_budget": round(self.budget.balance, 2),
+            "models": {
+                name: {
+                    "circuit": state.breaker.state,
+                    "consecutive_failures": state.breaker.consecutive_failures,
+                    "hedge_delay": state.hedge_delay(self.hedge_delay),
+                    "events": {event: n for (model, event), n in events.items() if model == name},
+                }
+                for name, state in models.items()
+            },
+        }
+
+class ResilientModel:
+    """A model and its fallback called through an LLMResilience; has the invoke/ainvoke of a chat model."""
+
+    def __init__(self, resilience: LLMResilience, llm, fallback=None):
+        self.resilience = resilience
+        self.llm = llm
+        self.fallback = fallback
+
+    @property
+    def model_name(self) -> str:
+        return model_name(self.llm)
+
+    def invoke(self, messages: list, config: dict | None = None):
+        return self.resilience.invoke(self.llm, messages, config, self.fallback)
+
+    async def ainvoke(self, messages: list, config: dict | None = None):
+        return await self.resilience.ainvoke(self.llm, messages, config, self.fallback)
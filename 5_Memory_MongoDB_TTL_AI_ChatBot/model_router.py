@@ -0,0 +1,81 @@
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from os import getenv
+
+# -------------------- Router Configuration --------------------
+# 'heuristic' picks a model per turn; 'large' and 'small' send every turn to one model
+ROUTER_POLICY = getenv("ROUTER_POLICY", "heuristic")
+ROUTER_SMALL_MODEL = getenv("ROUTER_SMALL_MODEL", "gpt-4o-mini")  # Fast, cheap model for simple turns
+ROUTER_MAX_SMALL_CHARS = int(getenv("ROUTER_MAX_SMALL_CHARS", 600))  # Longer prompts go to the large model
+ROUTER_MAX_SMALL_HISTORY = int(getenv("ROUTER_MAX_SMALL_HISTORY", 20))  # Messages in the conversation so far
+# Words asking for reasoning, code or long-form writing send the turn to the large model
+ROUTER_LARGE_KEYWORDS = getenv(
+    "ROUTER_LARGE_KEYWORDS",
+    "analyze,analyse,architecture,code,compare,debug,derive,design,essay,explain why,implement,"
+    "optimize,plan,proof,prove,refactor,reason,step by step,strategy,summarize,translate,write",
+)
+
+SMALL = "small"
+LARGE = "large"
+
+@dataclass(frozen=True)
+class RouteDecision:
+    route: str  # SMALL or LARGE
+    reason: str  # Which rule decided, for metrics
+
+# -------------------- Model Router --------------------
+class ModelRouter:
+    """
+    Chooses the model of a turn from cheap features of the conversation: the latest user
+    message's length and wording, code in it, and the size of the history. Simple turns
+    (greetings, short factual questions) go to the small model; anything that looks like
+    it needs reasoning or long output goes to the large one. Costs microseconds per turn.
+    """
+
+    def __init__(self, policy: str = ROUTER_POLICY, max_small_chars: int = ROUTER_MAX_SMALL_CHARS,
+                 max_small_history: int = ROUTER_MAX_SMALL_HISTORY, keywords: str = ROUTER_LARGE_KEYWORDS):
+        if policy not in ("heuristic", SMALL, LARGE):
+            raise ValueError(f"Unknown routing policy: {policy!r}")
+        self.policy = policy
+        self.max_small_chars = max_small_chars
+        self.max_small_history = max_small_history
+        words = [re.escape(word.strip()) for word in keywords.split(",") if word.strip()]
+        self._keywords = re.compile(r"\b(?:" + "|".join(words) + r")", re.IGNORECASE) if words else None
+        self._decisions = Counter()  # (route, reason) -> turns
+        self._lock = threading.Lock()
+
+    def classify(self, messages: list) -> RouteDecision:
+        if self.policy != "heuristic":
+            return RouteDecision(self.policy, "policy")
+        prompt = next((m.content for m in reversed(messages) if m.type == "human"), "")
+        prompt = prompt if isinstance(prompt, str) else str(prompt)
+        if "```" in prompt:
+            return RouteDecision(LARGE, "code")
+        if len(prompt) > self.max_small_chars:
+            return RouteDecision(LARGE, "length")
+        if self._keywords is not None and self._keywords.search(prompt):
+            return RouteDecision(LARGE, "keyword")
+        if len(messages) > self.max_small_history:
+            return RouteDecision(LARGE, "history")
+        return RouteDecision(SMALL, "simple")
+
+    def route(self, messages: list) -> RouteDecision:
+        """Classify the turn and count the decision."""
+        decision = self.classify(messages)
+        with self._lock:
+            self._decisions[(decision.route, decision.reason)] += 1
+        return decision
+
+    def stats(self) -> dict:
+        """Turns routed so far, per route and per reason."""
+        with self._lock:
+            decisions = dict(self._decisions)
+        total = sum(decisions.values())
+        return {
+            "policy": self.policy,
+            "turns": total,
+            "small_ratio": sum(n for (route, _), n in decisions.items() if route == SMALL) / total if total else 0.0,
+            "decisions": {f"{route}/{reason}": n for (route, reason), n in decisions.items()},
+        }
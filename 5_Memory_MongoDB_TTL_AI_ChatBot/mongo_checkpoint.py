@@ -1,8 +1,25 @@
 import os
+import threading
+import time
 import logging
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import cache
 from dotenv import load_dotenv
-from pymongo import MongoClient
+from pymongo import ASCENDING, DESCENDING, AsyncMongoClient, MongoClient, UpdateOne
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
 from langgraph.checkpoint.mongodb import MongoDBSaver
+from langgraph.checkpoint.mongodb.utils import dumps_metadata, loads_metadata
+from checkpoint_compaction import with_compaction
+from compact_serializer import compact_serializer
+from instrumentation import instrument_saver
+from tiered_checkpoint import with_hot_cache
 
 # -----------------------------
 # Setup Logging Configuration
@@ -19,11 +36,12 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 mongodb_uri = os.getenv("MONGODB_URI")
 
-if not mongodb_uri:
-    logger.error("MONGODB_URI not found in environment variables.")
-    raise ValueError("Missing MongoDB URI in .env file")
-
-logger.info("Environment variables loaded successfully.")
+def require_mongodb_uri() -> str:
+    # Checked when the first client is built, so the module itself imports without MongoDB settings
+    if not mongodb_uri:
+        logger.error("MONGODB_URI not found in environment variables.")
+        raise ValueError("Missing MongoDB URI in .env file")
+    return mongodb_uri
 
 # -----------------------------
 # Define MongoDB Checkpoint Configuration
@@ -31,33 +49,476 @@ logger.info("Environment variables loaded successfully.")
 CHECKPOINT_DB_NAME = 'DB'
 CHECKPOINT_COLLECTION_NAME = 'Blog_Chekpoint'
 CHECKPOINT_WRITE_COLLECTION_NAME = 'Blog_Chekpoint_Write'
+CHECKPOINT_THREAD_COLLECTION_NAME = 'Blog_Chekpoint_Thread'  # Expiry time of every thread
 TTL_SECONDS = 300  # Time-to-live for checkpoint entries in seconds
 
-logger.info("Checkpoint configuration set: DB=%s, Collection=%s, WriteCollection=%s, TTL=%d",
-            CHECKPOINT_DB_NAME, CHECKPOINT_COLLECTION_NAME, CHECKPOINT_WRITE_COLLECTION_NAME, TTL_SECONDS)
+# 'thread': a thread expires as a whole TTL_SECONDS after it was last written (or read, with
+# MONGODB_REFRESH_ON_READ, like the Redis saver's refresh_on_read), and expired threads are
+# deleted in batches by a sweeper. 'document': MongoDB's TTL index deletes every checkpoint
+# and write TTL_SECONDS after it was written, one by one, even in a conversation still going on.
+MONGODB_EXPIRY = os.getenv("MONGODB_EXPIRY", "thread")
+MONGODB_REFRESH_ON_READ = os.getenv("MONGODB_REFRESH_ON_READ", "true").lower() == "true"
+MONGODB_SWEEP_INTERVAL = float(os.getenv("MONGODB_SWEEP_INTERVAL", 60))  # Seconds between sweeps
+MONGODB_SWEEP_BATCH = int(os.getenv("MONGODB_SWEEP_BATCH", 500))  # Threads deleted per delete_many
+
+logger.info("Checkpoint configuration set: DB=%s, Collection=%s, WriteCollection=%s, TTL=%d, expiry=%s",
+            CHECKPOINT_DB_NAME, CHECKPOINT_COLLECTION_NAME, CHECKPOINT_WRITE_COLLECTION_NAME, TTL_SECONDS,
+            MONGODB_EXPIRY)
 
 # -----------------------------
 # Initialize MongoDB Client
 # -----------------------------
-try:
-    mongodb_client = MongoClient(mongodb_uri)
-    logger.info("MongoDB client initialized successfully.")
-except Exception as e:
-    logger.exception("Failed to initialize MongoDB client.")
-    raise
+# Clients and savers are built on first use rather than at import: MongoDBSaver connects
+# and creates its indexes when it is constructed
+@cache
+def get_mongodb_client() -> MongoClient:
+    try:
+        mongodb_client = MongoClient(require_mongodb_uri())
+        logger.info("MongoDB client initialized successfully.")
+        return mongodb_client
+    except Exception as e:
+        logger.exception("Failed to initialize MongoDB client.")
+        raise
+
+# -----------------------------
+# Index Bootstrap
+# -----------------------------
+# The latest checkpoint of a thread, its pending writes and retention all look documents up
+# by thread, namespace and descending checkpoint id
+CHECKPOINT_INDEX = [("thread_id", ASCENDING), ("checkpoint_ns", ASCENDING), ("checkpoint_id", DESCENDING)]
+WRITES_INDEX = CHECKPOINT_INDEX + [("task_id", ASCENDING), ("idx", ASCENDING)]
+TTL_INDEX = [("created_at", ASCENDING)]
+EXPIRY_INDEX = [("expires_at", ASCENDING)]
+
+def _index_keys(index) -> tuple:
+    return tuple((field, int(direction)) for field, direction in index["key"].items())
+
+def _ensure_ttl_index(db, collection, indexes: dict):
+    """TTL index on created_at expiring after TTL_SECONDS; an existing one with another TTL is changed in place."""
+    ttl_index = indexes.get(tuple(TTL_INDEX))
+    if ttl_index is None:
+        collection.create_index(TTL_INDEX, expireAfterSeconds=TTL_SECONDS)
+        logger.info("Created TTL index on %s (%ds).", collection.name, TTL_SECONDS)
+    elif ttl_index.get("expireAfterSeconds") != TTL_SECONDS:
+        # create_index would fail with IndexOptionsConflict: the TTL of an index is changed with collMod
+        db.command({"collMod": collection.name,
+                    "index": {"keyPattern": dict(TTL_INDEX), "expireAfterSeconds": TTL_SECONDS}})
+        logger.info("Changed TTL index on %s from %ss to %ds.", collection.name,
+                    ttl_index.get("expireAfterSeconds"), TTL_SECONDS)
+
+def ensure_indexes(db, expiry: str = MONGODB_EXPIRY):
+    """
+    Create the indexes the savers rely on, if missing, and verify that the latest-checkpoint
+    lookup uses them. Runs at startup, before MongoDBSaver is built (which would otherwise
+    fail on a TTL index left with another expireAfterSeconds).
+    """
+    checkpoint_collection = db[CHECKPOINT_COLLECTION_NAME]
+    for collection, keys in ((checkpoint_collection, CHECKPOINT_INDEX),
+                             (db[CHECKPOINT_WRITE_COLLECTION_NAME], WRITES_INDEX)):
+        indexes = {_index_keys(index): index for index in collection.list_indexes()}
+        if tuple(keys) not in indexes:
+            collection.create_index(keys, unique=True)
+            logger.info("Created index %s on %s.", [field for field, _ in keys], collection.name)
+        if expiry == "document":
+            _ensure_ttl_index(db, collection, indexes)
+        elif tuple(TTL_INDEX) in indexes:
+            logger.info("TTL index on %s left in place: it only expires documents written with MONGODB_EXPIRY=document.",
+                        collection.name)
+    if expiry == "thread":
+        db[CHECKPOINT_THREAD_COLLECTION_NAME].create_index(EXPIRY_INDEX)
+    verify_latest_lookup(checkpoint_collection)
+
+def verify_latest_lookup(collection) -> bool | None:
+    """Check with explain() that the latest-checkpoint query is answered from an index; None if explain is unsupported."""
+    try:
+        plan = collection.find(*_latest_query("index-check", "")).sort("checkpoint_id", -1).limit(1).explain()
+    except Exception:  # e.g. mongomock
+        return None
+    if "COLLSCAN" in str(plan.get("queryPlanner", {}).get("winningPlan")):
+        logger.warning("Latest-checkpoint lookups on %s scan the collection: check its indexes.", collection.name)
+        return False
+    return True
+
+# -----------------------------
+# Thread Expiry
+# -----------------------------
+class ThreadExpiry:
+    """
+    Expiry of whole threads: one small document per thread holds its expiry time, pushed
+    `ttl` seconds ahead whenever the thread is written (and read, when refresh_on_read).
+    To keep that to one write every few turns, a thread is only touched again once a tenth
+    of its TTL has passed. sweep() then deletes expired threads in batches, with one
+    delete_many per collection and batch, instead of MongoDB's TTL monitor deleting
+    documents one at a time.
+
+    `collection` is a pymongo or AsyncMongoClient collection: use touch() with the former,
+    atouch() with the latter.
+    """
+
+    def __init__(self, collection, ttl: int = TTL_SECONDS, refresh_on_read: bool = MONGODB_REFRESH_ON_READ,
+                 max_threads: int = 100_000):
+        self.collection = collection
+        self.ttl = ttl
+        self.refresh_on_read = refresh_on_read
+        self.max_threads = max_threads
+        self._touched = OrderedDict()  # thread_id -> last touch (monotonic), least recent first
+        self._lock = threading.Lock()
+
+    def _due(self, thread_id: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            last = self._touched.get(thread_id)
+            if last is not None and now - last < self.ttl / 10:
+                return False
+            self._touched[thread_id] = now
+            self._touched.move_to_end(thread_id)
+            while len(self._touched) > self.max_threads:
+                self._touched.popitem(last=False)
+        return True
+
+    def _update(self, thread_id: str) -> tuple:
+        expires_at = datetime.fromtimestamp(time.time() + self.ttl, tz=timezone.utc)
+        return {"_id": thread_id}, {"$set": {"expires_at": expires_at}}
+
+    def touch(self, thread_id: str):
+        if self._due(thread_id):
+            self.collection.update_one(*self._update(thread_id), upsert=True)
+
+    async def atouch(self, thread_id: str):
+        if self._due(thread_id):
+            await self.collection.update_one(*self._update(thread_id), upsert=True)
+
+    def sweep(self, checkpoint_collection, writes_collection, batch: int = MONGODB_SWEEP_BATCH) -> int:
+        """
+        Delete the checkpoints and writes of every expired thread; returns the number of threads.
+        A thread written to between the find and the delete of its batch loses its history:
+        it had been idle for the whole TTL until then.
+        """
+        deleted = 0
+        while True:
+            now = datetime.now(tz=timezone.utc)
+            thread_ids = [doc["_id"] for doc in self.collection.find(
+                {"expires_at": {"$lt": now}}, {"_id": 1}, limit=batch)]
+            if not thread_ids:
+                return deleted
+            checkpoint_collection.delete_many({"thread_id": {"$in": thread_ids}})
+            writes_collection.delete_many({"thread_id": {"$in": thread_ids}})
+            self.collection.delete_many({"_id": {"$in": thread_ids}, "expires_at": {"$lt": now}})
+            with self._lock:
+                for thread_id in thread_ids:
+                    self._touched.pop(thread_id, None)
+            deleted += len(thread_ids)
+            if len(thread_ids) < batch:
+                return deleted
+
+    def start_sweeper(self, checkpoint_collection, writes_collection, interval: float = MONGODB_SWEEP_INTERVAL):
+        """Run sweep() every `interval` seconds from a daemon thread."""
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    if count := self.sweep(checkpoint_collection, writes_collection):
+                        logger.info("Swept %d expired threads.", count)
+                except Exception:
+                    logger.exception("Sweeping expired threads failed.")
+
+        threading.Thread(target=run, name="mongodb-checkpoint-sweeper", daemon=True).start()
+
+# -----------------------------
+# Checkpoint Retention
+# -----------------------------
+def _latest_query(thread_id: str, checkpoint_ns: str) -> tuple:
+    """find_one arguments for the id of the latest checkpoint, answered from the index."""
+    return ({"thread_id": thread_id, "checkpoint_ns": checkpoint_ns},
+            {"checkpoint_id": 1, "_id": 0})
+
+def _prune_filters(thread_id: str, checkpoint_ns: str, cutoff_id: str | None) -> dict:
+    """Filter matching every checkpoint of the namespace older than the oldest one retained."""
+    query = {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns}
+    if cutoff_id is not None:
+        query["checkpoint_id"] = {"$lt": cutoff_id}
+    return query
+
+class PruningMongoDBSaver(MongoDBSaver):
+    """
+    MongoDBSaver with the `prune` retention API of the Redis savers and, when given a
+    ThreadExpiry, thread expiry refreshed on every write (and read).
+    """
+
+    thread_expiry = None
+
+    def get_tuple(self, config):
+        checkpoint_tuple = super().get_tuple(config)
+        if checkpoint_tuple is not None and self.thread_expiry is not None and self.thread_expiry.refresh_on_read:
+            self.thread_expiry.touch(config["configurable"]["thread_id"])
+        return checkpoint_tuple
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        next_config = super().put(config, checkpoint, metadata, new_versions)
+        if self.thread_expiry is not None:
+            self.thread_expiry.touch(config["configurable"]["thread_id"])
+        return next_config
+
+    def delete_thread(self, thread_id: str):
+        super().delete_thread(thread_id)
+        if self.thread_expiry is not None:
+            self.thread_expiry.collection.delete_one({"_id": thread_id})
+
+    def latest_checkpoint_id(self, thread_id: str, checkpoint_ns: str = "") -> str | None:
+        """Id of the latest checkpoint of the namespace, without fetching the checkpoint itself."""
+        doc = self.checkpoint_collection.find_one(*_latest_query(thread_id, checkpoint_ns),
+                                                  sort=[("checkpoint_id", -1)])
+        return doc["checkpoint_id"] if doc else None
+
+    def prune(self, thread_ids, *, strategy: str = "keep_latest", keep_last: int | None = None):
+        """
+        Keep the latest `keep_last` checkpoints (and their writes) of every namespace of the
+        given threads. Checkpoint ids are time-ordered, so everything older than the last
+        retained id is removed with one delete_many per collection.
+        """
+        if keep_last is None:
+            keep_last = 0 if strategy == "delete" else 1
+        for thread_id in thread_ids:
+            for checkpoint_ns in self.checkpoint_collection.distinct("checkpoint_ns", {"thread_id": thread_id}):
+                cutoff_id = None
+                if keep_last:
+                    retained = list(self.checkpoint_collection.find(
+                        {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns}, {"checkpoint_id": 1},
+                        sort=[("checkpoint_id", -1)], skip=keep_last - 1, limit=1,
+                    ))
+                    if not retained:
+                        continue
+                    cutoff_id = retained[0]["checkpoint_id"]
+                query = _prune_filters(thread_id, checkpoint_ns, cutoff_id)
+                self.checkpoint_collection.delete_many(query)
+                self.writes_collection.delete_many(query)
 
 # -----------------------------
 # Create MongoDBSaver Instance
 # -----------------------------
-try:
-    mongodb_memory = MongoDBSaver(
-        client=mongodb_client,
+@cache
+def get_mongodb_saver() -> PruningMongoDBSaver:
+    try:
+        ensure_indexes(get_mongodb_client()[CHECKPOINT_DB_NAME])
+        mongodb_saver = PruningMongoDBSaver(
+            client=get_mongodb_client(),
+            db_name=CHECKPOINT_DB_NAME,
+            checkpoint_collection_name=CHECKPOINT_COLLECTION_NAME,
+            writes_collection_name=CHECKPOINT_WRITE_COLLECTION_NAME,
+            # created_at and the TTL index only expire single documents
+            ttl=TTL_SECONDS if MONGODB_EXPIRY == "document" else None,
+            serde=compact_serializer()  # Opt in with CHECKPOINT_SERIALIZER=compact
+        )
+        if MONGODB_EXPIRY == "thread":
+            mongodb_saver.thread_expiry = ThreadExpiry(mongodb_saver.db[CHECKPOINT_THREAD_COLLECTION_NAME])
+            mongodb_saver.thread_expiry.start_sweeper(mongodb_saver.checkpoint_collection,
+                                                      mongodb_saver.writes_collection)
+        logger.info("MongoDBSaver instance created successfully.")
+        return mongodb_saver
+    except Exception as e:
+        logger.exception("Failed to create MongoDBSaver instance.")
+        raise
+
+@cache
+def get_mongodb_memory() -> BaseCheckpointSaver:
+    """The checkpointer of the sync graph."""
+    mongodb_saver = get_mongodb_saver()
+    # Keep only the latest checkpoints per thread (CHECKPOINT_COMPACTION / CHECKPOINT_KEEP_LAST),
+    # serve the latest checkpoint of recently used threads from process memory (CHECKPOINT_CACHE_*),
+    # and record get/put latency and payload sizes
+    return instrument_saver(
+        with_hot_cache(with_compaction(mongodb_saver), "mongodb", probe=mongodb_saver.latest_checkpoint_id),
+        "mongodb",
+    )
+
+# -----------------------------
+# Async MongoDB Saver
+# -----------------------------
+class AsyncMongoDBSaver(BaseCheckpointSaver):
+    """
+    Native async checkpoint saver built on pymongo's AsyncMongoClient.
+
+    MongoDBSaver's async methods only wrap the blocking calls in a thread pool; this saver
+    awaits the driver directly, so one event loop can serve many sessions without a worker
+    thread per in-flight checkpoint read or write. It uses the same document layout as
+    MongoDBSaver, so both savers can share the same collections (and the indexes the sync
+    saver creates at startup).
+    """
+
+    def __init__(self, client: AsyncMongoClient, db_name: str, checkpoint_collection_name: str,
+                 writes_collection_name: str, ttl: int | None = None, serde=None,
+                 thread_collection_name: str | None = None):
+        super().__init__(serde=serde)
+        self.client = client
+        self.db = client[db_name]
+        self.checkpoint_collection = self.db[checkpoint_collection_name]
+        self.writes_collection = self.db[writes_collection_name]
+        self.ttl = ttl
+        # Thread expiry, sharing the thread documents of the sync saver (which sweeps them)
+        self.thread_expiry = ThreadExpiry(self.db[thread_collection_name]) if thread_collection_name else None
+
+    def _to_tuple(self, doc: dict, writes: list) -> CheckpointTuple:
+        config_values = {
+            "thread_id": doc["thread_id"],
+            "checkpoint_ns": doc["checkpoint_ns"],
+            "checkpoint_id": doc["checkpoint_id"],
+        }
+        parent_config = None
+        if doc.get("parent_checkpoint_id"):
+            parent_config = {"configurable": {**config_values, "checkpoint_id": doc["parent_checkpoint_id"]}}
+        return CheckpointTuple(
+            {"configurable": config_values},
+            self.serde.loads_typed((doc["type"], doc["checkpoint"])),
+            loads_metadata(self.serde, doc["metadata"]),
+            parent_config,
+            [
+                (write["task_id"], write["channel"], self.serde.loads_typed((write["type"], write["value"])))
+                for write in writes
+            ],
+        )
+
+    async def _pending_writes(self, doc: dict) -> list:
+        cursor = self.writes_collection.find({
+            "thread_id": doc["thread_id"],
+            "checkpoint_ns": doc["checkpoint_ns"],
+            "checkpoint_id": doc["checkpoint_id"],
+        }, sort=[("task_id", 1), ("idx", 1)])
+        return await cursor.to_list()
+
+    async def alatest_checkpoint_id(self, thread_id: str, checkpoint_ns: str = "") -> str | None:
+        doc = await self.checkpoint_collection.find_one(*_latest_query(thread_id, checkpoint_ns),
+                                                        sort=[("checkpoint_id", -1)])
+        return doc["checkpoint_id"] if doc else None
+
+    async def aget_tuple(self, config):
+        query = {
+            "thread_id": config["configurable"]["thread_id"],
+            "checkpoint_ns": config["configurable"].get("checkpoint_ns", ""),
+        }
+        if checkpoint_id := get_checkpoint_id(config):
+            query["checkpoint_id"] = checkpoint_id
+        doc = await self.checkpoint_collection.find_one(query, sort=[("checkpoint_id", -1)])
+        if doc is None:
+            return None
+        if self.thread_expiry is not None and self.thread_expiry.refresh_on_read:
+            await self.thread_expiry.atouch(query["thread_id"])
+        return self._to_tuple(doc, await self._pending_writes(doc))
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        query = {}
+        if config is not None:
+            for key in ("thread_id", "checkpoint_ns"):
+                if key in config["configurable"]:
+                    query[key] = config["configurable"][key]
+        for key, value in (filter or {}).items():
+            query[f"metadata.{key}"] = dumps_metadata(self.serde, value)
+        if before is not None:
+            query["checkpoint_id"] = {"$lt": before["configurable"]["checkpoint_id"]}
+
+        cursor = self.checkpoint_collection.find(query, sort=[("checkpoint_id", -1)], limit=limit or 0)
+        async for doc in cursor:
+            yield self._to_tuple(doc, await self._pending_writes(doc))
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        type_, serialized_checkpoint = self.serde.dumps_typed(checkpoint)
+        doc = {
+            "parent_checkpoint_id": config["configurable"].get("checkpoint_id"),
+            "type": type_,
+            "checkpoint": serialized_checkpoint,
+            "metadata": dumps_metadata(self.serde, get_checkpoint_metadata(config, metadata)),
+        }
+        if self.ttl:
+            doc["created_at"] = datetime.now(tz=timezone.utc)
+        await self.checkpoint_collection.update_one(
+            {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]},
+            {"$set": doc},
+            upsert=True,
+        )
+        if self.thread_expiry is not None:
+            await self.thread_expiry.atouch(thread_id)
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        # Writes may only overwrite existing ones when they are all special (e.g. error) channels
+        set_method = "$set" if all(w[0] in WRITES_IDX_MAP for w in writes) else "$setOnInsert"
+        now = datetime.now(tz=timezone.utc)
+        operations = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, serialized_value = self.serde.dumps_typed(value)
+            update_doc = {"channel": channel, "type": type_, "value": serialized_value}
+            if self.ttl:
+                update_doc["created_at"] = now
+            operations.append(UpdateOne(
+                {
+                    "thread_id": config["configurable"]["thread_id"],
+                    "checkpoint_ns": config["configurable"]["checkpoint_ns"],
+                    "checkpoint_id": config["configurable"]["checkpoint_id"],
+                    "task_id": task_id,
+                    "task_path": task_path,
+                    "idx": WRITES_IDX_MAP.get(channel, idx),
+                },
+                {set_method: update_doc},
+                upsert=True,
+            ))
+        if operations:
+            await self.writes_collection.bulk_write(operations)
+
+    async def adelete_thread(self, thread_id: str):
+        await self.checkpoint_collection.delete_many({"thread_id": thread_id})
+        await self.writes_collection.delete_many({"thread_id": thread_id})
+        if self.thread_expiry is not None:
+            await self.thread_expiry.collection.delete_one({"_id": thread_id})
+
+    async def aprune(self, thread_ids, *, strategy: str = "keep_latest", keep_last: int | None = None):
+        """Async counterpart of PruningMongoDBSaver.prune."""
+        if keep_last is None:
+            keep_last = 0 if strategy == "delete" else 1
+        for thread_id in thread_ids:
+            for checkpoint_ns in await self.checkpoint_collection.distinct("checkpoint_ns", {"thread_id": thread_id}):
+                cutoff_id = None
+                if keep_last:
+                    retained = await self.checkpoint_collection.find(
+                        {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns}, {"checkpoint_id": 1},
+                        sort=[("checkpoint_id", -1)], skip=keep_last - 1, limit=1,
+                    ).to_list()
+                    if not retained:
+                        continue
+                    cutoff_id = retained[0]["checkpoint_id"]
+                query = _prune_filters(thread_id, checkpoint_ns, cutoff_id)
+                await self.checkpoint_collection.delete_many(query)
+                await self.writes_collection.delete_many(query)
+
+# -----------------------------
+# Create AsyncMongoDBSaver Instance
+# -----------------------------
+@cache
+def get_async_mongodb_memory() -> BaseCheckpointSaver:
+    """The checkpointer of the async graph."""
+    # The async client connects lazily, on first use from the serving event loop
+    async_mongodb_client = AsyncMongoClient(require_mongodb_uri())
+    async_mongodb_saver = AsyncMongoDBSaver(
+        client=async_mongodb_client,
         db_name=CHECKPOINT_DB_NAME,
         checkpoint_collection_name=CHECKPOINT_COLLECTION_NAME,
         writes_collection_name=CHECKPOINT_WRITE_COLLECTION_NAME,
-        ttl=TTL_SECONDS
+        ttl=TTL_SECONDS if MONGODB_EXPIRY == "document" else None,
+        serde=compact_serializer(),
+        thread_collection_name=CHECKPOINT_THREAD_COLLECTION_NAME if MONGODB_EXPIRY == "thread" else None,
+    )
+    # Background compaction of async sessions goes through the sync saver, which shares the collections
+    # (and bootstraps their indexes and runs the expiry sweeper)
+    async_mongodb_memory = instrument_saver(
+        with_hot_cache(with_compaction(async_mongodb_saver, pruner=get_mongodb_saver()), "mongodb",
+                       aprobe=async_mongodb_saver.alatest_checkpoint_id),
+        "mongodb",
     )
-    logger.info("MongoDBSaver instance created successfully.")
-except Exception as e:
-    logger.exception("Failed to create MongoDBSaver instance.")
-    raise
\ No newline at end of file
+    logger.info("AsyncMongoDBSaver instance created successfully.")
+    return async_mongodb_memory
@@ -0,0 +1,227 @@
+import copy
+import threading
+import time
+import logging
+from collections import OrderedDict
+from os import getenv
+
+from langgraph.checkpoint.base import BaseCheckpointSaver, CheckpointTuple, get_checkpoint_id, get_checkpoint_metadata
+
+from instrumentation import CHECKPOINT_CACHE_LOOKUPS, CHECKPOINT_CACHE_SAVED
+
+# -------------------- Setup Logging --------------------
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# -------------------- Hot Cache Configuration --------------------
+CHECKPOINT_CACHE_SIZE = int(getenv("CHECKPOINT_CACHE_SIZE", 1000))  # Threads kept per process, 0 = no cache
+# 'version' checks the latest checkpoint id in the backend before serving a cached checkpoint
+# (one small read instead of the full document), so replicas writing the same thread stay
+# consistent. 'none' trusts the cache: only safe when every thread is served by one process.
+CHECKPOINT_CACHE_VALIDATE = getenv("CHECKPOINT_CACHE_VALIDATE", "version")
+
+# -------------------- Tiered Checkpoint Saver --------------------
+class TieredCheckpointSaver(BaseCheckpointSaver):
+    """
+    Write-through, per-process LRU of the latest checkpoint of recently used threads, in
+    front of a Redis or MongoDB saver.
+
+    Every put goes to the backend first and then replaces the cached checkpoint of the
+    thread, so the next turn of a session reads it from memory instead of fetching and
+    deserializing it again. Checkpoints are cached as Python objects and copied on the way
+    in and out, as the graph mutates the values it is given.
+
+    `probe(thread_id, checkpoint_ns)` (and `aprobe` for the async path) returns the id of
+    the latest checkpoint in the backend; it is used to validate cached entries unless
+    `validate` is 'none'.
+    """
+
+    def __init__(self, saver: BaseCheckpointSaver, saver_name: str, probe=None, aprobe=None,
+                 max_threads: int = CHECKPOINT_CACHE_SIZE, validate: str = CHECKPOINT_CACHE_VALIDATE):
+        super().__init__(serde=saver.serde)
+        if validate == "version" and probe is None and aprobe is None:
+            raise ValueError("validate='version' needs a probe for the latest checkpoint id")
+        self.saver = saver
+        self.saver_name = saver_name
+        self.probe = probe
+        self.aprobe = aprobe
+        self.max_threads = max_threads
+        self.validate = validate
+        self._entries = OrderedDict()  # (thread_id, checkpoint_ns) -> CheckpointTuple, least recent first
+        self._lock = threading.Lock()
+        self._lookups = {"hit": 0, "miss": 0, "stale": 0}
+        self._backend_seconds = None  # Moving average of backend reads, to estimate the latency saved
+
+    def __getattr__(self, name):
+        # Expose everything else of the wrapped saver (setup, asetup, loop, ...)
+        if name == "saver":
+            raise AttributeError(name)
+        return getattr(self.saver, name)
+
+    @property
+    def config_specs(self) -> list:
+        return self.saver.config_specs
+
+    def get_next_version(self, current, channel):
+        return self.saver.get_next_version(current, channel)
+
+    # ---- Cache ----
+    @staticmethod
+    def _key(config) -> tuple:
+        return config["configurable"]["thread_id"], config["configurable"].get("checkpoint_ns", "")
+
+    def _cached(self, key: tuple, checkpoint_id: str | None) -> CheckpointTuple | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (checkpoint_id and checkpoint_id != entry.config["configurable"]["checkpoint_id"]):
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def _store(self, key: tuple, checkpoint_tuple: CheckpointTuple):
+        with self._lock:
+            self._entries[key] = checkpoint_tuple
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_threads:
+                self._entries.popitem(last=False)
+
+    def _forget(self, key: tuple):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def _forget_thread(self, thread_id: str):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == thread_id]:
+                del self._entries[key]
+
+    def _record(self, result: str, seconds: float):
+        with self._lock:
+            self._lookups[result] += 1
+            if result == "hit":
+                saved = max(0.0, (self._backend_seconds or 0.0) - seconds)
+            else:
+                self._backend_seconds = (seconds if self._backend_seconds is None
+                                         else 0.9 * self._backend_seconds + 0.1 * seconds)
+                saved = 0.0
+        CHECKPOINT_CACHE_LOOKUPS.inc(saver=self.saver_name, result=result)
+        if saved:
+            CHECKPOINT_CACHE_SAVED.inc(saved, saver=self.saver_name)
+
+    @staticmethod
+    def _written(config, checkpoint, metadata, next_config) -> CheckpointTuple:
+        """The tuple the backend would return for a checkpoint that was just put."""
+        parent_id = config["configurable"].get("checkpoint_id")
+        return CheckpointTuple(
+            config=next_config,
+            checkpoint=copy.deepcopy(checkpoint),
+            metadata=copy.deepcopy(get_checkpoint_metadata(config, metadata)),
+            parent_config=(
+                {"configurable": {**next_config["configurable"], "checkpoint_id": parent_id}}
+                if parent_id else None
+            ),
+            pending_writes=[],
+        )
+
+    @staticmethod
+    def _copy(checkpoint_tuple: CheckpointTuple, config) -> CheckpointTuple:
+        return checkpoint_tuple._replace(
+            config=config if get_checkpoint_id(config) else checkpoint_tuple.config,
+            checkpoint=copy.deepcopy(checkpoint_tuple.checkpoint),
+            metadata=copy.deepcopy(checkpoint_tuple.metadata),
+        )
+
+    def _is_current(self, key: tuple, entry: CheckpointTuple, latest_id: str | None) -> bool:
+        if latest_id == entry.config["configurable"]["checkpoint_id"]:
+            return True
+        self._forget(key)  # Written by another replica, or expired in the backend
+        return False
+
+    def stats(self) -> dict:
+        """Cached threads and lookup outcomes, for health checks."""
+        with self._lock:
+            lookups = dict(self._lookups)
+            threads = len(self._entries)
+        total = sum(lookups.values())
+        return {
+            "threads": threads,
+            "max_threads": self.max_threads,
+            "validate": self.validate,
+            **lookups,
+            "hit_ratio": lookups["hit"] / total if total else 0.0,
+            "backend_read_seconds": self._backend_seconds,
+        }
+
+    # ---- Checkpoint API ----
+    def get_tuple(self, config):
+        start = time.perf_counter()
+        key = self._key(config)
+        entry = self._cached(key, get_checkpoint_id(config))
+        result = "miss"
+        if entry is not None:
+            if self.validate != "version" or self._is_current(key, entry, self.probe(*key)):
+                self._record("hit", time.perf_counter() - start)
+                return self._copy(entry, config)
+            result = "stale"
+        checkpoint_tuple = self.saver.get_tuple(config)
+        if checkpoint_tuple is not None and not get_checkpoint_id(config):
+            self._store(key, self._copy(checkpoint_tuple, checkpoint_tuple.config))
+        self._record(result, time.perf_counter() - start)
+        return checkpoint_tuple
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        return self.saver.list(config, filter=filter, before=before, limit=limit)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        next_config = self.saver.put(config, checkpoint, metadata, new_versions)
+        self._store(self._key(config), self._written(config, checkpoint, metadata, next_config))
+        return next_config
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        # Pending writes are read back only after an interrupted or failed step: leave them to the backend
+        self._forget(self._key(config))
+        self.saver.put_writes(config, writes, task_id, task_path)
+
+    def delete_thread(self, thread_id):
+        self._forget_thread(thread_id)
+        self.saver.delete_thread(thread_id)
+
+    async def aget_tuple(self, config):
+        start = time.perf_counter()
+        key = self._key(config)
+        entry = self._cached(key, get_checkpoint_id(config))
+        result = "miss"
+        if entry is not None:
+            if self.validate != "version" or self._is_current(key, entry, await self.aprobe(*key)):
+                self._record("hit", time.perf_counter() - start)
+                return self._copy(entry, config)
+            result = "stale"
+        checkpoint_tuple = await self.saver.aget_tuple(config)
+        if checkpoint_tuple is not None and not get_checkpoint_id(config):
+            self._store(key, self._copy(checkpoint_tuple, checkpoint_tuple.config))
+        self._record(result, time.perf_counter() - start)
+        return checkpoint_tuple
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        async for item in self.saver.alist(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        next_config = await self.saver.aput(config, checkpoint, metadata, new_versions)
+        self._store(self._key(config), self._written(config, checkpoint, metadata, next_config))
+        return next_config
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        self._forget(self._key(config))
+        await self.saver.aput_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        self._forget_thread(thread_id)
+        await self.saver.adelete_thread(thread_id)
+
+def with_hot_cache(saver: BaseCheckpointSaver, saver_name: str, probe=None, aprobe=None,
+                   max_threads: int = CHECKPOINT_CACHE_SIZE):
+    """Put the per-process checkpoint cache in front of a saver, unless CHECKPOINT_CACHE_SIZE is 0."""
+    if not max_threads:
+        return saver
+    logger.info("Checkpoint hot cache: %d threads, validate=%s", max_threads, CHECKPOINT_CACHE_VALIDATE)
+    return TieredCheckpointSaver(saver, saver_name, probe=probe, aprobe=aprobe, max_threads=max_threads)
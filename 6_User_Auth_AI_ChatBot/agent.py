@@ -1,10 +1,23 @@
+from functools import cache
 from typing import TypedDict, Annotated
 from langgraph.graph import StateGraph, END, add_messages
-from langgraph.checkpoint.memory import MemorySaver
-from langchain_openai import ChatOpenAI
+from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage, SystemMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.runnables import RunnableConfig, RunnableLambda
 from dotenv import load_dotenv
 from os import getenv
-from redis_checkpoint import redis_checkpoint_saver
+import redis_checkpoint
+import sqlite_checkpoint
+from response_cache import create_response_cache
+from rate_limiter import create_rate_limiter
+from thread_lock import create_thread_locks
+from idempotency import create_idempotency_store
+from fake_llm import FakeChatModel
+from instrumentation import (LLM_CIRCUIT_STATE, LLM_RESILIENCE_EVENTS, ROUTER_DECISIONS, llm_metrics_callback,
+                             timed_node)
+from llm_resilience import CIRCUIT_STATES, LLM_FALLBACK, LLM_TIMEOUT, LLMResilience
+from model_router import LARGE, ROUTER_SMALL_MODEL, SMALL, ModelRouter
+from llm_scheduler import LLMScheduler, PRIORITY_ANONYMOUS, PRIORITY_AUTHENTICATED
 import logging
 
 # -------------------- Setup Logging --------------------
@@ -16,25 +29,323 @@ load_dotenv()
 openai_api_model = "gpt-4-turbo"
 logger.info("Environment variables loaded. Using OpenAI model: %s", openai_api_model)
 
-# -------------------- Initialize OpenAI Chat Model --------------------
-llm = ChatOpenAI(model=openai_api_model)
-logger.info("OpenAI Chat model initialized.")
+# -------------------- OpenAI Chat Models --------------------
+# Created on first use: langchain_openai is slow to import and the clients slow to build,
+# and neither is needed to import this module (benchmarks may also assign stand-ins here)
+llm = None  # Large model
+small_llm = None  # Small, fast model for simple turns and summaries
+
+def get_llm(route: str = LARGE):
+    global llm, small_llm
+    if (llm if route == LARGE else small_llm) is not None:
+        return llm if route == LARGE else small_llm
+    # FAKE_LLM=1 swaps OpenAI for a local fake model so the app can be load-tested offline,
+    # optionally with injected errors and stalls to exercise the resilience layer
+    if getenv("FAKE_LLM"):
+        model = FakeChatModel(
+            model_name=f"fake-{route}",
+            latency=float(getenv("FAKE_LLM_LATENCY", 0.5)),
+            tokens_per_second=float(getenv("FAKE_LLM_TOKENS_PER_SECOND", 50)),
+            error_rate=float(getenv("FAKE_LLM_ERROR_RATE", 0)),
+            stall_rate=float(getenv("FAKE_LLM_STALL_RATE", 0)),
+            stall_latency=float(getenv("FAKE_LLM_STALL_LATENCY", 10)),
+        )
+        logger.info("Fake LLM initialized for the %s route (offline mode).", route)
+    else:
+        from langchain_openai import ChatOpenAI
+        # No retries in the client: llm_resilience retries, within its deadline and budget
+        model = ChatOpenAI(model=openai_api_model if route == LARGE else ROUTER_SMALL_MODEL,
+                           timeout=LLM_TIMEOUT, max_retries=0)
+        logger.info("OpenAI Chat model initialized: %s", model.model_name)
+    if route == LARGE:
+        llm = model
+    else:
+        small_llm = model
+    return model
+
+# -------------------- LLM Resilience --------------------
+# Every LLM call is bounded by a deadline, retried on transient errors with jittered backoff,
+# optionally hedged, and sent to the other model when the chosen one fails or its circuit is
+# open (LLM_* variables, see llm_resilience.py)
+llm_resilience = LLMResilience(
+    on_event=lambda model, event: LLM_RESILIENCE_EVENTS.inc(model=model, event=event),
+    on_circuit=lambda model, state: LLM_CIRCUIT_STATE.set(CIRCUIT_STATES[state], model=model),
+)
+logger.info("LLM resilience: timeout=%ss, retries=%d, hedging=%s, fallback=%s",
+            llm_resilience.timeout, llm_resilience.retries, llm_resilience.hedge, LLM_FALLBACK)
+
+def resilient_llm(route: str):
+    """The route's model, falling back to the other route's model, for llm_scheduler.invoke()."""
+    fallback = get_llm(SMALL if route == LARGE else LARGE) if LLM_FALLBACK else None
+    return llm_resilience.bind(get_llm(route), fallback)
+
+# -------------------- Initialize LLM Scheduler --------------------
+# Every LLM call of the graph goes through the scheduler: identical concurrent prompts share
+# one call and each model gets a concurrency / tokens-per-minute budget (LLM_* variables)
+llm_scheduler = LLMScheduler(callbacks=[llm_metrics_callback])
+logger.info("LLM scheduler: max concurrency=%d, tokens per minute=%s, coalescing=%s",
+            llm_scheduler.max_concurrency, llm_scheduler.tokens_per_minute or "unlimited", llm_scheduler.coalesce)
+
+def call_priority(config: RunnableConfig) -> int:
+    """Logged-in users (a 'user' in the run config) are served ahead of anonymous API clients."""
+    return PRIORITY_AUTHENTICATED if config.get("configurable", {}).get("user") else PRIORITY_ANONYMOUS
+
+# -------------------- Checkpoint Backend --------------------
+# 'redis' (shared by every replica) or 'sqlite' (a local file, for single-node deployments
+# without a Redis server); both modules expose the same getters
+CHECKPOINT_BACKEND = getenv("CHECKPOINT_BACKEND", "redis")
+checkpoint_backend = sqlite_checkpoint if CHECKPOINT_BACKEND == "sqlite" else redis_checkpoint
+# Default backend of the rate limiter, thread locks and turn deduplication: with SQLite
+# checkpoints nothing needs a Redis server, so they stay in process
+SHARED_STATE_BACKEND = "memory" if CHECKPOINT_BACKEND == "sqlite" else "redis"
+
+# -------------------- Initialize Response Cache --------------------
+# Backend for cached LLM responses: 'memory' (in-process LRU), 'redis' or 'off'
+RESPONSE_CACHE_BACKEND = getenv("RESPONSE_CACHE_BACKEND", "memory")
+
+@cache
+def get_response_cache():
+    # Built on first use: the Redis backend needs the Redis connection
+    logger.info("Response cache backend: %s", RESPONSE_CACHE_BACKEND)
+    return create_response_cache(RESPONSE_CACHE_BACKEND)
+
+# -------------------- Initialize Rate Limiter --------------------
+# Per-user request and LLM token limits (RATE_LIMIT_* variables): 'redis' (shared by every
+# replica, in-process fallback when Redis is down), 'memory' (per process) or 'off'
+RATE_LIMIT_BACKEND = getenv("RATE_LIMIT_BACKEND", SHARED_STATE_BACKEND)
+
+@cache
+def get_rate_limiter():
+    logger.info("Rate limiter backend: %s", RATE_LIMIT_BACKEND)
+    return create_rate_limiter(RATE_LIMIT_BACKEND)
+
+def check_rate_limit(user: str, prompt: str):
+    """Admission check to run before invoking the graph for a user; returns a rate_limiter.Decision."""
+    rate_limiter = get_rate_limiter()
+    if rate_limiter is None:
+        return None
+    return rate_limiter.check(user, count_tokens_approximately([HumanMessage(content=prompt)]))
+
+async def acheck_rate_limit(user: str, prompt: str):
+    """check_rate_limit for the event loop: the Redis limiter's sync client runs in a thread."""
+    rate_limiter = get_rate_limiter()
+    if rate_limiter is None:
+        return None
+    return await rate_limiter.acheck(user, count_tokens_approximately([HumanMessage(content=prompt)]))
+
+def used_tokens(prompt: list, response) -> int:
+    usage = getattr(response, "usage_metadata", None)
+    return usage["total_tokens"] if usage else count_tokens_approximately(prompt + [response])
+
+def charge_usage(config: RunnableConfig, prompt: list, response):
+    """Charge the tokens of an LLM call to the user's token limits."""
+    user = config.get("configurable", {}).get("user")
+    if user is None or (rate_limiter := get_rate_limiter()) is None:
+        return
+    rate_limiter.record_usage(user, used_tokens(prompt, response))
+
+async def acharge_usage(config: RunnableConfig, prompt: list, response):
+    user = config.get("configurable", {}).get("user")
+    if user is None or (rate_limiter := get_rate_limiter()) is None:
+        return
+    await rate_limiter.arecord_usage(user, used_tokens(prompt, response))
+
+# -------------------- Initialize Thread Locks --------------------
+# One turn at a time per conversation thread: 'redis' (across every worker process sharing
+# the Redis server, see front_router.py), 'memory' (within this process) or 'off'
+THREAD_LOCK_BACKEND = getenv("THREAD_LOCK_BACKEND", SHARED_STATE_BACKEND)
+
+@cache
+def get_thread_locks():
+    logger.info("Thread lock backend: %s", THREAD_LOCK_BACKEND)
+    return create_thread_locks(THREAD_LOCK_BACKEND)
+
+# -------------------- Initialize Turn Deduplication --------------------
+# Repeated submissions of a turn (client retries, double submits) get the original's response
+# instead of running the graph again: 'redis' (across replicas), 'memory' (per process) or 'off'
+IDEMPOTENCY_BACKEND = getenv("IDEMPOTENCY_BACKEND", SHARED_STATE_BACKEND)
+
+@cache
+def get_idempotency_store():
+    logger.info("Idempotency backend: %s", IDEMPOTENCY_BACKEND)
+    return create_idempotency_store(IDEMPOTENCY_BACKEND)
+
+# -------------------- Context Window Configuration --------------------
+# Approximate token budget for the verbatim part of the prompt sent to the LLM
+CONTEXT_TOKEN_BUDGET = int(getenv("CONTEXT_TOKEN_BUDGET", 3000))
+# Maximum number of most recent turns (user message + reply) kept verbatim
+CONTEXT_MAX_TURNS = int(getenv("CONTEXT_MAX_TURNS", 6))
+logger.info("Context window: budget=%d tokens, max turns=%d", CONTEXT_TOKEN_BUDGET, CONTEXT_MAX_TURNS)
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a user and an AI assistant. "
+    "Extend the existing summary with the new messages below. Keep facts, names, decisions "
+    "and open questions; drop pleasantries. Reply with the updated summary only.\n\n"
+    "Existing summary:\n{summary}\n\nNew messages:\n{messages}"
+)
 
 # -------------------- Define Chat State --------------------
 class BasicChatState(TypedDict):
     # The state holds a list of messages, which will be passed between nodes
     messages: Annotated[list, add_messages]
+    # Running summary of the turns that fell out of the context window
+    summary: str
+    # Number of leading messages already folded into the summary
+    summarized_upto: int
+    # Model chosen by the router for the current turn
+    route: str
+
+# -------------------- Define Context Window Node --------------------
+def window_start(messages: list) -> int:
+    """
+    Return the index of the first message kept verbatim: the start of the oldest of the
+    last CONTEXT_MAX_TURNS turns that still fits in CONTEXT_TOKEN_BUDGET.
+    The latest turn is always kept, even if it alone exceeds the budget.
+    """
+    turn_starts = [i for i, m in enumerate(messages) if isinstance(m, HumanMessage)]
+    if not turn_starts:
+        return 0
+    start = turn_starts[-1]
+    for candidate in reversed(turn_starts[-CONTEXT_MAX_TURNS:-1]):
+        if count_tokens_approximately(messages[candidate:]) > CONTEXT_TOKEN_BUDGET:
+            break
+        start = candidate
+    return start
+
+def summary_request(state: BasicChatState):
+    """
+    Return the summarization prompt and the new window start when turns fell out of the
+    window since the last summary, or None when the summary is still up to date.
+    """
+    messages = state["messages"]
+    summarized_upto = state.get("summarized_upto", 0)
+    start = window_start(messages)
+    if start <= summarized_upto:
+        return None
+
+    dropped = messages[summarized_upto:start]
+    logger.info("Folding %d messages into the running summary.", len(dropped))
+    transcript = "\n".join(f"{m.type}: {m.content}" for m in dropped)
+    prompt = [HumanMessage(content=SUMMARY_PROMPT.format(
+        summary=state.get("summary") or "(none)", messages=transcript
+    ))]
+    return prompt, start
+
+@timed_node("trim_context")
+def trim_context(state: BasicChatState, config: RunnableConfig):
+    """
+    Pre-LLM node enforcing the context window.
+    Turns that fall out of the window are folded into the running summary. The summary is
+    only extended with the newly dropped turns, never rebuilt from the full history.
+    """
+    request = summary_request(state)
+    if request is None:
+        return {}
+    prompt, start = request
+    summary = llm_scheduler.invoke(resilient_llm(SUMMARY_ROUTE), prompt, call_priority(config))
+    charge_usage(config, prompt, summary)
+    return {
+        "summary": summary.content,
+        "summarized_upto": start,
+    }
+
+@timed_node("trim_context")
+async def atrim_context(state: BasicChatState, config: RunnableConfig):
+    """Async variant of trim_context, used by ainvoke/astream."""
+    request = summary_request(state)
+    if request is None:
+        return {}
+    prompt, start = request
+    summary = await llm_scheduler.ainvoke(resilient_llm(SUMMARY_ROUTE), prompt, call_priority(config))
+    await acharge_usage(config, prompt, summary)
+    return {
+        "summary": summary.content,
+        "summarized_upto": start,
+    }
+
+def build_prompt(state: BasicChatState) -> list:
+    """Return the messages sent to the LLM: the running summary followed by the verbatim window."""
+    prompt = state["messages"][state.get("summarized_upto", 0):]
+    if state.get("summary"):
+        prompt = [SystemMessage(content="Summary of the earlier conversation:\n" + state["summary"])] + prompt
+    return prompt
+
+# -------------------- Define Router Node --------------------
+# Picks the small or the large model for the turn from cheap features of the prompt actually
+# sent (running summary + verbatim window), see model_router.py and the ROUTER_* variables
+model_router = ModelRouter()
+logger.info("Model routing policy: %s, small model: %s", model_router.policy, ROUTER_SMALL_MODEL)
+
+# Folding turns into the summary is routine work: the small model does it unless routing is off
+SUMMARY_ROUTE = LARGE if model_router.policy == LARGE else SMALL
+
+@timed_node("router")
+def router(state: BasicChatState):
+    decision = model_router.route(build_prompt(state))
+    ROUTER_DECISIONS.inc(route=decision.route, reason=decision.reason)
+    return {"route": decision.route}
+
+async def arouter(state: BasicChatState):
+    # Pure computation: run it on the event loop instead of a worker thread
+    return router(state)
 
 # -------------------- Define Chatbot Node --------------------
-def chatbot(state: BasicChatState):
+def cached_response(prompt: list):
+    """Return the node update for a cached response to this prompt, or None on a miss."""
+    response_cache = get_response_cache()
+    if response_cache is None:
+        return None
+    return cache_hit(response_cache, response_cache.lookup(prompt))
+
+async def acached_response(prompt: list):
+    response_cache = get_response_cache()
+    if response_cache is None:
+        return None
+    # The Redis backend's sync client would block the event loop: alookup runs it in a thread
+    return cache_hit(response_cache, await response_cache.alookup(prompt))
+
+def cache_hit(response_cache, cached: str | None):
+    if cached is None:
+        return None
+    logger.info("Response served from cache (hit rate %.2f).", response_cache.stats.hit_rate)
+    return {
+        "messages": [AIMessage(content=cached)]
+    }
+
+@timed_node("chatbot")
+def chatbot(state: BasicChatState, config: RunnableConfig):
     """
     This function represents a node in the LangGraph.
     It takes the current state (messages) and returns the updated state
     after invoking the LLM.
     """
+    prompt = build_prompt(state)
+    if (cached := cached_response(prompt)) is not None:
+        return cached
+
     logger.info("Invoking LLM with current messages.")
-    response = llm.invoke(state["messages"])
+    response = llm_scheduler.invoke(resilient_llm(state.get("route", LARGE)), prompt, call_priority(config))
+    charge_usage(config, prompt, response)
+    logger.info("LLM response received.")
+    if (response_cache := get_response_cache()) is not None:
+        response_cache.store(prompt, response.content)
+    return {
+        "messages": [response]
+    }
+
+@timed_node("chatbot")
+async def achatbot(state: BasicChatState, config: RunnableConfig):
+    """Async variant of chatbot: awaits the LLM so the event loop can serve other sessions meanwhile."""
+    prompt = build_prompt(state)
+    if (cached := await acached_response(prompt)) is not None:
+        return cached
+
+    logger.info("Invoking LLM asynchronously with current messages.")
+    response = await llm_scheduler.ainvoke(resilient_llm(state.get("route", LARGE)), prompt, call_priority(config))
+    await acharge_usage(config, prompt, response)
     logger.info("LLM response received.")
+    if (response_cache := get_response_cache()) is not None:
+        await response_cache.astore(prompt, response.content)
     return {
         "messages": [response]
     }
@@ -43,18 +354,61 @@ def chatbot(state: BasicChatState):
 logger.info("Creating LangGraph...")
 graph = StateGraph(BasicChatState)
 
-# Add chatbot node to the graph
-graph.add_node("chatbot", chatbot)
-logger.info("Node 'chatbot' added to the graph.")
+# Add context window, router and chatbot nodes to the graph
+# Each node has a sync and an async implementation: invoke/stream use the former,
+# ainvoke/astream the latter
+graph.add_node("trim_context", RunnableLambda(trim_context, afunc=atrim_context))
+graph.add_node("router", RunnableLambda(router, afunc=arouter))
+graph.add_node("chatbot", RunnableLambda(chatbot, afunc=achatbot))
+logger.info("Nodes 'trim_context', 'router' and 'chatbot' added to the graph.")
+
+# Trim the context, then pick the model for the trimmed prompt, before every LLM call
+graph.add_edge("trim_context", "router")
+graph.add_edge("router", "chatbot")
 
 # Define the edge from chatbot to END (terminal node)
 graph.add_edge("chatbot", END)
 logger.info("Edge from 'chatbot' to END added.")
 
 # Set the entry point of the graph
-graph.set_entry_point("chatbot")
-logger.info("Entry point set to 'chatbot'.")
+graph.set_entry_point("trim_context")
+logger.info("Entry point set to 'trim_context'.")
+
+# Compile the graph with the checkpoint backend, once, when the agent is first needed
+# (this is also when Redis is connected to, or the SQLite file opened)
+@cache
+def get_chat_agent():
+    chat_agent = graph.compile(checkpointer=checkpoint_backend.get_checkpoint_saver())
+    logger.info("LangGraph compiled with %s checkpointing.", CHECKPOINT_BACKEND)
+    return chat_agent
+
+# Compile the same graph with the async checkpointer for use on an event loop (ainvoke/astream).
+# Await checkpoint_backend.setup_async_checkpoint_saver() once before first use.
+@cache
+def get_async_chat_agent():
+    async_chat_agent = graph.compile(checkpointer=checkpoint_backend.get_async_checkpoint_saver())
+    logger.info("LangGraph compiled with async %s checkpointing.", CHECKPOINT_BACKEND)
+    return async_chat_agent
+
+# -------------------- Retried Turns --------------------
+# A turn that failed (LLM error, cancelled stream) leaves its user message checkpointed without
+# a reply. Its retry, which holds the turn's idempotency claim, drops that message before
+# running the graph, so the thread does not get the same message twice.
+def unanswered_input(messages: list, prompt: str):
+    """The unanswered user message a failed run of `prompt` left at the end of the thread, or None."""
+    if messages and messages[-1].type == "human" and messages[-1].content == prompt:
+        return messages[-1]
+    return None
+
+def drop_unanswered_input(config: dict, prompt: str):
+    chat_agent = get_chat_agent()
+    orphan = unanswered_input(chat_agent.get_state(config).values.get("messages", []), prompt)
+    if orphan is not None:
+        # Recorded as the chatbot's update: nothing is left to run until the next input
+        chat_agent.update_state(config, {"messages": [RemoveMessage(id=orphan.id)]}, as_node="chatbot")
 
-# Compile the graph with Redis-based checkpointing
-chat_agent = graph.compile(checkpointer=redis_checkpoint_saver)
-logger.info("LangGraph compiled with Redis checkpointing.")
+async def adrop_unanswered_input(config: dict, prompt: str):
+    async_chat_agent = get_async_chat_agent()
+    orphan = unanswered_input((await async_chat_agent.aget_state(config)).values.get("messages", []), prompt)
+    if orphan is not None:
+        await async_chat_agent.aupdate_state(config, {"messages": [RemoveMessage(id=orphan.id)]}, as_node="chatbot")
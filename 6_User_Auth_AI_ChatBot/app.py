@@ -1,20 +1,36 @@
 import streamlit as st
-from dataclasses import dataclass
 from langchain.schema import HumanMessage
-from agent import chat_agent
+from agent import check_rate_limit, checkpoint_backend, drop_unanswered_input, get_chat_agent, get_idempotency_store
+from idempotency import TurnInProgressError, turn_key
+from chat_history import ASSISTANT, HISTORY_VISIBLE, USER, render_history
+from user_store import Authenticator, create_user_store, seed_demo_users
+from session_token import SessionTokens
+from instrumentation import TURN_DURATION, start_metrics_server
 import uuid
 import logging
-import hashlib
+import time
+from collections import deque
+from statistics import median
 
 # -------------------- Setup Logging --------------------
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# -------------------- Simulated User Database --------------------
-USER_DB = {
-    "alice": hashlib.sha256("password123".encode()).hexdigest(),
-    "bob": hashlib.sha256("securepass".encode()).hexdigest(),
-}
+# -------------------- Users And Sessions --------------------
+# One user store, password-check pool and token signer per process, shared by every session
+@st.cache_resource
+def get_authenticator():
+    authenticator = Authenticator(create_user_store())
+    seed_demo_users(authenticator)
+    return authenticator
+
+@st.cache_resource
+def get_session_tokens():
+    return SessionTokens()
+
+def current_user() -> str | None:
+    """Username of the session's signed token; no password check happens on reruns."""
+    return get_session_tokens().verify(st.session_state.get("session_token"))
 
 # -------------------- Authentication Function --------------------
 def login():
@@ -25,78 +41,165 @@ def login():
     login_btn = st.button("Login")
 
     if login_btn:
-        hashed_pw = hashlib.sha256(password.encode()).hexdigest()
-        if username in USER_DB and USER_DB[username] == hashed_pw:
-            st.session_state["authenticated"] = True
+        # The password check runs on the authenticator's pool, bounded so a burst of logins
+        # cannot take the CPU away from chat sessions
+        with st.spinner("Checking credentials..."):
+            valid = get_authenticator().submit(username, password).result()
+        if valid:
+            st.session_state["session_token"] = get_session_tokens().issue(username)
             st.session_state["username"] = username
-            st.success(f"Welcome, {username}!")
+            logger.info("User %s logged in.", username)
+            st.rerun()
         else:
             st.error("Invalid credentials")
 
-# -------------------- Message Data Structure --------------------
-@dataclass
-class Message:
-    actor: str
-    payload: str
-
-# Constants for message roles
-USER = "user"
-ASSISTANT = "ai"
-MESSAGES = "messages"
+# -------------------- Chat Agent --------------------
+# Built on the first request instead of at import (LLM client, checkpointer connections,
+# graph compilation), once per process, and shared by every session across reruns
+@st.cache_resource
+def load_chat_agent():
+    return get_chat_agent()
+
+# -------------------- Latency Tracking --------------------
+# Rolling latency samples shared by every session served by this process.
+# Time-to-first-token and total turn latency are tracked separately so the
+# perceived latency (first token) can be watched independently of the LLM completion time.
+LATENCY_WINDOW = 500
+
+@st.cache_resource
+def get_latency_samples():
+    return {"ttft": deque(maxlen=LATENCY_WINDOW), "total": deque(maxlen=LATENCY_WINDOW)}
+
+@st.cache_resource
+def get_metrics_server():
+    # One /metrics endpoint per process (METRICS_PORT), shared by every session
+    return start_metrics_server()
+
+@st.cache_resource
+def get_thread_index():
+    # Kept by the checkpoint backend (Redis or the SQLite file), for as long as the checkpoints
+    return checkpoint_backend.get_thread_index()
+
+def record_latency(metric: str, seconds: float):
+    TURN_DURATION.observe(seconds, stage=metric)
+    samples = get_latency_samples()[metric]
+    samples.append(seconds)
+    logger.info("%s: %.3fs (p50 over last %d turns: %.3fs)", metric, seconds, len(samples), median(samples))
+
+# -------------------- Streaming Response --------------------
+def stream_response(prompt: str, config: dict):
+    """
+    Stream the assistant's reply token by token.
+    Uses the graph's message-level streaming so tokens from the 'chatbot' node are
+    yielded as soon as the LLM produces them; the checkpointer still stores the
+    final message once, when the node finishes.
+    """
+    start = time.perf_counter()
+    first_token = True
+    for chunk, metadata in load_chat_agent().stream({
+        "messages": [HumanMessage(content=prompt)]
+    }, config=config, stream_mode="messages"):
+        if metadata.get("langgraph_node") != "chatbot" or not chunk.content:
+            continue
+        if first_token:
+            record_latency("ttft", time.perf_counter() - start)
+            first_token = False
+        yield chunk.content
+    record_latency("total", time.perf_counter() - start)
+
+def answer(prompt: str, config: dict) -> str:
+    """
+    Write the assistant's reply to the chat. A duplicate of a turn still being answered (a
+    double submit, or the same thread open in two tabs) shows the original's reply instead of
+    running the graph again.
+    """
+    store = get_idempotency_store()
+    if store is None:
+        return st.chat_message(ASSISTANT).write_stream(stream_response(prompt, config))
+    messages = load_chat_agent().get_state(config).values.get("messages", [])
+    with store.turn(turn_key(config["configurable"]["thread_id"], messages, prompt)) as claim:
+        if claim.duplicate:
+            st.chat_message(ASSISTANT).write(claim.response)
+        else:
+            drop_unanswered_input(config, prompt)  # Left by a failed run of this turn
+            claim.response = st.chat_message(ASSISTANT).write_stream(stream_response(prompt, config))
+    return claim.response
 
 # -------------------- Streamlit UI Setup --------------------
 st.set_page_config(page_title="AI Chatbot", page_icon="🤖")
+get_metrics_server()
 st.title("🤖 AI Chatbot with User Authentication")
 
 # -------------------- Logoff Button --------------------
-if "authenticated" in st.session_state and st.session_state["authenticated"]:
+if current_user() is not None:
     if st.sidebar.button("Logoff"):
         st.session_state.clear()
         st.rerun()
 
 # -------------------- Authentication Gate --------------------
-if "authenticated" not in st.session_state or not st.session_state["authenticated"]:
+# Sessions without a valid token (never logged in, or expired) get the login form
+if current_user() is None:
     login()
     st.stop()
 
 # -------------------- Session Initialization --------------------
-# Check if 'agent_config' exists in session state; if not, create a new session with a unique thread ID
-if "agent_config" not in st.session_state:
+def open_thread(thread_id: str):
+    """Point the session at a conversation thread; its history is read back from the checkpointer."""
     st.session_state["agent_config"] = {
         "configurable": {
-            "thread_id": st.session_state["username"] + ":" + str(uuid.uuid4())
+            "thread_id": thread_id,
+            # Authenticated sessions are scheduled ahead of anonymous API clients
+            "user": st.session_state["username"],
         }
     }
+    st.session_state.pop(HISTORY_VISIBLE, None)
+
+# Check if 'agent_config' exists in session state; if not, create a new session with a unique thread ID
+if "agent_config" not in st.session_state:
+    open_thread(st.session_state["username"] + ":" + str(uuid.uuid4()))
     logger.info("New session initialized with thread_id: %s", st.session_state["agent_config"]["configurable"]["thread_id"])
 else:
     logger.info("Existing session loaded with thread_id: %s", st.session_state["agent_config"]["configurable"]["thread_id"])
 
-# -------------------- Initialize Chat History --------------------
-if MESSAGES not in st.session_state:
-    st.session_state[MESSAGES] = [Message(actor=ASSISTANT, payload="Hi! How can I help you?")]
-    logger.info("Chat history initialized with welcome message.")
+# -------------------- Previous Conversations --------------------
+# Listed from the user's thread index; resuming one only loads its latest checkpoint
+current_thread_id = st.session_state["agent_config"]["configurable"]["thread_id"]
+if st.sidebar.button("New conversation"):
+    open_thread(st.session_state["username"] + ":" + str(uuid.uuid4()))
+    st.rerun()
+st.sidebar.subheader("Conversations")
+for thread in get_thread_index().list(st.session_state["username"]):
+    last_active = time.strftime("%b %d, %H:%M", time.localtime(thread.last_active))
+    if st.sidebar.button(f"{thread.title}  \n{last_active}", key=f"thread:{thread.thread_id}",
+                         disabled=thread.thread_id == current_thread_id, use_container_width=True):
+        logger.info("Resuming thread_id: %s", thread.thread_id)
+        open_thread(thread.thread_id)
+        st.rerun()
 
 # -------------------- Display Chat History --------------------
-for msg in st.session_state[MESSAGES]:
-    st.chat_message(msg.actor).write(msg.payload)
+# The history is read from the checkpointer, the single source of truth; only the latest
+# page is rendered, older messages are loaded on demand
+render_history(load_chat_agent(), st.session_state["agent_config"])
 
 # -------------------- Handle User Input --------------------
 if prompt := st.chat_input("Type your message..."):
     logger.info("User input received: %s", prompt)
 
-    # Append user message to chat history
-    st.session_state[MESSAGES].append(Message(actor=USER, payload=prompt))
     st.chat_message(USER).write(prompt)
 
-    # Invoke the LangGraph agent with the user message
-    result = chat_agent.invoke({
-        "messages": [HumanMessage(content=prompt)]
-    }, config=st.session_state["agent_config"])
-
-    # Extract and display the assistant's response
-    response: str = result["messages"][-1].content
+    # Per-user request and token limits, checked before the graph runs
+    decision = check_rate_limit(st.session_state["username"], prompt)
+    if decision is not None and not decision.allowed:
+        st.warning(f"You have reached your {decision.limit} limit. "
+                   f"Please try again in {max(1, round(decision.retry_after))} seconds.")
+        st.stop()
+
+    # Stream the assistant's response into the chat as tokens arrive
+    try:
+        response: str = answer(prompt, st.session_state["agent_config"])
+    except TurnInProgressError:
+        st.warning("This message is still being answered. Please try again in a moment.")
+        st.stop()
     logger.info("Assistant response: %s", response)
 
-    st.session_state[MESSAGES].append(Message(actor=ASSISTANT, payload=response))
-    st.chat_message(ASSISTANT).write(response)
-    
\ No newline at end of file
+    get_thread_index().touch(st.session_state["username"], current_thread_id, prompt)
@@ -0,0 +1,71 @@
+"""
+Load test: concurrent chat sessions served in sync vs async mode.
+
+The OpenAI model is replaced by a stub with a fixed latency; checkpoints go to the Redis
+instance configured in redis_checkpoint.py (a local Redis Stack is enough), or to a local
+SQLite file with CHECKPOINT_BACKEND=sqlite.
+
+- sync:  every session runs chat_agent.invoke on its own worker thread (what Streamlit does)
+- async: every session runs async_chat_agent.ainvoke as a task on one event loop
+
+Reports turns/sec and turns per CPU-second, i.e. how many sessions one core can serve.
+
+Usage:
+    python bench_async_sessions.py [--sessions 200] [--turns 3] [--llm-latency 0.2] [--threads 32]
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.messages import HumanMessage
+
+import agent
+from fake_llm import FakeChatModel
+
+def run_sync(sessions: int, turns: int, threads: int):
+    def session():
+        config = {"configurable": {"thread_id": f"bench:{uuid.uuid4()}"}}
+        for turn in range(turns):
+            agent.get_chat_agent().invoke({"messages": [HumanMessage(content=f"Question {turn}")]}, config=config)
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for future in [pool.submit(session) for _ in range(sessions)]:
+            future.result()
+
+async def run_async(sessions: int, turns: int):
+    await agent.checkpoint_backend.setup_async_checkpoint_saver()
+
+    async def session():
+        config = {"configurable": {"thread_id": f"bench:{uuid.uuid4()}"}}
+        for turn in range(turns):
+            await agent.get_async_chat_agent().ainvoke({"messages": [HumanMessage(content=f"Question {turn}")]}, config=config)
+
+    await asyncio.gather(*(session() for _ in range(sessions)))
+
+def measure(label: str, run, total_turns: int):
+    wall, cpu = time.perf_counter(), time.process_time()
+    run()
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    print(f"{label:>6} {wall:>9.2f}s {total_turns / wall:>11.1f} {total_turns / cpu:>16.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Stub LLM latency in seconds")
+    parser.add_argument("--threads", type=int, default=32, help="Worker threads in sync mode")
+    args = parser.parse_args()
+
+    # Replace the OpenAI model used by the graph nodes; the response cache would hide the LLM
+    agent.llm = agent.small_llm = FakeChatModel(latency=args.llm_latency)
+    agent.RESPONSE_CACHE_BACKEND = "off"
+
+    total_turns = args.sessions * args.turns
+    print(f"{'mode':>6} {'wall':>10} {'turns/sec':>11} {'turns/cpu-sec':>16}")
+    measure("sync", lambda: run_sync(args.sessions, args.turns, args.threads), total_turns)
+    measure("async", lambda: asyncio.run(run_async(args.sessions, args.turns)), total_turns)
+
+if __name__ == "__main__":
+    main()
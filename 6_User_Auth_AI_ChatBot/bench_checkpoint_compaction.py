@@ -0,0 +1,70 @@
+"""
+Benchmark of checkpoint compaction on the Redis checkpointer.
+
+For each conversation length, one thread is played with compaction off (full history) and
+one with inline keep-latest compaction, against the Redis instance configured in
+redis_connection.py. Reports the Redis memory used by the thread's keys and the latency of
+loading the latest checkpoint (get_tuple), which every turn pays before calling the LLM.
+
+Usage:
+    python bench_checkpoint_compaction.py [--turns 10 50 100 200] [--reads 200]
+"""
+import argparse
+import statistics
+import time
+import uuid
+
+from langchain_core.messages import HumanMessage
+
+import agent
+from checkpoint_compaction import CHECKPOINT_KEEP_LAST, CompactingCheckpointSaver
+from fake_llm import FakeChatModel
+from redis_checkpoint import get_redis_client, get_redis_saver
+
+def play(saver, turns: int) -> dict:
+    """Run `turns` chat turns on a new thread and return its config."""
+    chat_agent = agent.graph.compile(checkpointer=saver)
+    config = {"configurable": {"thread_id": f"bench:{uuid.uuid4()}"}}
+    for turn in range(turns):
+        chat_agent.invoke({"messages": [HumanMessage(content=f"Question {turn}")]}, config=config)
+    return config
+
+def stored_bytes(thread_id: str) -> tuple:
+    redis_client = get_redis_client()
+    keys = list(redis_client.scan_iter(match=f"*{thread_id}*", count=1000))
+    return len(keys), sum(redis_client.memory_usage(key) or 0 for key in keys)
+
+def read_latency_ms(saver, config: dict, reads: int) -> float:
+    samples = []
+    for _ in range(reads):
+        start = time.perf_counter()
+        saver.get_tuple(config)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 50, 100, 200])
+    parser.add_argument("--reads", type=int, default=200, help="get_tuple calls per measurement")
+    args = parser.parse_args()
+
+    # No LLM latency and no response cache: only the checkpointer is measured
+    agent.llm = agent.small_llm = FakeChatModel(latency=0)
+    agent.RESPONSE_CACHE_BACKEND = "off"
+
+    redis_saver = get_redis_saver()
+    savers = {
+        "off": redis_saver,
+        f"keep {CHECKPOINT_KEEP_LAST}": CompactingCheckpointSaver(redis_saver, mode="inline"),
+    }
+    print(f"{'turns':>6} {'compaction':>11} {'keys':>7} {'bytes':>11} {'get_tuple p50':>14}")
+    for turns in args.turns:
+        for label, saver in savers.items():
+            config = play(saver, turns)
+            keys, size = stored_bytes(config["configurable"]["thread_id"])
+            latency = read_latency_ms(saver, config, args.reads)
+            print(f"{turns:>6} {label:>11} {keys:>7} {size:>11,} {latency:>12.2f}ms")
+            redis_saver.delete_thread(config["configurable"]["thread_id"])
+
+if __name__ == "__main__":
+    main()
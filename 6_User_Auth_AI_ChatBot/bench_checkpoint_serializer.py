@@ -0,0 +1,76 @@
+"""
+Microbenchmark of checkpoint serializers on the `messages` channel.
+
+Serializes threads of 10, 100 and 1000 chat messages (alternating user questions and
+assistant answers with OpenAI-style response metadata) with:
+
+- json:    JsonPlusRedisSerializer, what RedisSaver stores by default
+- msgpack: JsonPlusSerializer, what MongoDBSaver stores by default
+- compact: CompactSerializer (msgpack + zstd with the envelope dictionary)
+
+Reports payload size and median encode/decode time. No database is needed.
+
+Usage:
+    python bench_checkpoint_serializer.py [--messages 10 100 1000] [--repeat 50]
+"""
+import argparse
+import statistics
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.redis.jsonplus_redis import JsonPlusRedisSerializer
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from compact_serializer import CompactSerializer
+
+def build_thread(messages: int) -> list:
+    thread = []
+    for i in range(messages // 2):
+        thread.append(HumanMessage(content=f"Question {i}: how do I configure the service for my team?",
+                                   id=f"human-{i:08d}"))
+        thread.append(AIMessage(
+            content=f"Answer {i}: open the settings page, pick your team and enable the features you need. "
+                    "Changes apply to every member within a few minutes.",
+            id=f"run-{i:08d}-0",
+            response_metadata={
+                "token_usage": {"completion_tokens": 32, "prompt_tokens": 18 + i, "total_tokens": 50 + i},
+                "model_name": "gpt-4-turbo", "finish_reason": "stop", "system_fingerprint": None, "logprobs": None,
+            },
+            usage_metadata={"input_tokens": 18 + i, "output_tokens": 32, "total_tokens": 50 + i},
+        ))
+    return thread
+
+def median_ms(func, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    serializers = {
+        "json": JsonPlusRedisSerializer(),
+        "msgpack": JsonPlusSerializer(),
+        "compact": CompactSerializer(),
+    }
+    print(f"{'messages':>8} {'format':>8} {'bytes':>11} {'ratio':>6} {'encode':>10} {'decode':>10}")
+    for messages in args.messages:
+        thread = build_thread(messages)
+        baseline = None
+        for label, serde in serializers.items():
+            payload = serde.dumps_typed(thread)
+            assert [m.content for m in serde.loads_typed(payload)] == [m.content for m in thread]
+            size = len(payload[1])
+            baseline = baseline or size
+            encode = median_ms(lambda: serde.dumps_typed(thread), args.repeat)
+            decode = median_ms(lambda: serde.loads_typed(payload), args.repeat)
+            print(f"{messages:>8} {label:>8} {size:>11,} {size / baseline:>6.2f} {encode:>8.3f}ms {decode:>8.3f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Load test: concurrent duplicate submissions of a chat turn, with and without idempotency.py.
+
+The FastAPI app of server.py is driven in-process (httpx ASGI transport) with the fake LLM.
+Every one of --threads threads gets a first turn, then --duplicates concurrent submissions
+of its second message (alternating /chat and /chat/stream, as a client retrying on a
+timeout would), all with the same Idempotency-Key, then one more submission with that key
+after they all returned.
+
+Reported per idempotency backend: graph runs per submitted turn (user messages checkpointed
+for the second message: 1 when every duplicate was absorbed), LLM calls per turn, whether
+every submission got the same response, and p50/p99 latency of the duplicates.
+
+Checkpoints go to the Redis instance configured in redis_checkpoint.py, or to a local SQLite
+file with CHECKPOINT_BACKEND=sqlite; the redis backend needs Redis.
+
+Usage:
+    python bench_idempotency.py [--backends off memory redis] [--threads 20] [--duplicates 5]
+        [--llm-latency 0.2]
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+
+os.environ.setdefault("FAKE_LLM", "1")
+os.environ.setdefault("RATE_LIMIT_BACKEND", "off")
+os.environ.setdefault("RESPONSE_CACHE_BACKEND", "off")  # Would answer the duplicates' LLM calls
+os.environ.setdefault("LLM_COALESCE", "false")  # Would share the concurrent duplicates' LLM calls
+os.environ.setdefault("THREAD_LOCK_BACKEND", "memory")
+
+import httpx
+
+import agent
+import server
+from fake_llm import FakeChatModel
+
+def count_llm_calls() -> list:
+    """Count the fake LLM's calls, streamed or not."""
+    counter = [0]
+    for name in ("_agenerate", "_astream"):
+        method = getattr(FakeChatModel, name)
+
+        def counted(self, *args, _method=method, **kwargs):
+            counter[0] += 1
+            return _method(self, *args, **kwargs)
+
+        setattr(FakeChatModel, name, counted)
+    return counter
+
+def percentile(values: list, pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+async def submit(client: httpx.AsyncClient, path: str, thread_id: str, message: str) -> str:
+    # One submission id per thread and message, shared by its retries
+    headers = {"Idempotency-Key": f"{thread_id}:{message}"}
+    response = await client.post(path, json={"thread_id": thread_id, "message": message}, headers=headers)
+    response.raise_for_status()
+    if path == "/chat":
+        return response.json()["response"]
+    done = response.text.rsplit("event: done\ndata: ", 1)[1]
+    return json.loads(done.split("\n", 1)[0])["response"]
+
+async def run_backend(backend: str, args, counter: list) -> dict:
+    agent.IDEMPOTENCY_BACKEND = backend
+    agent.get_idempotency_store.cache_clear()
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        thread_ids = [f"bench:{uuid.uuid4()}" for _ in range(args.threads)]
+        await asyncio.gather(*(submit(client, "/chat", thread_id, "First question") for thread_id in thread_ids))
+        latencies, identical = [], True
+
+        async def duplicate(thread_id: str, index: int) -> str:
+            start = time.perf_counter()
+            response = await submit(client, ("/chat", "/chat/stream")[index % 2], thread_id, "Second question")
+            latencies.append(time.perf_counter() - start)
+            return response
+
+        calls = counter[0]
+        for responses in await asyncio.gather(*(
+            asyncio.gather(*(duplicate(thread_id, index) for index in range(args.duplicates)))
+            for thread_id in thread_ids
+        )):
+            identical &= len(set(responses)) == 1
+        await asyncio.gather(*(submit(client, "/chat", thread_id, "Second question") for thread_id in thread_ids))
+        calls = counter[0] - calls
+
+        runs = 0
+        for thread_id in thread_ids:
+            state = await agent.get_async_chat_agent().aget_state({"configurable": {"thread_id": thread_id}})
+            runs += sum(message.type == "human" and message.content == "Second question"
+                        for message in state.values["messages"])
+    return {"runs": runs / args.threads, "llm_calls": calls / args.threads, "identical": identical,
+            "p50": percentile(latencies, 50), "p99": percentile(latencies, 99)}
+
+async def main_async(args):
+    await agent.checkpoint_backend.setup_async_checkpoint_saver()
+    counter = count_llm_calls()
+    print(f"{'backend':>8} {'graph runs/turn':>16} {'LLM calls/turn':>15} {'same reply':>11} {'p50':>10} {'p99':>10}")
+    for backend in args.backends:
+        result = await run_backend(backend, args, counter)
+        print(f"{backend:>8} {result['runs']:>16.2f} {result['llm_calls']:>15.2f} {str(result['identical']):>11} "
+              f"{result['p50'] * 1000:>8.1f}ms {result['p99'] * 1000:>8.1f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", choices=["off", "memory", "redis"], default=["off", "memory", "redis"])
+    parser.add_argument("--threads", type=int, default=20)
+    parser.add_argument("--duplicates", type=int, default=5, help="Concurrent submissions of the same turn")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Fake LLM latency in seconds")
+    args = parser.parse_args()
+    os.environ["FAKE_LLM_LATENCY"] = str(args.llm_latency)  # Read when the graph builds the model
+    asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Tail latency and success rate of LLM calls with and without llm_resilience.py, offline.
+
+The primary model is a FakeChatModel that fails a share of its calls (--error-rate) and
+stalls on another share (--stall-rate, for --stall-latency seconds), like a provider having
+a bad day; the fallback model is a healthy one. The same calls are made, --concurrency at a
+time, through each configuration:
+
+    plain      model.ainvoke(), no deadline, no retries
+    retry      deadline + jittered retries within the retry budget
+    hedge      retry + a hedged request after the model's p95 response time
+    fallback   hedge + fallback to the healthy model, circuit breaker on
+
+Reports the share of calls that succeeded, latency percentiles of the successful ones and
+the load sent to the models (attempts per call).
+
+Usage:
+    python bench_llm_resilience.py [--calls 1000] [--concurrency 50] [--latency 0.2]
+        [--error-rate 0.05] [--stall-rate 0.03] [--stall-latency 5] [--timeout 3]
+"""
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+
+from langchain_core.messages import HumanMessage
+
+from fake_llm import FakeChatModel
+from llm_resilience import LLMResilience
+
+def percentile(values: list, q: float) -> float:
+    return statistics.quantiles(values, n=100)[q - 1] if len(values) > 1 else (values or [0.0])[0]
+
+async def run(label: str, call, calls: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, failures = [], 0
+
+    async def one(i: int):
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await call([HumanMessage(content=f"Question {i}")])
+            except Exception:
+                failures += 1
+            else:
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(calls)))
+    return {"label": label, "elapsed": time.perf_counter() - start, "latencies": latencies, "failures": failures}
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.2, help="Base response time of the fake models (s)")
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--stall-rate", type=float, default=0.03)
+    parser.add_argument("--stall-latency", type=float, default=5.0)
+    parser.add_argument("--timeout", type=float, default=3.0, help="Deadline of one call (s)")
+    args = parser.parse_args()
+    logging.getLogger("llm_resilience").setLevel(logging.ERROR)
+
+    def faulty():
+        # A fresh model per configuration, so each one sees the same sequence of faults
+        return FakeChatModel(model_name="primary", latency=args.latency, latency_jitter=args.latency / 2,
+                             error_rate=args.error_rate, stall_rate=args.stall_rate,
+                             stall_latency=args.stall_latency, seed=7)
+
+    healthy = FakeChatModel(model_name="fallback", latency=args.latency, latency_jitter=args.latency / 2)
+    results = []
+
+    plain = faulty()
+    results.append((await run("plain", plain.ainvoke, args.calls, args.concurrency), None))
+    for label, hedge, fallback in (("retry", False, None), ("hedge", True, None), ("fallback", True, healthy)):
+        resilience = LLMResilience(timeout=args.timeout, hedge=hedge)
+        model = faulty()
+        result = await run(label, lambda messages: resilience.ainvoke(model, messages, fallback=fallback),
+                           args.calls, args.concurrency)
+        results.append((result, resilience.stats()))
+
+    print(f"{'config':>9} {'success':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} {'attempts':>9} {'wall':>7}")
+    for result, stats in results:
+        latencies = result["latencies"]
+        attempts = args.calls
+        if stats is not None:
+            attempts += sum(events.get("retry", 0) + events.get("hedge", 0) + events.get("fallback", 0)
+                            for events in (model["events"] for model in stats["models"].values()))
+        print(f"{result['label']:>9} {len(latencies) / args.calls:>8.1%} "
+              f"{percentile(latencies, 50) * 1000:>6.0f}ms {percentile(latencies, 95) * 1000:>6.0f}ms "
+              f"{percentile(latencies, 99) * 1000:>6.0f}ms {max(latencies, default=0) * 1000:>6.0f}ms "
+              f"{attempts / args.calls:>9.2f} {result['elapsed']:>6.1f}s")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,64 @@
+"""
+Benchmark of the per-user rate limiter: overhead of one admission check.
+
+Runs --checks checks spread over --users users from --threads threads, against the
+in-process limiter and/or the Redis limiter (the Redis instance configured in
+redis_connection.py). Limits are set high enough that every check is allowed, so each one
+reads and updates all four buckets of its user. Reports checks/sec and latency percentiles;
+the Redis figure is dominated by the network round trip of its single EVALSHA.
+
+Usage:
+    python bench_rate_limiter.py [--backends memory redis] [--checks 20000] [--users 1000] [--threads 8]
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from rate_limiter import InMemoryRateLimiter, Limit, RedisRateLimiter
+
+LIMITS = [
+    Limit("requests/minute", "requests", 10 ** 9, 60),
+    Limit("requests/day", "requests", 10 ** 9, 86_400),
+    Limit("tokens/minute", "tokens", 10 ** 9, 60),
+    Limit("tokens/day", "tokens", 10 ** 9, 86_400),
+]
+
+def build(backend: str):
+    if backend == "redis":
+        from redis_checkpoint import get_redis_client
+        return RedisRateLimiter(get_redis_client(), LIMITS, prefix="bench_rate_limit")
+    return InMemoryRateLimiter(LIMITS)
+
+def run(limiter, checks: int, users: int, threads: int) -> tuple:
+    def worker(offset: int) -> list:
+        latencies = []
+        for i in range(offset, checks, threads):
+            start = time.perf_counter()
+            assert limiter.check(f"user{i % users}", prompt_tokens=200).allowed
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        latencies = sorted(latency for result in pool.map(worker, range(threads)) for latency in result)
+    return time.perf_counter() - start, latencies
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", choices=["memory", "redis"], default=["memory", "redis"])
+    parser.add_argument("--checks", type=int, default=20_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    print(f"{'backend':>8} {'checks/sec':>11} {'p50':>9} {'p99':>9} {'max':>9}")
+    for backend in args.backends:
+        limiter = build(backend)
+        run(limiter, min(args.checks, 1000), args.users, args.threads)  # Warm-up: connections, script load
+        wall, latencies = run(limiter, args.checks, args.users, args.threads)
+        p50, p99 = latencies[len(latencies) // 2], latencies[int(0.99 * (len(latencies) - 1))]
+        print(f"{backend:>8} {args.checks / wall:>11,.0f} {p50 * 1e6:>7.0f}us {p99 * 1e6:>7.0f}us "
+              f"{latencies[-1] * 1e6:>7.0f}us")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Benchmark of the response cache in front of a fake LLM.
+
+Runs the same number of single-turn requests at several cache hit rates and reports
+throughput, so the effect of the cache can be measured without calling OpenAI.
+
+Usage:
+    python bench_response_cache.py [--requests 400] [--llm-latency 0.05]
+"""
+import argparse
+import random
+import time
+
+from langchain_core.messages import HumanMessage
+
+from fake_llm import FakeChatModel
+from response_cache import InMemoryCacheBackend, ResponseCache
+
+FAQ_PROMPTS = [
+    "What can you do?",
+    "Who are you?",
+    "How do I reset my password?",
+    "What are your opening hours?",
+    "How can I contact support?",
+]
+
+def build_workload(requests: int, hit_rate: float, seed: int = 42) -> list:
+    """Mix of repeated FAQ prompts (cacheable) and unique prompts (always a miss)."""
+    rng = random.Random(seed)
+    workload = []
+    for i in range(requests):
+        if rng.random() < hit_rate:
+            workload.append(rng.choice(FAQ_PROMPTS))
+        else:
+            workload.append(f"Tell me something about topic number {i}")
+    return workload
+
+def run(workload: list, llm, cache) -> float:
+    """Serve the workload one request at a time and return requests per second."""
+    start = time.perf_counter()
+    for text in workload:
+        prompt = [HumanMessage(content=text)]
+        if cache is not None and cache.lookup(prompt) is not None:
+            continue
+        response = llm.invoke(prompt)
+        if cache is not None:
+            cache.store(prompt, response.content)
+    return len(workload) / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Fake LLM latency in seconds")
+    args = parser.parse_args()
+
+    llm = FakeChatModel(latency=args.llm_latency)
+    baseline = run(build_workload(args.requests, 0.0), llm, None)
+    print(f"{'target hit rate':>16} {'actual':>8} {'req/s':>10} {'speedup':>8}")
+    print(f"{'no cache':>16} {'-':>8} {baseline:>10.1f} {1.0:>7.2f}x")
+    for hit_rate in (0.0, 0.25, 0.5, 0.75, 0.9):
+        cache = ResponseCache(InMemoryCacheBackend())
+        throughput = run(build_workload(args.requests, hit_rate), llm, cache)
+        print(f"{hit_rate:>16.2f} {cache.stats.hit_rate:>8.2f} {throughput:>10.1f} {throughput / baseline:>7.2f}x")
+
+if __name__ == "__main__":
+    main()
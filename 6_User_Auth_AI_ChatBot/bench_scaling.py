@@ -0,0 +1,132 @@
+"""
+Load test: turns/sec vs the number of server.py worker processes behind front_router.py.
+
+For every --workers count, front_router.py is started with that many workers, the OpenAI
+model replaced by the fake LLM of fake_llm.py (FAKE_LLM=1, --llm-latency seconds to the first
+token) and the rate limiter off. --sessions concurrent clients then play --turns turns each
+through POST /chat, every turn of a session on the thread its first reply named.
+
+Checkpoints go to the Redis instance configured in redis_checkpoint.py, shared by all
+workers (a local Redis Stack is enough), and so do the per-thread locks. For a machine
+without Redis, --checkpoints sqlite --locks memory runs every worker on one SQLite file.
+
+Reports turns/sec, speedup over the first worker count, p50/p99 turn latency and the hit
+ratio of the workers' latest-checkpoint caches (high with sticky routing; compare with
+--policy round_robin). Workers only add throughput up to the number of cores.
+
+Usage:
+    python bench_scaling.py [--workers 1 2 4] [--sessions 64] [--turns 5] [--llm-latency 0.05]
+        [--policy sticky|round_robin] [--checkpoints redis|sqlite] [--locks redis|memory|off] [--port 8100]
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+def percentile(values: list, pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+def start_router(workers: int, args, checkpoint_path: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "FRONT_ROUTER_HOST": "127.0.0.1",
+        "FRONT_ROUTER_PORT": str(args.port),
+        "FRONT_ROUTER_WORKERS": str(workers),
+        "FRONT_ROUTER_POLICY": args.policy,
+        "FAKE_LLM": "1",
+        "FAKE_LLM_LATENCY": str(args.llm_latency),
+        "FAKE_LLM_TOKENS_PER_SECOND": str(args.tokens_per_second),
+        "CHECKPOINT_BACKEND": args.checkpoints,
+        "SQLITE_CHECKPOINT_PATH": checkpoint_path,
+        "THREAD_LOCK_BACKEND": args.locks,
+        # Every client shares one address, and distinct prompts would miss the response cache anyway
+        "RATE_LIMIT_BACKEND": "off",
+        "RESPONSE_CACHE_BACKEND": "off",
+    }
+    return subprocess.Popen([sys.executable, "front_router.py"], cwd=Path(__file__).parent, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+async def wait_for_router(client: httpx.AsyncClient, router: subprocess.Popen, timeout: float = 180):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if router.poll() is not None:
+            raise RuntimeError(f"front_router.py exited with {router.returncode}")
+        try:
+            if (await client.get("/health", timeout=2)).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError(f"front_router.py was not up within {timeout:.0f}s")
+
+def cache_hit_ratio(health: dict) -> float | None:
+    """Hit ratio of the async latest-checkpoint caches, summed over the workers."""
+    hits = lookups = 0
+    for worker in health["workers"].values():
+        cache = (worker.get("checkpoint_cache") or {}).get("async")
+        if cache:
+            hits += cache["hit"]
+            lookups += cache["hit"] + cache["miss"] + cache["stale"]
+    return hits / lookups if lookups else None
+
+async def run_load(workers: int, args, checkpoint_path: str) -> dict:
+    router = start_router(workers, args, checkpoint_path)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=120,
+                                     limits=httpx.Limits(max_connections=None)) as client:
+            await wait_for_router(client, router)
+            latencies = []
+
+            async def session(index: int):
+                thread_id = None
+                for turn in range(args.turns):
+                    start = time.perf_counter()
+                    response = await client.post("/chat", json={"message": f"Question {turn} of session {index}",
+                                                                 "thread_id": thread_id})
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - start)
+                    thread_id = response.json()["thread_id"]
+
+            start = time.perf_counter()
+            await asyncio.gather(*(session(index) for index in range(args.sessions)))
+            wall = time.perf_counter() - start
+            health = (await client.get("/health")).json()
+    finally:
+        router.terminate()  # The router stops its workers on the way out
+        router.wait()
+    return {"turns_per_sec": len(latencies) / wall, "p50": percentile(latencies, 50),
+            "p99": percentile(latencies, 99), "hit_ratio": cache_hit_ratio(health)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--sessions", type=int, default=64)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Fake LLM latency in seconds")
+    parser.add_argument("--tokens-per-second", type=float, default=2000, help="Fake LLM streaming speed")
+    parser.add_argument("--policy", choices=["sticky", "round_robin"], default="sticky")
+    parser.add_argument("--checkpoints", choices=["redis", "sqlite"], default="redis")
+    parser.add_argument("--locks", choices=["redis", "memory", "off"], default="redis")
+    parser.add_argument("--port", type=int, default=8100, help="Router port; workers use the next ones")
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, policy={args.policy}, checkpoints={args.checkpoints}, locks={args.locks}")
+    print(f"{'workers':>7} {'turns/s':>9} {'speedup':>8} {'p50':>10} {'p99':>10} {'cache hits':>11}")
+    baseline = None
+    for workers in args.workers:
+        with tempfile.TemporaryDirectory() as scratch:
+            result = asyncio.run(run_load(workers, args, os.path.join(scratch, "checkpoints.db")))
+        baseline = baseline or result["turns_per_sec"]
+        hit_ratio = "-" if result["hit_ratio"] is None else f"{result['hit_ratio']:.1%}"
+        print(f"{workers:>7} {result['turns_per_sec']:>9.1f} {result['turns_per_sec'] / baseline:>7.2f}x "
+              f"{result['p50'] * 1000:>8.1f}ms {result['p99'] * 1000:>8.1f}ms {hit_ratio:>11}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark of logins at several scrypt cost settings.
+
+For each N, a set of users is created in a temporary SQLite store (or in Redis with
+--store redis) and --logins password checks are pushed through the Authenticator's thread
+pool at once, like a burst of users logging in. Reports logins/sec, the median and p95 time
+a login waits for its result, and the memory one hash needs (128 * N * r bytes).
+Also reports how many signed session tokens can be checked per second, the cost paid by
+every rerun of a logged-in session instead.
+
+Usage:
+    python bench_user_store.py [--costs 4096 16384 32768 65536] [--logins 64] [--workers 4]
+        [--store sqlite|redis]
+"""
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from session_token import SessionTokens
+from user_store import PASSWORD_SCRYPT_R, Authenticator, PasswordHasher, SQLiteUserStore, create_user_store
+
+USERS = 16
+
+def login_burst(authenticator: Authenticator, logins: int) -> tuple:
+    """Submit `logins` checks at once; return (wall seconds, per-login latencies)."""
+    start = time.perf_counter()
+    futures = [(authenticator.submit(f"user{i % USERS}", f"password{i % USERS}"), time.perf_counter())
+               for i in range(logins)]
+    latencies = []
+    for future, submitted in futures:
+        assert future.result()
+        latencies.append(time.perf_counter() - submitted)
+    return time.perf_counter() - start, latencies
+
+def tokens_per_sec(checks: int = 50_000) -> float:
+    tokens = SessionTokens(secret="bench")
+    token = tokens.issue("alice")
+    start = time.perf_counter()
+    for _ in range(checks):
+        tokens.verify(token)
+    return checks / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--costs", type=int, nargs="+", default=[2 ** 12, 2 ** 14, 2 ** 15, 2 ** 16],
+                        help="scrypt N values to compare")
+    parser.add_argument("--logins", type=int, default=64, help="Password checks per cost setting")
+    parser.add_argument("--workers", type=int, default=4, help="Authenticator pool size")
+    parser.add_argument("--store", choices=["sqlite", "redis"], default="sqlite")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = (SQLiteUserStore(str(Path(directory) / "users.db")) if args.store == "sqlite"
+                 else create_user_store("redis"))
+        print(f"{'N':>7} {'memory':>8} {'logins/sec':>11} {'wait p50':>10} {'wait p95':>10}")
+        for n in args.costs:
+            authenticator = Authenticator(store, PasswordHasher(n=n), workers=args.workers)
+            for i in range(USERS):
+                authenticator.create_user(f"user{i}", f"password{i}")
+            wall, latencies = login_burst(authenticator, args.logins)
+            latencies.sort()
+            print(f"{n:>7} {128 * n * PASSWORD_SCRYPT_R / 2 ** 20:>6.0f}MiB {args.logins / wall:>11.1f} "
+                  f"{statistics.median(latencies) * 1000:>8.1f}ms "
+                  f"{latencies[int(0.95 * (len(latencies) - 1))] * 1000:>8.1f}ms")
+            authenticator.shutdown()
+        if args.store == "redis":
+            for i in range(USERS):
+                store.delete_user(f"user{i}")
+    print(f"Session token checks/sec: {tokens_per_sec():,.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import asyncio
+import random
+import time
+from typing import Any, AsyncIterator, Iterator
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+class FakeLLMError(ConnectionError):
+    """Failure injected by FakeChatModel (retryable, like a dropped connection)."""
+
+# -------------------- Fake Chat Model --------------------
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic stand-in for ChatOpenAI used for offline load tests and benchmarks.
+    Waits `latency` seconds (plus up to `latency_jitter`) before the first token, then emits
+    the response word by word at `tokens_per_second`. The async methods await instead of
+    sleeping, so many concurrent calls can be in flight on one event loop, like real
+    network-bound LLM calls.
+
+    With `response_words` set, the canned response is replaced by that many filler words.
+    The jitter is drawn from a generator seeded with `seed` and the prompt, so a given
+    prompt always gets the same latency, whatever order concurrent calls run in.
+
+    Faults can be injected to exercise retries, hedging and fallback: each call fails with
+    FakeLLMError with probability `error_rate` (after `latency`, before any token) and stalls
+    for an extra `stall_latency` seconds with probability `stall_rate`. These draws come from
+    a generator seeded with `seed` per model, so a retry of a failed call may succeed.
+    """
+
+    model_name: str = "fake-chat-model"
+    response: str = "This is a canned answer from the fake LLM."
+    latency: float = 0.0
+    latency_jitter: float = 0.0
+    tokens_per_second: float | None = None
+    response_words: int | None = None
+    seed: int = 0
+    error_rate: float = 0.0
+    stall_rate: float = 0.0
+    stall_latency: float = 0.0
+    _faults: random.Random = PrivateAttr(default=None)
+
+    def model_post_init(self, context: Any):
+        self._faults = random.Random(self.seed)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    def _text(self) -> str:
+        if self.response_words is None:
+            return self.response
+        return " ".join(f"word{i % 100}" for i in range(self.response_words))
+
+    def _tokens(self) -> list:
+        words = self._text().split(" ")
+        return [word if i == 0 else " " + word for i, word in enumerate(words)]
+
+    def _token_delay(self) -> float:
+        return 1.0 / self.tokens_per_second if self.tokens_per_second else 0.0
+
+    def _latency(self, messages) -> float:
+        if not self.latency_jitter:
+            return self.latency
+        rng = random.Random(f"{self.seed}:{messages[-1].content if messages else ''}")
+        return self.latency + rng.uniform(0, self.latency_jitter)
+
+    def _fault(self) -> tuple:
+        """Draw this call's injected faults: (extra stall seconds, fails)."""
+        if not self.error_rate and not self.stall_rate:
+            return 0.0, False
+        stalls = self._faults.random() < self.stall_rate
+        return (self.stall_latency if stalls else 0.0), self._faults.random() < self.error_rate
+
+    def _check(self, fails: bool):
+        if fails:
+            raise FakeLLMError("Injected fake LLM failure")
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        stall, fails = self._fault()
+        time.sleep(self._latency(messages) + stall)
+        self._check(fails)
+        time.sleep(self._token_delay() * len(self._tokens()))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._text()))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        stall, fails = self._fault()
+        await asyncio.sleep(self._latency(messages) + stall)
+        self._check(fails)
+        await asyncio.sleep(self._token_delay() * len(self._tokens()))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._text()))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        stall, fails = self._fault()
+        time.sleep(self._latency(messages) + stall)
+        self._check(fails)
+        for token in self._tokens():
+            time.sleep(self._token_delay())
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        stall, fails = self._fault()
+        await asyncio.sleep(self._latency(messages) + stall)
+        self._check(fails)
+        for token in self._tokens():
+            await asyncio.sleep(self._token_delay())
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
@@ -0,0 +1,201 @@
+"""
+Front router for multi-process deployments of server.py.
+
+A server.py process runs graph turns on one core at a time. The router starts
+FRONT_ROUTER_WORKERS server.py processes on the ports after its own (or forwards to the servers
+listed in FRONT_ROUTER_WORKER_URLS) and sends every request of a conversation thread to the
+same worker, so that worker's in-process caches (latest checkpoints, responses) stay warm for
+the thread. Requests without a thread_id are given one here, so the follow-ups of a new thread
+stick too.
+
+Workers share the Redis checkpointer. When a thread does move (worker restart or failover, or
+FRONT_ROUTER_POLICY=round_robin), the per-thread locks of thread_lock.py keep two workers from
+running turns of the same thread at once.
+
+    POST /chat, /chat/stream   forwarded to the thread's worker, responses streamed through
+    GET  /health               the routing policy and every worker's own /health
+
+Each worker still serves its own /metrics on its port. Workers trust the X-Forwarded-For
+header set here from 127.0.0.1 (uvicorn's default); set FORWARDED_ALLOW_IPS on remote workers.
+Run with `python front_router.py`.
+"""
+import asyncio
+import hashlib
+import itertools
+import json
+import logging
+import os
+import subprocess
+import sys
+import uuid
+from contextlib import asynccontextmanager
+from os import getenv
+from pathlib import Path
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+
+# -------------------- Setup Logging --------------------
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# -------------------- Router Configuration --------------------
+FRONT_ROUTER_HOST = getenv("FRONT_ROUTER_HOST", "0.0.0.0")
+FRONT_ROUTER_PORT = int(getenv("FRONT_ROUTER_PORT", 8000))
+FRONT_ROUTER_WORKERS = int(getenv("FRONT_ROUTER_WORKERS", os.cpu_count() or 1))  # server.py processes to start
+# e.g. "http://10.0.0.2:8000,http://10.0.0.3:8000"; no workers are started then
+FRONT_ROUTER_WORKER_URLS = getenv("FRONT_ROUTER_WORKER_URLS")
+FRONT_ROUTER_POLICY = getenv("FRONT_ROUTER_POLICY", "sticky")  # sticky (by thread_id) | round_robin (no affinity)
+FRONT_ROUTER_TIMEOUT = float(getenv("FRONT_ROUTER_TIMEOUT", 300))  # Longest forwarded request, in seconds
+FRONT_ROUTER_STARTUP_TIMEOUT = float(getenv("FRONT_ROUTER_STARTUP_TIMEOUT", 120))  # Wait for workers to be up
+logger.info("Front router config: policy=%s, workers=%s",
+            FRONT_ROUTER_POLICY, FRONT_ROUTER_WORKER_URLS or FRONT_ROUTER_WORKERS)
+
+# Request and response headers passed through; hop-by-hop ones are left to each connection
+FORWARDED_REQUEST_HEADERS = ("content-type", "accept", "authorization", "idempotency-key")
+DROPPED_RESPONSE_HEADERS = ("connection", "keep-alive", "transfer-encoding", "date", "server")
+
+# -------------------- Thread Affinity --------------------
+def worker_order(thread_id: str, workers: list) -> list:
+    """
+    Workers by preference for the thread (rendezvous hashing): the first one owns the thread,
+    the next ones take over while it is down. Adding or removing a worker only moves the
+    threads that worker owns.
+    """
+    return sorted(workers, reverse=True,
+                  key=lambda worker: hashlib.blake2b(f"{worker}|{thread_id}".encode(), digest_size=8).digest())
+
+class WorkerPool:
+    """The workers behind the router; the ones it started itself are restarted when they exit."""
+
+    def __init__(self, urls: list):
+        self.urls = urls
+        self.processes = [None] * len(urls)
+        self._round_robin = itertools.count()
+
+    def _spawn(self, index: int):
+        port = self.urls[index].rsplit(":", 1)[1]
+        env = {**os.environ, "SERVER_HOST": "127.0.0.1", "SERVER_PORT": port, "SERVER_WORKERS": "1"}
+        self.processes[index] = subprocess.Popen([sys.executable, "server.py"], cwd=Path(__file__).parent, env=env)
+        logger.info("Started worker %d on port %s (pid %d).", index, port, self.processes[index].pid)
+
+    def start(self):
+        for index in range(len(self.urls)):
+            self._spawn(index)
+
+    async def supervise(self):
+        while True:
+            await asyncio.sleep(1)
+            for index, process in enumerate(self.processes):
+                if process is not None and process.poll() is not None:
+                    logger.warning("Worker %d exited with %s, restarting it.", index, process.returncode)
+                    self._spawn(index)
+
+    def stop(self):
+        for process in self.processes:
+            if process is not None:
+                process.terminate()
+        for process in self.processes:
+            if process is not None:
+                process.wait()
+
+    def candidates(self, thread_id: str) -> list:
+        if FRONT_ROUTER_POLICY == "round_robin":
+            start = next(self._round_robin) % len(self.urls)
+            return self.urls[start:] + self.urls[:start]
+        return worker_order(thread_id, self.urls)
+
+async def wait_until_up(client: httpx.AsyncClient, urls: list, timeout: float):
+    """Wait for every worker to answer /health (importing the graph takes a few seconds)."""
+    deadline = asyncio.get_running_loop().time() + timeout
+    pending = list(urls)
+    while pending:
+        url = pending[0]
+        try:
+            (await client.get(f"{url}/health", timeout=2)).raise_for_status()
+            pending.pop(0)
+        except httpx.HTTPError:
+            if asyncio.get_running_loop().time() > deadline:
+                raise RuntimeError(f"Worker {url} did not start within {timeout:.0f}s.")
+            await asyncio.sleep(0.25)
+
+# -------------------- ASGI Application --------------------
+pool = None
+client = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global pool, client
+    client = httpx.AsyncClient(timeout=httpx.Timeout(FRONT_ROUTER_TIMEOUT, connect=2),
+                               limits=httpx.Limits(max_connections=None, max_keepalive_connections=256))
+    if FRONT_ROUTER_WORKER_URLS:
+        pool = WorkerPool([url.strip().rstrip("/") for url in FRONT_ROUTER_WORKER_URLS.split(",")])
+    else:
+        pool = WorkerPool([f"http://127.0.0.1:{FRONT_ROUTER_PORT + 1 + index}"
+                           for index in range(FRONT_ROUTER_WORKERS)])
+        pool.start()
+    supervisor = asyncio.create_task(pool.supervise())
+    try:
+        await wait_until_up(client, pool.urls, FRONT_ROUTER_STARTUP_TIMEOUT)
+        logger.info("Routing to %d workers.", len(pool.urls))
+        yield
+    finally:
+        supervisor.cancel()
+        pool.stop()
+        await client.aclose()
+
+app = FastAPI(title="AI Chatbot Router", lifespan=lifespan)
+
+@app.get("/health")
+async def health():
+    async def worker_health(url: str) -> dict:
+        try:
+            return (await client.get(f"{url}/health", timeout=2)).json()
+        except (httpx.HTTPError, ValueError) as error:
+            return {"status": "down", "error": str(error)}
+
+    workers = dict(zip(pool.urls, await asyncio.gather(*(worker_health(url) for url in pool.urls))))
+    up = sum(worker.get("status") == "ok" for worker in workers.values())
+    return {"status": "ok" if up else "down", "policy": FRONT_ROUTER_POLICY, "workers_up": up, "workers": workers}
+
+async def forward(request: Request, path: str):
+    body = await request.body()
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        payload = None  # Any worker answers 422
+    if isinstance(payload, dict) and not payload.get("thread_id"):
+        payload["thread_id"] = str(uuid.uuid4())
+        body = json.dumps(payload).encode()
+    thread_id = payload["thread_id"] if isinstance(payload, dict) else ""
+
+    headers = {name: value for name, value in request.headers.items() if name in FORWARDED_REQUEST_HEADERS}
+    if request.client is not None:
+        headers["x-forwarded-for"] = request.client.host
+    for url in pool.candidates(thread_id):
+        try:
+            upstream = await client.send(client.build_request("POST", url + path, content=body, headers=headers),
+                                         stream=True)
+        except httpx.ConnectError:
+            # Not delivered: the next worker in the thread's order takes the turn
+            logger.warning("Worker %s unreachable, trying the next one.", url)
+            continue
+        response_headers = {name: value for name, value in upstream.headers.items()
+                            if name not in DROPPED_RESPONSE_HEADERS}
+        return StreamingResponse(upstream.aiter_raw(), status_code=upstream.status_code, headers=response_headers,
+                                 background=BackgroundTask(upstream.aclose))
+    raise HTTPException(status_code=503, detail="No worker available, retry later.")
+
+@app.post("/chat")
+async def chat(request: Request):
+    return await forward(request, "/chat")
+
+@app.post("/chat/stream")
+async def chat_stream(request: Request):
+    return await forward(request, "/chat/stream")
+
+if __name__ == "__main__":
+    uvicorn.run(app, host=FRONT_ROUTER_HOST, port=FRONT_ROUTER_PORT)
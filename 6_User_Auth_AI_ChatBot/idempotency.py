@@ -0,0 +1,305 @@
+import asyncio
+import hashlib
+import threading
+import time
+import uuid
+import logging
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from os import getenv
+
+from redis.exceptions import RedisError
+
+from thread_lock import RELEASE_SCRIPT
+
+# -------------------- Setup Logging --------------------
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# -------------------- Idempotency Configuration --------------------
+IDEMPOTENCY_TTL = int(getenv("IDEMPOTENCY_TTL", 60))  # Seconds a completed turn's response is replayed to duplicates
+IDEMPOTENCY_WAIT = float(getenv("IDEMPOTENCY_WAIT", 120))  # Longest wait of a duplicate for the in-flight original
+IDEMPOTENCY_MAX_ENTRIES = 10_000  # Completed turns remembered in process
+IDEMPOTENCY_POLL = 0.05  # Poll interval while the original runs in another process
+
+class TurnInProgressError(TimeoutError):
+    """The original submission was still running after IDEMPOTENCY_WAIT seconds."""
+
+class TurnAbandoned(Exception):
+    """The original submission failed or went away; a duplicate waiting for it runs the turn instead."""
+
+# -------------------- Turn Keys --------------------
+def turn_key(thread_id: str, messages: list, prompt: str, submission_id: str | None = None) -> str:
+    """
+    Key a submission of `prompt` to a thread with the checkpointed `messages` is recorded under.
+
+    With a client-supplied `submission_id` (e.g. an Idempotency-Key header), every submission
+    carrying it is the same turn, whenever it arrives. Otherwise the key is (thread_id, turn
+    sequence, prompt hash), the turn sequence being the number of answered turns before the
+    submission. A turn in flight has its user message checkpointed but no reply yet, so it does
+    not count: its duplicates share its key. Once it is answered, the same prompt sent again
+    is a new turn.
+    """
+    digest = hashlib.sha256(prompt.encode()).hexdigest()[:16]
+    if submission_id is not None:
+        return f"{thread_id}:id:{hashlib.sha256(submission_id.encode()).hexdigest()[:16]}:{digest}"
+    turns = sum(message.type == "human" for message in messages)
+    if messages and messages[-1].type == "human":
+        turns -= 1  # Not answered yet
+    return f"{thread_id}:{turns}:{digest}"
+
+@dataclass
+class TurnClaim:
+    key: str
+    duplicate: bool = False  # The original's response is in `response`: do not run the graph
+    response: str | None = None  # Set by the caller once it ran the turn
+
+# -------------------- Idempotency Stores --------------------
+class InMemoryIdempotencyStore:
+    """
+    Deduplicates chat turn submissions within this process. The first submission of a key
+    runs the turn; duplicates arriving while it runs wait for its response, and those arriving
+    up to `ttl` seconds after it get the same response, without the graph running again. If
+    the original fails, one waiting duplicate runs the turn instead.
+    """
+
+    backend = "memory"
+
+    def __init__(self, ttl: int = IDEMPOTENCY_TTL, wait: float = IDEMPOTENCY_WAIT,
+                 max_entries: int = IDEMPOTENCY_MAX_ENTRIES):
+        self.ttl = ttl
+        self.wait = wait
+        self.max_entries = max_entries
+        self.duplicates = 0  # Submissions answered with another submission's response
+        self._pending = {}  # Key -> Future of the original's response
+        self._done = OrderedDict()  # Key -> (response, expires_at)
+        self._lock = threading.Lock()
+
+    def _find(self, key: str):
+        """The recorded response of `key` or a Future of it; None when the caller claimed the key."""
+        with self._lock:
+            if key in self._pending:
+                return self._pending[key]
+            entry = self._done.get(key)
+            if entry is not None:
+                if entry[1] > time.monotonic():
+                    return entry[0]
+                del self._done[key]
+            self._pending[key] = Future()
+            return None
+
+    def _duplicate(self, key: str, response: str) -> TurnClaim:
+        with self._lock:
+            self.duplicates += 1
+        return TurnClaim(key, duplicate=True, response=response)
+
+    def _finish(self, key: str, response: str | None):
+        """Record the original's response, or release the key when it has none."""
+        with self._lock:
+            future = self._pending.pop(key, None)
+            if response is not None:
+                self._done[key] = (response, time.monotonic() + self.ttl)
+                self._done.move_to_end(key)
+                while len(self._done) > self.max_entries:
+                    self._done.popitem(last=False)
+        if future is not None:
+            if response is None:
+                future.set_exception(TurnAbandoned(key))
+            else:
+                future.set_result(response)
+
+    def _claim_shared(self, key: str, deadline: float) -> str | None:
+        # No other process to deduplicate against
+        return None
+
+    async def _aclaim_shared(self, key: str, deadline: float) -> str | None:
+        return None
+
+    def _finish_shared(self, key: str, response: str | None):
+        pass
+
+    async def _afinish_shared(self, key: str, response: str | None):
+        pass
+
+    def claim(self, key: str) -> TurnClaim:
+        """Claim the submission's turn, waiting for an in-flight original; see turn_key()."""
+        deadline = time.monotonic() + self.wait
+        while True:
+            found = self._find(key)
+            if isinstance(found, Future):
+                try:
+                    return self._duplicate(key, found.result(timeout=max(0.0, deadline - time.monotonic())))
+                except TurnAbandoned:
+                    continue
+                except TimeoutError:
+                    raise TurnInProgressError(f"Turn {key} is still running.") from None
+            if found is not None:
+                return self._duplicate(key, found)
+            try:
+                response = self._claim_shared(key, deadline)
+            except BaseException:
+                self._finish(key, None)
+                raise
+            if response is None:
+                return TurnClaim(key)
+            self._finish(key, response)  # Also answers the duplicates waiting in this process
+            return self._duplicate(key, response)
+
+    async def aclaim(self, key: str) -> TurnClaim:
+        deadline = time.monotonic() + self.wait
+        while True:
+            found = self._find(key)
+            if isinstance(found, Future):
+                try:
+                    # Shielded: a duplicate going away must not cancel the original's future
+                    response = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(found)),
+                                                      max(0.0, deadline - time.monotonic()))
+                    return self._duplicate(key, response)
+                except TurnAbandoned:
+                    continue
+                except asyncio.TimeoutError:
+                    raise TurnInProgressError(f"Turn {key} is still running.") from None
+            if found is not None:
+                return self._duplicate(key, found)
+            try:
+                response = await self._aclaim_shared(key, deadline)
+            except BaseException:
+                self._finish(key, None)
+                raise
+            if response is None:
+                return TurnClaim(key)
+            self._finish(key, response)
+            return self._duplicate(key, response)
+
+    def release(self, claim: TurnClaim):
+        """Record claim.response for duplicates, or let one of them run the turn when it is unset."""
+        if not claim.duplicate:
+            self._finish_shared(claim.key, claim.response)
+            self._finish(claim.key, claim.response)
+
+    async def arelease(self, claim: TurnClaim):
+        if not claim.duplicate:
+            # In-process duplicates first: a cancellation while waiting on the shared store must not strand them
+            self._finish(claim.key, claim.response)
+            await self._afinish_shared(claim.key, claim.response)
+
+    @contextmanager
+    def turn(self, key: str):
+        """Claim the turn for the block, which runs it and sets claim.response unless claim.duplicate."""
+        claim = self.claim(key)
+        try:
+            yield claim
+        finally:
+            self.release(claim)
+
+    @asynccontextmanager
+    async def aturn(self, key: str):
+        claim = await self.aclaim(key)
+        try:
+            yield claim
+        finally:
+            await self.arelease(claim)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"backend": self.backend, "in_flight": len(self._pending), "completed": len(self._done),
+                    "duplicates": self.duplicates}
+
+class RedisIdempotencyStore(InMemoryIdempotencyStore):
+    """
+    Deduplicates chat turn submissions across every process sharing Redis.
+
+    Duplicates within this process wait for the in-process original first, so only one
+    submission per key polls Redis. The Redis key holds 'pending:<token>' while the original
+    runs (for at most `wait` seconds, should its process die) and 'done:<response>' for `ttl`
+    seconds after it. Every call is a single sub-millisecond command; async callers make it in
+    a worker thread, so an unreachable Redis holds up the submission but not the event loop.
+    When Redis is unreachable, submissions are deduplicated within this process only.
+    """
+
+    backend = "redis"
+
+    def __init__(self, redis_client, ttl: int = IDEMPOTENCY_TTL, wait: float = IDEMPOTENCY_WAIT,
+                 prefix: str = "idempotency"):
+        super().__init__(ttl, wait)
+        self.redis = redis_client
+        self.prefix = prefix
+        self._release = redis_client.register_script(RELEASE_SCRIPT)
+        self._tokens = {}  # Key -> token of the pending record this process owns
+        self._degraded = False  # Deduplicating within this process only since the last Redis error
+
+    def _redis_failed(self, error: RedisError):
+        if not self._degraded:
+            logger.warning("Idempotency falling back to this process only: %s", error)
+            self._degraded = True
+
+    def _try_shared(self, key: str) -> tuple[bool, str | None]:
+        """
+        One claim attempt: (True, None) when this process runs the turn, (True, response) when
+        another process already answered it, (False, None) while it runs elsewhere.
+        """
+        token = uuid.uuid4().hex
+        try:
+            if self.redis.set(f"{self.prefix}:{key}", f"pending:{token}", nx=True, px=int(self.wait * 1000)):
+                self._tokens[key] = token
+                if self._degraded:
+                    logger.info("Idempotency back on Redis.")
+                    self._degraded = False
+                return True, None
+            value = self.redis.get(f"{self.prefix}:{key}")
+        except RedisError as error:
+            self._redis_failed(error)
+            return True, None
+        if value is not None and value.startswith(b"done:"):
+            return True, value[len(b"done:"):].decode()
+        return False, None  # Pending, or just released by a failed original: claimed on the next attempt
+
+    def _claim_shared(self, key: str, deadline: float) -> str | None:
+        while True:
+            settled, response = self._try_shared(key)
+            if settled:
+                return response
+            if time.monotonic() > deadline:
+                raise TurnInProgressError(f"Turn {key} is still running in another process.")
+            time.sleep(IDEMPOTENCY_POLL)
+
+    async def _aclaim_shared(self, key: str, deadline: float) -> str | None:
+        while True:
+            settled, response = await asyncio.to_thread(self._try_shared, key)
+            if settled:
+                return response
+            if time.monotonic() > deadline:
+                raise TurnInProgressError(f"Turn {key} is still running in another process.")
+            await asyncio.sleep(IDEMPOTENCY_POLL)
+
+    def _finish_shared(self, key: str, response: str | None):
+        token = self._tokens.pop(key, None)
+        if token is None:
+            return  # Claimed while Redis was unreachable
+        try:
+            if response is None:
+                self._release(keys=[f"{self.prefix}:{key}"], args=[f"pending:{token}"])
+            else:
+                self.redis.set(f"{self.prefix}:{key}", f"done:{response}", ex=self.ttl)
+        except RedisError as error:
+            self._redis_failed(error)  # The pending record runs out on its own
+
+    async def _afinish_shared(self, key: str, response: str | None):
+        await asyncio.to_thread(self._finish_shared, key, response)
+
+    def stats(self) -> dict:
+        return {**super().stats(), "degraded": self._degraded}
+
+def create_idempotency_store(backend: str = "redis"):
+    """
+    Build the turn deduplication store for the given backend name: 'redis', 'memory' or 'off'.
+    The Redis backend reuses the client created in redis_checkpoint.py.
+    """
+    if backend == "off":
+        return None
+    if backend == "redis":
+        from redis_checkpoint import get_redis_client
+        return RedisIdempotencyStore(get_redis_client())
+    return InMemoryIdempotencyStore()
@@ -0,0 +1,378 @@
+import bisect
+import functools
+import inspect
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os import getenv
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages.utils import count_tokens_approximately
+from langgraph.checkpoint.base import BaseCheckpointSaver
+
+try:
+    from opentelemetry import trace
+except ImportError:  # OpenTelemetry is optional
+    trace = None
+
+# -------------------- Setup Logging --------------------
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# -------------------- Instrumentation Configuration --------------------
+METRICS_PORT = int(getenv("METRICS_PORT", 0))  # Standalone /metrics endpoint (Streamlit apps), 0 = off
+OTEL_TRACING = getenv("OTEL_TRACING", "false").lower() == "true"  # Needs opentelemetry-api/sdk installed
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = tuple(256 * 4 ** i for i in range(9))  # 256 B .. 16 MB
+
+# -------------------- Prometheus-Style Metrics --------------------
+class _Metric:
+    type_ = ""
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+
+    def _label_text(self, key: tuple, extra: str = "") -> str:
+        pairs = [f'{label}="{value}"' for label, value in zip(self.labels, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> list:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.type_}"]
+
+class Counter(_Metric):
+    type_ = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def render(self) -> list:
+        with self._lock:
+            series = dict(self._series)
+        return super().render() + [f"{self.name}{self._label_text(key)} {value}" for key, value in series.items()]
+
+class Gauge(_Metric):
+    type_ = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = value
+
+    def render(self) -> list:
+        with self._lock:
+            series = dict(self._series)
+        return super().render() + [f"{self.name}{self._label_text(key)} {value}" for key, value in series.items()]
+
+class Histogram(_Metric):
+    type_ = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = buckets
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._series.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._series[key] = (counts, total + value)
+
+    def render(self) -> list:
+        with self._lock:
+            series = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+        lines = super().render()
+        for key, (counts, total) in series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{self._label_text(key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_text(key)} {total}")
+            lines.append(f"{self.name}_count{self._label_text(key)} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    """Process-wide metrics, rendered in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name: str, help_text: str, labels: tuple = ()) -> Counter:
+        metric = Counter(name, help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, help_text: str, labels: tuple = ()) -> Gauge:
+        metric = Gauge(name, help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self._metrics for line in metric.render()) + "\n"
+
+registry = MetricsRegistry()
+
+NODE_DURATION = registry.histogram("chat_node_duration_seconds", "Wall time of a graph node.", ("node",))
+LLM_TTFT = registry.histogram("llm_time_to_first_token_seconds", "Time to the first streamed token.", ("model",))
+LLM_DURATION = registry.histogram("llm_duration_seconds", "Total time of an LLM call.", ("model",))
+LLM_ERRORS = registry.counter("llm_errors_total", "LLM calls that raised.", ("model",))
+LLM_PROMPT_TOKENS = registry.counter("llm_prompt_tokens_total", "Prompt tokens sent to the LLM.", ("model",))
+LLM_COMPLETION_TOKENS = registry.counter("llm_completion_tokens_total", "Completion tokens received.", ("model",))
+CHECKPOINT_DURATION = registry.histogram(
+    "checkpoint_operation_duration_seconds", "Latency of checkpointer operations.", ("saver", "operation"))
+CHECKPOINT_PAYLOAD = registry.histogram(
+    "checkpoint_payload_bytes", "Size of serialized checkpoint values.", ("saver", "direction"), SIZE_BUCKETS)
+CHECKPOINT_CACHE_LOOKUPS = registry.counter(
+    "checkpoint_cache_lookups_total", "Latest-checkpoint reads by hot cache outcome (hit, miss, stale).",
+    ("saver", "result"))
+CHECKPOINT_CACHE_SAVED = registry.counter(
+    "checkpoint_cache_saved_seconds_total", "Estimated backend read time avoided by hot cache hits.", ("saver",))
+RATE_LIMIT_DECISIONS = registry.counter(
+    "rate_limit_decisions_total", "Per-user rate limit checks by outcome and denying limit.", ("result", "limit"))
+RATE_LIMIT_CHECK_DURATION = registry.histogram(
+    "rate_limit_check_duration_seconds", "Latency of one rate limit check.", ("backend",),
+    (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05))
+ROUTER_DECISIONS = registry.counter(
+    "router_decisions_total", "Turns per model route chosen by the router, and the rule that chose it.",
+    ("route", "reason"))
+LLM_RESILIENCE_EVENTS = registry.counter(
+    "llm_resilience_events_total",
+    "Retries, hedges, hedges that won, fallbacks, timeouts, circuit rejections and errors of LLM calls.",
+    ("model", "event"))
+LLM_CIRCUIT_STATE = registry.gauge(
+    "llm_circuit_state", "Circuit breaker of a model: 0 closed, 1 half-open, 2 open.", ("model",))
+TURN_DURATION = registry.histogram(
+    "chat_turn_duration_seconds", "Turn latency seen by the UI, to first token and in total.", ("stage",))
+
+# -------------------- Optional OpenTelemetry Spans --------------------
+tracer = trace.get_tracer("ai_chatbot") if OTEL_TRACING and trace is not None else None
+if OTEL_TRACING and trace is None:
+    logger.warning("OTEL_TRACING is set but opentelemetry is not installed; spans are disabled.")
+
+@contextmanager
+def timed(histogram: Histogram, span_name: str, **labels):
+    """Observe the wall time of the block and, when tracing is on, wrap it in a span."""
+    start = time.perf_counter()
+    if tracer is None:
+        try:
+            yield
+        finally:
+            histogram.observe(time.perf_counter() - start, **labels)
+        return
+    with tracer.start_as_current_span(span_name, attributes=labels):
+        try:
+            yield
+        finally:
+            histogram.observe(time.perf_counter() - start, **labels)
+
+def timed_node(name: str):
+    """Decorator recording the wall time of a sync or async graph node."""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with timed(NODE_DURATION, f"node.{name}", node=name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(NODE_DURATION, f"node.{name}", node=name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# -------------------- LLM Call Metrics --------------------
+class LLMMetricsCallback(BaseCallbackHandler):
+    """
+    Records time to first token (streamed calls only), total time and token counts of
+    every chat model call it is attached to. Token counts come from the provider's usage
+    metadata when present and are estimated otherwise.
+    """
+
+    run_inline = True  # Cheap bookkeeping: no need for a thread pool hop on async runs
+
+    def __init__(self):
+        self._runs = {}  # run_id -> [model, start, prompt tokens, span, first token seen]
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, invocation_params=None, **kwargs):
+        params = invocation_params or {}
+        model = params.get("model_name") or params.get("model") or params.get("_type", "unknown")
+        span = tracer.start_span("llm.call", attributes={"model": model}) if tracer is not None else None
+        prompt_tokens = count_tokens_approximately(messages[0]) if messages else 0
+        self._runs[run_id] = [model, time.perf_counter(), prompt_tokens, span, False]
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        run = self._runs.get(run_id)
+        if run is not None and not run[4]:
+            run[4] = True
+            LLM_TTFT.observe(time.perf_counter() - run[1], model=run[0])
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        model, start, prompt_tokens, span, _ = run
+        LLM_DURATION.observe(time.perf_counter() - start, model=model)
+        message = getattr(response.generations[0][0], "message", None) if response.generations else None
+        usage = getattr(message, "usage_metadata", None)
+        if usage:
+            prompt_tokens, completion_tokens = usage["input_tokens"], usage["output_tokens"]
+        else:
+            completion_tokens = count_tokens_approximately([message]) if message is not None else 0
+        LLM_PROMPT_TOKENS.inc(prompt_tokens, model=model)
+        LLM_COMPLETION_TOKENS.inc(completion_tokens, model=model)
+        if span is not None:
+            span.set_attributes({"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens})
+            span.end()
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        LLM_ERRORS.inc(model=run[0])
+        if run[3] is not None:
+            run[3].record_exception(error)
+            run[3].end()
+
+llm_metrics_callback = LLMMetricsCallback()
+
+# -------------------- Checkpointer Metrics --------------------
+class InstrumentedSerializer:
+    """Serializer wrapper recording the size of every value written to or read from a saver."""
+
+    def __init__(self, serde, saver_name: str):
+        self.serde = serde
+        self.saver_name = saver_name
+
+    def __getattr__(self, name):
+        if name == "serde":
+            raise AttributeError(name)
+        return getattr(self.serde, name)
+
+    def dumps_typed(self, obj):
+        type_, data = self.serde.dumps_typed(obj)
+        CHECKPOINT_PAYLOAD.observe(len(data), saver=self.saver_name, direction="dump")
+        return type_, data
+
+    def loads_typed(self, data):
+        CHECKPOINT_PAYLOAD.observe(len(data[1]), saver=self.saver_name, direction="load")
+        return self.serde.loads_typed(data)
+
+class InstrumentedCheckpointSaver(BaseCheckpointSaver):
+    """Wraps a checkpoint saver and records the latency of its reads and writes."""
+
+    def __init__(self, saver: BaseCheckpointSaver, saver_name: str):
+        super().__init__(serde=saver.serde)
+        self.saver = saver
+        self.saver_name = saver_name
+
+    def __getattr__(self, name):
+        if name == "saver":
+            raise AttributeError(name)
+        return getattr(self.saver, name)
+
+    def _timed(self, operation: str):
+        return timed(CHECKPOINT_DURATION, f"checkpoint.{operation}", saver=self.saver_name, operation=operation)
+
+    @property
+    def config_specs(self) -> list:
+        return self.saver.config_specs
+
+    def get_next_version(self, current, channel):
+        return self.saver.get_next_version(current, channel)
+
+    def get_tuple(self, config):
+        with self._timed("get"):
+            return self.saver.get_tuple(config)
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        # Passed through lazily and timed up to exhaustion or close. No span: the caller runs
+        # between items, and a span would stay current in its context meanwhile
+        start = time.perf_counter()
+        try:
+            yield from self.saver.list(config, filter=filter, before=before, limit=limit)
+        finally:
+            CHECKPOINT_DURATION.observe(time.perf_counter() - start, saver=self.saver_name, operation="list")
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        with self._timed("put"):
+            return self.saver.put(config, checkpoint, metadata, new_versions)
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        with self._timed("put_writes"):
+            self.saver.put_writes(config, writes, task_id, task_path)
+
+    def delete_thread(self, thread_id):
+        self.saver.delete_thread(thread_id)
+
+    async def aget_tuple(self, config):
+        with self._timed("get"):
+            return await self.saver.aget_tuple(config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        async for item in self.saver.alist(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        with self._timed("put"):
+            return await self.saver.aput(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        with self._timed("put_writes"):
+            await self.saver.aput_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        await self.saver.adelete_thread(thread_id)
+
+def instrument_saver(saver: BaseCheckpointSaver, saver_name: str) -> InstrumentedCheckpointSaver:
+    """
+    Record latency of a saver and payload sizes of its serializer. Savers that serialize
+    with a serializer other than `saver.serde` are timed but not sized.
+    """
+    inner = saver
+    while getattr(inner, "saver", None) is not None:  # Compaction / hot cache wrappers
+        inner = inner.saver
+    inner.serde = InstrumentedSerializer(inner.serde, saver_name)
+    return InstrumentedCheckpointSaver(saver, saver_name)
+
+# -------------------- Metrics Endpoint --------------------
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = registry.render().encode()
+        self.send_response(200 if self.path == "/metrics" else 404)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes would flood the application log
+
+def start_metrics_server(port: int = METRICS_PORT):
+    """Serve /metrics on a daemon thread, for processes without their own HTTP API (Streamlit)."""
+    if not port:
+        return None
+    server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info("Metrics served on :%d/metrics", port)
+    return server
@@ -0,0 +1,318 @@
+import asyncio
+import hashlib
+import heapq
+import itertools
+import json
+import threading
+import time
+import logging
+from concurrent.futures import Future
+from dataclasses import dataclass, asdict
+from os import getenv
+
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import ensure_config, merge_configs
+
+# -------------------- Setup Logging --------------------
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# -------------------- Scheduler Configuration --------------------
+LLM_MAX_CONCURRENCY = int(getenv("LLM_MAX_CONCURRENCY", 16))  # In-flight calls per model and process
+LLM_TOKENS_PER_MINUTE = int(getenv("LLM_TOKENS_PER_MINUTE", 0))  # Per model and process, 0 = unlimited
+LLM_COMPLETION_TOKEN_ESTIMATE = int(getenv("LLM_COMPLETION_TOKEN_ESTIMATE", 500))  # Reserved per call
+LLM_COALESCE = getenv("LLM_COALESCE", "true").lower() == "true"  # Single-flight for identical prompts
+
+# Lower value is served first
+PRIORITY_AUTHENTICATED = 0
+PRIORITY_ANONYMOUS = 1
+
+class LeaderCancelled(Exception):
+    """The leader of a coalesced call went away before answering; a follower retries the call."""
+
+# -------------------- Per-Model Admission Control --------------------
+@dataclass
+class ModelStats:
+    model: str
+    max_concurrency: int
+    tokens_per_minute: int
+    queued: int = 0  # Calls waiting for a slot
+    peak_queued: int = 0
+    in_flight: int = 0
+    calls: int = 0
+    wait_seconds_total: float = 0.0
+    wait_seconds_max: float = 0.0
+    tokens_used: int = 0
+    tokens_available: float = 0.0
+
+class _Waiter:
+    """A call waiting for a slot; woken through a threading.Event or an asyncio future."""
+
+    def __init__(self, priority: int, seq: int, tokens: int, loop=None):
+        self.priority = priority
+        self.seq = seq
+        self.tokens = tokens
+        self.granted = False
+        self.enqueued_at = time.perf_counter()
+        self.loop = loop
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(lambda: self.future.done() or self.future.set_result(None))
+
+class ModelLimiter:
+    """
+    Admits calls to one model in priority order (FIFO within a priority), with at most
+    `max_concurrency` in flight and a token bucket refilled at `tokens_per_minute`.
+    Shared by sync callers (worker threads) and async callers (event loop tasks).
+    """
+
+    def __init__(self, model: str, max_concurrency: int, tokens_per_minute: int):
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self.stats = ModelStats(model, max_concurrency, tokens_per_minute, tokens_available=tokens_per_minute)
+        self._queue = []  # Heap of _Waiter
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._refilled_at = time.monotonic()
+        self._refill_timer = None
+
+    def _refill(self):
+        if not self.tokens_per_minute:
+            return
+        now = time.monotonic()
+        refilled = (now - self._refilled_at) * self.tokens_per_minute / 60
+        self.stats.tokens_available = min(self.tokens_per_minute, self.stats.tokens_available + refilled)
+        self._refilled_at = now
+
+    def _schedule_refill(self, missing_tokens: float):
+        if self._refill_timer is not None:
+            return
+        self._refill_timer = threading.Timer(missing_tokens * 60 / self.tokens_per_minute, self._on_refill)
+        self._refill_timer.daemon = True
+        self._refill_timer.start()
+
+    def _on_refill(self):
+        with self._lock:
+            self._refill_timer = None
+            self._grant()
+
+    def _grant(self):
+        """Admit waiters from the head of the queue while a slot and enough tokens are available."""
+        self._refill()
+        while self._queue and self.stats.in_flight < self.max_concurrency:
+            waiter = self._queue[0]
+            # A call larger than the whole budget only needs a full bucket
+            needed = min(waiter.tokens, self.tokens_per_minute)
+            if self.tokens_per_minute and self.stats.tokens_available < needed:
+                self._schedule_refill(needed - self.stats.tokens_available)
+                break
+            heapq.heappop(self._queue)
+            waited = time.perf_counter() - waiter.enqueued_at
+            self.stats.queued = len(self._queue)
+            self.stats.in_flight += 1
+            self.stats.calls += 1
+            self.stats.wait_seconds_total += waited
+            self.stats.wait_seconds_max = max(self.stats.wait_seconds_max, waited)
+            if self.tokens_per_minute:
+                self.stats.tokens_available -= waiter.tokens
+            waiter.granted = True
+            waiter.wake()
+
+    def _enqueue(self, waiter: _Waiter):
+        with self._lock:
+            heapq.heappush(self._queue, waiter)
+            self.stats.queued = len(self._queue)
+            self.stats.peak_queued = max(self.stats.peak_queued, self.stats.queued)
+            self._grant()
+
+    def acquire(self, tokens: int, priority: int):
+        waiter = _Waiter(priority, next(self._seq), tokens)
+        self._enqueue(waiter)
+        waiter.event.wait()
+
+    async def aacquire(self, tokens: int, priority: int):
+        waiter = _Waiter(priority, next(self._seq), tokens, loop=asyncio.get_running_loop())
+        self._enqueue(waiter)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter.granted:
+                    # Admitted just before the cancellation: hand the slot back
+                    self.stats.in_flight -= 1
+                else:
+                    self._queue.remove(waiter)
+                    heapq.heapify(self._queue)
+                    self.stats.queued = len(self._queue)
+                self._grant()
+            raise
+
+    def release(self, reserved_tokens: int, used_tokens: int):
+        with self._lock:
+            self.stats.in_flight -= 1
+            self.stats.tokens_used += used_tokens
+            if self.tokens_per_minute:
+                # Settle the reservation against the usage reported by the provider
+                self.stats.tokens_available += reserved_tokens - used_tokens
+            self._grant()
+
+# -------------------- LLM Scheduler --------------------
+class LLMScheduler:
+    """
+    Sits between the graph nodes and the chat model.
+
+    - Single-flight: concurrent calls with the same model and prompt share one provider
+      call; later callers get a copy of the leader's response. Should the leader be
+      cancelled, one of them makes the call instead.
+    - Admission: every model gets a ModelLimiter (concurrency, tokens per minute and a
+      priority queue), so a burst of sessions queues here instead of hitting provider
+      rate limits.
+
+    The call itself runs in the caller's thread or task, so the node's callbacks (and
+    with them token streaming to the UI) keep working for the leader. `callbacks` are
+    added to every provider call, on top of the node's own.
+    """
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, tokens_per_minute: int = LLM_TOKENS_PER_MINUTE,
+                 completion_tokens: int = LLM_COMPLETION_TOKEN_ESTIMATE, coalesce: bool = LLM_COALESCE,
+                 callbacks: list | None = None):
+        self.max_concurrency = max_concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self.completion_tokens = completion_tokens
+        self.coalesce = coalesce
+        self.callbacks = callbacks or []
+        self.coalesced = 0  # Calls served by another caller's provider call
+        self._limiters = {}
+        self._in_flight = {}  # Prompt key -> Future of the leader's response
+        self._lock = threading.Lock()
+
+    def limiter(self, llm) -> ModelLimiter:
+        model = getattr(llm, "model_name", None) or type(llm).__name__
+        with self._lock:
+            if model not in self._limiters:
+                self._limiters[model] = ModelLimiter(model, self.max_concurrency, self.tokens_per_minute)
+            return self._limiters[model]
+
+    @staticmethod
+    def _key(llm, prompt: list) -> str:
+        # Message ids differ between sessions, so only roles and contents identify a prompt
+        payload = json.dumps([
+            getattr(llm, "model_name", None) or type(llm).__name__,
+            [(m.type, m.content) for m in prompt],
+        ], default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _join(self, llm, prompt: list):
+        """Return (future, is_leader) for this prompt."""
+        if not self.coalesce:
+            return Future(), True
+        key = self._key(llm, prompt)
+        with self._lock:
+            if key in self._in_flight:
+                return self._in_flight[key], False
+            future = self._in_flight[key] = Future()
+            future.key = key
+            return future, True
+
+    def _followed(self, response):
+        with self._lock:
+            self.coalesced += 1
+        return response.model_copy()
+
+    def _finish(self, future: Future, response=None, error: BaseException | None = None):
+        with self._lock:
+            self._in_flight.pop(getattr(future, "key", None), None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(response)
+
+    def _config(self) -> RunnableConfig:
+        # The node's run config (its callbacks carry token streaming) plus the scheduler's callbacks
+        return merge_configs(ensure_config(), {"callbacks": self.callbacks})
+
+    def _reservation(self, prompt: list) -> int:
+        return count_tokens_approximately(prompt) + self.completion_tokens
+
+    @staticmethod
+    def _used_tokens(response, reserved: int) -> int:
+        usage = getattr(response, "usage_metadata", None)
+        return usage["total_tokens"] if usage else reserved
+
+    def invoke(self, llm, prompt: list, priority: int = PRIORITY_ANONYMOUS):
+        while True:
+            future, leader = self._join(llm, prompt)
+            if leader:
+                break
+            try:
+                return self._followed(future.result())
+            except LeaderCancelled:
+                continue  # Join the next leader, or lead
+
+        limiter, reserved = self.limiter(llm), self._reservation(prompt)
+        try:
+            limiter.acquire(reserved, priority)
+            response = None
+            try:
+                response = llm.invoke(prompt, config=self._config())
+            finally:
+                limiter.release(reserved, self._used_tokens(response, reserved))
+        except Exception as error:
+            self._finish(future, error=error)
+            raise
+        except BaseException:
+            # Interrupted, not failed: the followers retry rather than share it
+            self._finish(future, error=LeaderCancelled())
+            raise
+        self._finish(future, response)
+        return response
+
+    async def ainvoke(self, llm, prompt: list, priority: int = PRIORITY_ANONYMOUS):
+        while True:
+            future, leader = self._join(llm, prompt)
+            if leader:
+                break
+            try:
+                # Shielded: a follower going away must not cancel the leader's call
+                return self._followed(await asyncio.shield(asyncio.wrap_future(future)))
+            except LeaderCancelled:
+                continue
+
+        limiter, reserved = self.limiter(llm), self._reservation(prompt)
+        try:
+            await limiter.aacquire(reserved, priority)
+            response = None
+            try:
+                response = await llm.ainvoke(prompt, config=self._config())
+            finally:
+                limiter.release(reserved, self._used_tokens(response, reserved))
+        except Exception as error:
+            self._finish(future, error=error)
+            raise
+        except BaseException:
+            # Cancelled: only this caller goes away, the followers retry
+            self._finish(future, error=LeaderCancelled())
+            raise
+        self._finish(future, response)
+        return response
+
+    def stats(self) -> dict:
+        """Queue depth, concurrency and token usage per model, for metrics and health checks."""
+        with self._lock:
+            limiters = list(self._limiters.values())
+        models = {}
+        for limiter in limiters:
+            with limiter._lock:
+                limiter._refill()
+                models[limiter.model] = asdict(limiter.stats)
+        return {"coalesced": self.coalesced, "models": models}
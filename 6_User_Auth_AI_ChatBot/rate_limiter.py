@@ -0,0 +1,250 @@
+import asyncio
+import threading
+import time
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from os import getenv
+
+from redis.exceptions import RedisError
+
+from instrumentation import RATE_LIMIT_CHECK_DURATION, RATE_LIMIT_DECISIONS
+
+# -------------------- Setup Logging --------------------
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# -------------------- Rate Limit Configuration --------------------
+# Per user; 0 disables a limit
+RATE_LIMIT_REQUESTS_PER_MINUTE = int(getenv("RATE_LIMIT_REQUESTS_PER_MINUTE", 20))
+RATE_LIMIT_REQUESTS_PER_DAY = int(getenv("RATE_LIMIT_REQUESTS_PER_DAY", 1000))
+RATE_LIMIT_TOKENS_PER_MINUTE = int(getenv("RATE_LIMIT_TOKENS_PER_MINUTE", 40_000))
+RATE_LIMIT_TOKENS_PER_DAY = int(getenv("RATE_LIMIT_TOKENS_PER_DAY", 500_000))
+RATE_LIMIT_LOCAL_MAX_KEYS = 100_000  # Buckets kept by the in-process limiter
+# Seconds the Redis limiter serves from process memory after a Redis error before trying Redis again
+RATE_LIMIT_REDIS_COOLDOWN = float(getenv("RATE_LIMIT_REDIS_COOLDOWN", 10))
+
+# -------------------- Limits --------------------
+@dataclass(frozen=True)
+class Limit:
+    name: str  # e.g. "requests/minute"
+    unit: str  # "requests" or "tokens"
+    capacity: int  # Allowed per window; also the largest burst
+    window: int  # Seconds
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.window
+
+def configured_limits() -> list:
+    limits = [
+        Limit("requests/minute", "requests", RATE_LIMIT_REQUESTS_PER_MINUTE, 60),
+        Limit("requests/day", "requests", RATE_LIMIT_REQUESTS_PER_DAY, 86_400),
+        Limit("tokens/minute", "tokens", RATE_LIMIT_TOKENS_PER_MINUTE, 60),
+        Limit("tokens/day", "tokens", RATE_LIMIT_TOKENS_PER_DAY, 86_400),
+    ]
+    return [limit for limit in limits if limit.capacity > 0]
+
+@dataclass
+class Decision:
+    allowed: bool
+    retry_after: float = 0.0  # Seconds until the request would be allowed
+    limit: str | None = None  # Name of the limit that denied it
+
+ALLOWED = Decision(True)
+
+# -------------------- Token Buckets --------------------
+# Every limit is a token bucket holding up to `capacity` and refilled at capacity / window,
+# i.e. `capacity` per window with bursts up to the whole window's allowance.
+# A call passes, for each bucket, how much must be available (`need`) and how much to take
+# (`take`): nothing is taken unless every bucket has what it needs, so one call checks all
+# the limits of a user at once. Requests need and take 1. LLM tokens are not known before
+# the turn: a turn needs its prompt's worth of tokens to be available and its actual usage
+# is taken afterwards, which may leave the bucket in debt until it refills.
+TOKEN_BUCKET_SCRIPT = """
+local now = tonumber(ARGV[1])
+local levels = {}
+local retry_after, denied = 0, 0
+for i, key in ipairs(KEYS) do
+    local base = 1 + (i - 1) * 4
+    local capacity, rate = tonumber(ARGV[base + 1]), tonumber(ARGV[base + 2])
+    local need = tonumber(ARGV[base + 3])
+    local state = redis.call('HMGET', key, 'level', 'ts')
+    local level = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    level = math.min(capacity, level + math.max(0, now - ts) * rate)
+    levels[i] = level
+    if level < need and (need - level) / rate > retry_after then
+        retry_after, denied = (need - level) / rate, i
+    end
+end
+if denied > 0 then
+    return {0, tostring(retry_after), denied}
+end
+for i, key in ipairs(KEYS) do
+    local base = 1 + (i - 1) * 4
+    local capacity, rate = tonumber(ARGV[base + 1]), tonumber(ARGV[base + 2])
+    local level = levels[i] - tonumber(ARGV[base + 4])
+    redis.call('HSET', key, 'level', tostring(level), 'ts', tostring(now))
+    -- Once refilled to capacity the bucket is the same as a missing one
+    redis.call('PEXPIRE', key, math.ceil((capacity - level) / rate * 1000) + 1000)
+end
+return {1, '0', 0}
+"""
+
+class _Limiter:
+    """Shared logic of both backends; subclasses implement _apply()."""
+
+    backend = ""
+
+    def __init__(self, limits: list | None = None):
+        self.limits = configured_limits() if limits is None else limits
+
+    def _apply(self, user: str, buckets: list, now: float) -> Decision:
+        raise NotImplementedError
+
+    def _blocking(self) -> bool:
+        """Whether _apply() may wait on the network, so async callers run it in a thread."""
+        return False
+
+    def check(self, user: str, prompt_tokens: int = 0) -> Decision:
+        """
+        Admit one request of `user` whose prompt is about `prompt_tokens` long.
+        Takes one request from the request limits; token limits are charged by record_usage().
+        """
+        buckets = [
+            (limit, 1, 1) if limit.unit == "requests" else (limit, min(prompt_tokens, limit.capacity), 0)
+            for limit in self.limits
+        ]
+        if not buckets:
+            return ALLOWED
+        start = time.perf_counter()
+        decision = self._apply(user, buckets, time.time())
+        RATE_LIMIT_CHECK_DURATION.observe(time.perf_counter() - start, backend=self.backend)
+        RATE_LIMIT_DECISIONS.inc(result="allowed" if decision.allowed else "denied", limit=decision.limit or "")
+        if not decision.allowed:
+            logger.info("Rate limited %s on %s, retry in %.1fs.", user, decision.limit, decision.retry_after)
+        return decision
+
+    def record_usage(self, user: str, tokens: int):
+        """Charge the LLM tokens a turn actually used to the user's token limits."""
+        buckets = [(limit, 0, tokens) for limit in self.limits if limit.unit == "tokens"]
+        if buckets and tokens > 0:
+            self._apply(user, buckets, time.time())
+
+    async def acheck(self, user: str, prompt_tokens: int = 0) -> Decision:
+        """check() for the event loop: off it while the backend may block."""
+        if not self._blocking():
+            return self.check(user, prompt_tokens)
+        return await asyncio.to_thread(self.check, user, prompt_tokens)
+
+    async def arecord_usage(self, user: str, tokens: int):
+        if not self._blocking():
+            self.record_usage(user, tokens)
+        else:
+            await asyncio.to_thread(self.record_usage, user, tokens)
+
+class InMemoryRateLimiter(_Limiter):
+    """Buckets in process memory: limits apply per app replica."""
+
+    backend = "memory"
+
+    def __init__(self, limits: list | None = None, max_keys: int = RATE_LIMIT_LOCAL_MAX_KEYS):
+        super().__init__(limits)
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # (user, limit name) -> [level, ts], least recent first
+        self._lock = threading.Lock()
+
+    def _apply(self, user: str, buckets: list, now: float) -> Decision:
+        with self._lock:
+            levels, denied = [], ALLOWED
+            for limit, need, _ in buckets:
+                level, ts = self._buckets.get((user, limit.name), (limit.capacity, now))
+                level = min(limit.capacity, level + max(0.0, now - ts) * limit.rate)
+                levels.append(level)
+                if level < need and (need - level) / limit.rate > denied.retry_after:
+                    denied = Decision(False, (need - level) / limit.rate, limit.name)
+            if not denied.allowed:
+                return denied
+            for (limit, _, take), level in zip(buckets, levels):
+                key = (user, limit.name)
+                self._buckets[key] = [level - take, now]
+                self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return ALLOWED
+
+class RedisRateLimiter(_Limiter):
+    """
+    Buckets in Redis, shared by every replica; each check is one atomic EVALSHA.
+    All the keys of a user share the `{user}` hash tag so the script also runs on a Cluster.
+    When Redis is unreachable, checks fall back to an in-process limiter rather than
+    blocking or failing every turn: for `cooldown` seconds after a Redis error they do not
+    wait on Redis at all, then a single check tries it again.
+    """
+
+    backend = "redis"
+
+    def __init__(self, redis_client, limits: list | None = None, prefix: str = "rate_limit",
+                 cooldown: float = RATE_LIMIT_REDIS_COOLDOWN):
+        super().__init__(limits)
+        self.prefix = prefix
+        self.cooldown = cooldown
+        self._script = redis_client.register_script(TOKEN_BUCKET_SCRIPT)
+        self.fallback = InMemoryRateLimiter(self.limits)
+        self._degraded = False  # Serving from the fallback since the last Redis error
+        self._retry_at = 0.0  # Monotonic time before which checks skip Redis
+        self._lock = threading.Lock()
+
+    def _cooling_down(self) -> bool:
+        return self._degraded and time.monotonic() < self._retry_at
+
+    def _blocking(self) -> bool:
+        return not self._cooling_down()
+
+    def _try_redis(self) -> bool:
+        """Whether this check goes to Redis: always while healthy, one probe per cooldown otherwise."""
+        if not self._degraded:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            if now < self._retry_at:
+                return False
+            self._retry_at = now + self.cooldown  # The other checks keep to the fallback meanwhile
+            return True
+
+    def _apply(self, user: str, buckets: list, now: float) -> Decision:
+        if not self._try_redis():
+            return self.fallback._apply(user, buckets, now)
+        keys = [f"{self.prefix}:{{{user}}}:{limit.name}" for limit, _, _ in buckets]
+        args = [now]
+        for limit, need, take in buckets:
+            args += [limit.capacity, limit.rate, need, take]
+        try:
+            allowed, retry_after, denied = self._script(keys=keys, args=args)
+        except RedisError as error:
+            with self._lock:
+                if not self._degraded:
+                    logger.warning("Rate limiter falling back to process memory for %.0fs: %s", self.cooldown, error)
+                    self._degraded = True
+                self._retry_at = time.monotonic() + self.cooldown
+            return self.fallback._apply(user, buckets, now)
+        if self._degraded:
+            with self._lock:
+                self._degraded = False
+            logger.info("Rate limiter back on Redis.")
+        if allowed:
+            return ALLOWED
+        return Decision(False, float(retry_after), buckets[denied - 1][0].name)
+
+def create_rate_limiter(backend: str = "redis"):
+    """
+    Build the per-user rate limiter for the given backend name: 'redis', 'memory' or 'off'.
+    The Redis backend reuses the client created in redis_checkpoint.py.
+    """
+    if backend == "off":
+        return None
+    if backend == "redis":
+        from redis_checkpoint import get_redis_client
+        return RedisRateLimiter(get_redis_client())
+    return InMemoryRateLimiter()
@@ -1,6 +1,10 @@
-import os
-import redis
-from langgraph.checkpoint.redis import RedisSaver
+from functools import cache
+from checkpoint_compaction import with_compaction
+from compact_serializer import compact_serializer
+from instrumentation import instrument_saver
+from tiered_checkpoint import TieredCheckpointSaver, with_hot_cache
+from redis_connection import create_redis_client, create_async_redis_client, pool_stats
+from thread_index import ThreadIndex
 import logging
 
 # -------------------- Setup Logging --------------------
@@ -8,15 +12,19 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # -------------------- Redis Configuration --------------------
-# Define Redis connection parameters
-REDIS_HOST = 'localhost'
-REDIS_PORT = 6379
+# Endpoint, pool size, timeouts and retries are configured through the REDIS_* environment
+# variables read in redis_connection.py
 SESSION_TTL = 1  # TTL in minute
-REDIS_DB = int(os.getenv("REDIS_DB", 0))  # Default to DB 0 if not set
-logger.info("Connecting to Redis at %s:%d (DB: %d)", REDIS_HOST, REDIS_PORT, REDIS_DB)
 
-# Create Redis client instance
-redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB)
+# Clients and savers are built on first use rather than at import: RedisSaver connects and
+# checks its search indexes when it is constructed, and langgraph.checkpoint.redis is slow
+# to import. Each getter returns the same process-wide instance on every call.
+
+# The process-wide pooled Redis client, shared by the checkpointer and every other
+# Redis user in this process (e.g. the response cache)
+@cache
+def get_redis_client():
+    return create_redis_client()
 
 # -------------------- TTL Configuration --------------------
 # TTL (Time-To-Live) settings for checkpoints
@@ -26,7 +34,99 @@ ttl_config = {
 }
 logger.info("TTL configuration set: %s", ttl_config)
 
+# -------------------- Latest Checkpoint Probes --------------------
+# RedisSaver keeps a pointer to the key of the latest checkpoint of every thread namespace;
+# reading it is enough to tell whether a cached checkpoint is still the latest one.
+def _checkpoint_id_from_pointer(pointer) -> str | None:
+    if not pointer:
+        return None
+    pointer = pointer.decode() if isinstance(pointer, bytes) else pointer
+    return pointer.rsplit(":", 1)[-1]
+
+def latest_checkpoint_id(thread_id: str, checkpoint_ns: str = "") -> str | None:
+    return _checkpoint_id_from_pointer(
+        get_redis_client().get(get_redis_saver()._make_redis_checkpoint_latest_key(thread_id, checkpoint_ns)))
+
+async def alatest_checkpoint_id(thread_id: str, checkpoint_ns: str = "") -> str | None:
+    key = get_async_redis_saver()._make_redis_checkpoint_latest_key(thread_id, checkpoint_ns)
+    return _checkpoint_id_from_pointer(await get_async_redis_client().get(key))
+
 # -------------------- Initialize RedisSaver --------------------
-# Create a RedisSaver instance for LangGraph checkpointing
-redis_checkpoint_saver = RedisSaver(redis_client=redis_client, ttl=ttl_config)
-logger.info("Redis checkpoint saver initialized.")
\ No newline at end of file
+@cache
+def get_redis_saver():
+    """The RedisSaver itself, without wrappers (compaction and benchmarks use it directly)."""
+    from langgraph.checkpoint.redis import RedisSaver
+    # Create a RedisSaver instance for LangGraph checkpointing
+    redis_saver = RedisSaver(redis_client=get_redis_client(), ttl=ttl_config)
+    # RedisSaver always builds its own serializer; opt into compact payloads with CHECKPOINT_SERIALIZER=compact
+    redis_saver.serde = compact_serializer(redis_saver.serde, compact_documents=False)
+    return redis_saver
+
+@cache
+def get_checkpoint_saver():
+    """The checkpointer of the sync graph."""
+    # Keep only the latest checkpoints per thread (CHECKPOINT_COMPACTION / CHECKPOINT_KEEP_LAST),
+    # serve the latest checkpoint of recently used threads from process memory (CHECKPOINT_CACHE_*),
+    # and record get/put latency and payload sizes
+    redis_checkpoint_saver = instrument_saver(
+        with_hot_cache(with_compaction(get_redis_saver()), "redis", probe=latest_checkpoint_id), "redis")
+    logger.info("Redis checkpoint saver initialized.")
+    return redis_checkpoint_saver
+
+# -------------------- Initialize AsyncRedisSaver --------------------
+# Async client and saver so a single event loop can serve many sessions concurrently.
+# The async client has its own pool, separate from get_redis_client()'s and shared by every
+# coroutine in the process. Sync Redis users called from the event loop (e.g. the response
+# cache) go through a worker thread.
+@cache
+def get_async_redis_client():
+    return create_async_redis_client()
+
+@cache
+def get_async_redis_saver():
+    from langgraph.checkpoint.redis import AsyncRedisSaver
+    async_redis_saver = AsyncRedisSaver(redis_client=get_async_redis_client(), ttl=ttl_config)
+    async_redis_saver.serde = compact_serializer(async_redis_saver.serde, compact_documents=False)
+    return async_redis_saver
+
+@cache
+def get_async_checkpoint_saver():
+    """The checkpointer of the async graph; see setup_async_checkpoint_saver()."""
+    # Background compaction of async sessions goes through the sync saver, which shares the storage
+    async_redis_checkpoint_saver = instrument_saver(
+        with_hot_cache(with_compaction(get_async_redis_saver(), pruner=get_redis_saver()), "redis",
+                       aprobe=alatest_checkpoint_id),
+        "redis",
+    )
+    logger.info("Async Redis checkpoint saver initialized.")
+    return async_redis_checkpoint_saver
+
+@cache
+def get_thread_index() -> ThreadIndex:
+    """Per-user list of threads; index entries live as long as the checkpoints they point to."""
+    return ThreadIndex(get_redis_client(), max_age=SESSION_TTL * 60)
+
+async def setup_async_checkpoint_saver():
+    """
+    Create the indexes and bind the async saver to the running event loop.
+    Must be awaited once, on the serving event loop, before the async agent is used.
+    """
+    async_redis_checkpoint_saver = get_async_checkpoint_saver()
+    if async_redis_checkpoint_saver.loop is None:
+        await async_redis_checkpoint_saver.asetup()
+        logger.info("Async Redis checkpoint saver set up.")
+
+def checkpoint_cache_stats() -> dict:
+    """Hit ratio and size of the sync and async hot caches (empty when CHECKPOINT_CACHE_SIZE=0)."""
+    return {
+        name: saver.saver.stats()
+        for name, saver in (("sync", get_checkpoint_saver()), ("async", get_async_checkpoint_saver()))
+        if isinstance(saver.saver, TieredCheckpointSaver)
+    }
+
+def redis_pool_stats() -> dict:
+    """Utilization of the sync and async connection pools, for metrics and health checks."""
+    return {
+        "sync": pool_stats(get_redis_client()),
+        "async": pool_stats(get_async_redis_client()),
+    }
@@ -0,0 +1,193 @@
+import os
+import threading
+import time
+import logging
+from dataclasses import dataclass, asdict
+
+import redis
+import redis.asyncio
+from redis.asyncio.retry import Retry as AsyncRetry
+from redis.asyncio.sentinel import Sentinel as AsyncSentinel
+from redis.backoff import ExponentialWithJitterBackoff
+from redis.exceptions import ConnectionError, TimeoutError
+from redis.retry import Retry
+from redis.sentinel import Sentinel
+
+# -------------------- Setup Logging --------------------
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# -------------------- Redis Connection Configuration --------------------
+# Endpoint: a single server (host/port or Unix socket), a Sentinel-managed master, or a Cluster
+REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+REDIS_DB = int(os.getenv("REDIS_DB", 0))  # Default to DB 0 if not set
+REDIS_PASSWORD = os.getenv("REDIS_PASSWORD")
+REDIS_UNIX_SOCKET = os.getenv("REDIS_UNIX_SOCKET")  # e.g. /var/run/redis/redis.sock
+REDIS_SENTINELS = os.getenv("REDIS_SENTINELS")  # e.g. "sentinel1:26379,sentinel2:26379"
+REDIS_SENTINEL_SERVICE = os.getenv("REDIS_SENTINEL_SERVICE", "mymaster")
+REDIS_CLUSTER = os.getenv("REDIS_CLUSTER", "false").lower() == "true"
+
+# Pool sizing and socket behaviour
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))  # Per pool (sync and async each)
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", 5))  # Max wait for a free pooled connection
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", 5))
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", 2))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", 30))  # Seconds idle before PING
+REDIS_RETRY_ATTEMPTS = int(os.getenv("REDIS_RETRY_ATTEMPTS", 3))
+
+# -------------------- Pool Utilization Metrics --------------------
+@dataclass
+class PoolStats:
+    max_connections: int
+    created: int = 0  # Connections opened over the pool's lifetime
+    in_use: int = 0  # Connections currently checked out
+    peak_in_use: int = 0
+    checkouts: int = 0
+    wait_seconds_total: float = 0.0  # Time spent waiting for a free connection
+    wait_seconds_max: float = 0.0
+
+    def record_checkout(self, in_use: int, waited: float):
+        self.checkouts += 1
+        self.in_use = in_use
+        self.peak_in_use = max(self.peak_in_use, in_use)
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+class InstrumentedConnectionPool(redis.BlockingConnectionPool):
+    """
+    Blocking pool: when all connections are busy, callers wait up to REDIS_POOL_TIMEOUT for one
+    to be released instead of opening extra connections, which avoids connection churn under
+    bursts. Checkouts, waits and peak usage are recorded in `stats`.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = PoolStats(max_connections=self.max_connections)
+        self._stats_lock = threading.Lock()
+        # redis-py also releases connections that failed to connect inside get_connection,
+        # so only connections handed out to a caller are counted as in use
+        self._checked_out = set()
+
+    def make_connection(self):
+        with self._stats_lock:
+            self.stats.created += 1
+        return super().make_connection()
+
+    def get_connection(self, *args, **kwargs):
+        start = time.perf_counter()
+        connection = super().get_connection(*args, **kwargs)
+        with self._stats_lock:
+            self._checked_out.add(id(connection))
+            self.stats.record_checkout(len(self._checked_out), time.perf_counter() - start)
+        return connection
+
+    def release(self, connection):
+        super().release(connection)
+        with self._stats_lock:
+            self._checked_out.discard(id(connection))
+            self.stats.in_use = len(self._checked_out)
+
+class AsyncInstrumentedConnectionPool(redis.asyncio.BlockingConnectionPool):
+    """Async counterpart of InstrumentedConnectionPool, for clients used on an event loop."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = PoolStats(max_connections=self.max_connections)
+        self._checked_out = set()
+
+    def make_connection(self):
+        self.stats.created += 1
+        return super().make_connection()
+
+    async def get_connection(self, *args, **kwargs):
+        start = time.perf_counter()
+        connection = await super().get_connection(*args, **kwargs)
+        self._checked_out.add(id(connection))
+        self.stats.record_checkout(len(self._checked_out), time.perf_counter() - start)
+        return connection
+
+    async def release(self, connection):
+        await super().release(connection)
+        self._checked_out.discard(id(connection))
+        self.stats.in_use = len(self._checked_out)
+
+# -------------------- Connection Factory --------------------
+def _connection_kwargs() -> dict:
+    return {
+        "password": REDIS_PASSWORD,
+        "socket_timeout": REDIS_SOCKET_TIMEOUT,
+        "socket_connect_timeout": REDIS_CONNECT_TIMEOUT,
+        "health_check_interval": REDIS_HEALTH_CHECK_INTERVAL,
+    }
+
+def _retry(retry_class):
+    # Exponential backoff with jitter, so reconnecting clients do not retry in lockstep
+    return retry_class(ExponentialWithJitterBackoff(base=0.05, cap=1.0), REDIS_RETRY_ATTEMPTS)
+
+def _retry_errors() -> list:
+    return [ConnectionError, TimeoutError]
+
+def _pool_kwargs(async_client: bool) -> dict:
+    kwargs = {
+        **_connection_kwargs(),
+        "db": REDIS_DB,
+        "max_connections": REDIS_MAX_CONNECTIONS,
+        "timeout": REDIS_POOL_TIMEOUT,
+        "retry": _retry(AsyncRetry if async_client else Retry),
+        "retry_on_error": _retry_errors(),
+    }
+    if REDIS_UNIX_SOCKET:
+        kwargs["path"] = REDIS_UNIX_SOCKET
+        kwargs["connection_class"] = (
+            redis.asyncio.UnixDomainSocketConnection if async_client else redis.UnixDomainSocketConnection
+        )
+    else:
+        kwargs.update(host=REDIS_HOST, port=REDIS_PORT, socket_keepalive=True)
+    return kwargs
+
+def _sentinel_nodes() -> list:
+    nodes = []
+    for node in REDIS_SENTINELS.split(","):
+        host, _, port = node.strip().partition(":")
+        nodes.append((host, int(port or 26379)))
+    return nodes
+
+def create_redis_client():
+    """Build the process-wide synchronous Redis client according to the configuration above."""
+    if REDIS_CLUSTER:
+        logger.info("Connecting to Redis Cluster via %s:%d", REDIS_HOST, REDIS_PORT)
+        return redis.RedisCluster(
+            host=REDIS_HOST, port=REDIS_PORT, max_connections=REDIS_MAX_CONNECTIONS,
+            retry=_retry(Retry), retry_on_error=_retry_errors(), **_connection_kwargs()
+        )
+    if REDIS_SENTINELS:
+        logger.info("Connecting to Redis master '%s' via Sentinel %s", REDIS_SENTINEL_SERVICE, REDIS_SENTINELS)
+        sentinel = Sentinel(_sentinel_nodes(), socket_timeout=REDIS_SOCKET_TIMEOUT)
+        return sentinel.master_for(
+            REDIS_SENTINEL_SERVICE, db=REDIS_DB, max_connections=REDIS_MAX_CONNECTIONS,
+            retry=_retry(Retry), retry_on_error=_retry_errors(), **_connection_kwargs()
+        )
+    logger.info("Connecting to Redis at %s (DB: %d, pool size: %d)",
+                REDIS_UNIX_SOCKET or f"{REDIS_HOST}:{REDIS_PORT}", REDIS_DB, REDIS_MAX_CONNECTIONS)
+    return redis.Redis(connection_pool=InstrumentedConnectionPool(**_pool_kwargs(async_client=False)))
+
+def create_async_redis_client():
+    """Build the process-wide asyncio Redis client according to the configuration above."""
+    if REDIS_CLUSTER:
+        return redis.asyncio.RedisCluster(
+            host=REDIS_HOST, port=REDIS_PORT, max_connections=REDIS_MAX_CONNECTIONS,
+            retry=_retry(AsyncRetry), retry_on_error=_retry_errors(), **_connection_kwargs()
+        )
+    if REDIS_SENTINELS:
+        sentinel = AsyncSentinel(_sentinel_nodes(), socket_timeout=REDIS_SOCKET_TIMEOUT)
+        return sentinel.master_for(
+            REDIS_SENTINEL_SERVICE, db=REDIS_DB, max_connections=REDIS_MAX_CONNECTIONS,
+            retry=_retry(AsyncRetry), retry_on_error=_retry_errors(), **_connection_kwargs()
+        )
+    return redis.asyncio.Redis(connection_pool=AsyncInstrumentedConnectionPool(**_pool_kwargs(async_client=True)))
+
+def pool_stats(client) -> dict | None:
+    """Pool utilization of a client built by this module, or None when it is not instrumented."""
+    stats = getattr(getattr(client, "connection_pool", None), "stats", None)
+    return asdict(stats) if stats is not None else None
@@ -0,0 +1,267 @@
+import asyncio
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+import logging
+
+# -------------------- Setup Logging --------------------
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# -------------------- Cache Configuration --------------------
+CACHE_TTL_SECONDS = 3600  # How long a cached response stays valid
+CACHE_MAX_ENTRIES = 10_000  # LRU capacity of the in-process backend
+SIMILARITY_THRESHOLD = 0.75  # Minimum cosine similarity for a semantic hit
+VECTOR_DIMENSIONS = 2 ** 12  # Size of the hashing vectorizer output space
+MAX_VECTORS_PER_CONTEXT = 256  # Candidates compared per context bucket
+MAX_VECTORS = 50_000  # Vectors kept by the in-process backend across all buckets
+
+# -------------------- Prompt Normalization --------------------
+def normalize_prompt(text: str) -> str:
+    """Lower-case the prompt and collapse whitespace; punctuation is kept ("2+2" is not "2-2")."""
+    return " ".join(text.lower().split())
+
+def strip_punctuation(prompt: str) -> str:
+    """Drop punctuation too, for comparing the wording of two prompts."""
+    return " ".join(re.sub(r"[^\w\s]", " ", prompt).split())
+
+# Function words ignored when comparing what two prompts are about
+STOPWORDS = frozenset(
+    "a an the i me my you your u we us our it its is are am was were be do does did can could "
+    "will would should shall may might please tell what who how when where which why to of "
+    "for in on at with about and or else exactly just some any".split()
+)
+
+# Trailing and leading punctuation that does not change what a word means
+EDGE_PUNCTUATION = ".,;:!?\"'()[]"
+
+def content_words(prompt: str) -> list:
+    """
+    Sorted set of the non-stopwords in a normalized prompt. Punctuation inside a word is
+    kept, so "2+2" and "2-2" (or "c++" and "c") are different words.
+    """
+    return sorted({word.strip(EDGE_PUNCTUATION) for word in prompt.split()} - STOPWORDS - {""})
+
+def context_hash(messages: list) -> str:
+    """Hash of everything in the prompt except the last (user) message."""
+    digest = hashlib.sha256()
+    for message in messages:
+        digest.update(message.type.encode())
+        digest.update(b"\0")
+        digest.update(str(message.content).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+# -------------------- Hashing Vectorizer --------------------
+def embed(text: str) -> dict:
+    """
+    Offline hashing vectorizer: word unigrams, word bigrams and character trigrams are
+    hashed into VECTOR_DIMENSIONS buckets. Returns a sparse, L2-normalized vector.
+    """
+    words = text.split()
+    features = words + [" ".join(pair) for pair in zip(words, words[1:])]
+    padded = f" {text} "
+    features += [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+    vector: dict = {}
+    for feature in features:
+        bucket = zlib.crc32(feature.encode()) % VECTOR_DIMENSIONS
+        vector[bucket] = vector.get(bucket, 0.0) + 1.0
+    norm = math.sqrt(sum(v * v for v in vector.values())) or 1.0
+    return {k: v / norm for k, v in vector.items()}
+
+def cosine(a: dict, b: dict) -> float:
+    """Cosine similarity of two L2-normalized sparse vectors."""
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(k, 0.0) for k, v in a.items())
+
+# -------------------- Cache Backends --------------------
+class InMemoryCacheBackend:
+    """
+    In-process LRU with per-entry TTL eviction. Context buckets of vectors are LRU too: every
+    turn of every thread starts a new bucket, so the least recently used buckets are dropped
+    once `max_vectors` vectors are kept in all.
+    """
+
+    run_inline = True  # No I/O: async callers use it on the event loop
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, max_vectors: int = MAX_VECTORS):
+        self.max_entries = max_entries
+        self.max_vectors = max_vectors
+        self._entries: OrderedDict = OrderedDict()
+        self._vectors: OrderedDict = OrderedDict()  # Bucket -> OrderedDict of key -> (vector, words)
+        self._vector_count = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: int):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def add_vector(self, bucket: str, key: str, vector: dict, words: list):
+        with self._lock:
+            vectors = self._vectors.setdefault(bucket, OrderedDict())
+            self._vectors.move_to_end(bucket)
+            self._vector_count += key not in vectors
+            vectors[key] = (vector, words)
+            if len(vectors) > MAX_VECTORS_PER_CONTEXT:
+                vectors.popitem(last=False)
+                self._vector_count -= 1
+            while self._vector_count > self.max_vectors:
+                _, evicted = self._vectors.popitem(last=False)
+                self._vector_count -= len(evicted)
+
+    def vectors(self, bucket: str) -> list:
+        with self._lock:
+            vectors = self._vectors.get(bucket)
+            if vectors is None:
+                return []
+            self._vectors.move_to_end(bucket)
+            return [(key, vector, words) for key, (vector, words) in vectors.items()]
+
+class RedisCacheBackend:
+    """Shared cache stored in Redis, so every app replica benefits from each other's misses."""
+
+    run_inline = False  # Blocking client, and a lookup reads a whole bucket: async callers use a thread
+
+    def __init__(self, redis_client, prefix: str = "response_cache"):
+        self.redis = redis_client
+        self.prefix = prefix
+
+    def get(self, key: str):
+        value = self.redis.get(f"{self.prefix}:{key}")
+        return value.decode() if value is not None else None
+
+    def set(self, key: str, value: str, ttl: int):
+        self.redis.set(f"{self.prefix}:{key}", value, ex=ttl)
+
+    def add_vector(self, bucket: str, key: str, vector: dict, words: list):
+        bucket_key = f"{self.prefix}:vectors:{bucket}"
+        pipe = self.redis.pipeline()
+        pipe.lpush(bucket_key, json.dumps([key, vector, words]))
+        pipe.ltrim(bucket_key, 0, MAX_VECTORS_PER_CONTEXT - 1)
+        pipe.expire(bucket_key, CACHE_TTL_SECONDS)
+        pipe.execute()
+
+    def vectors(self, bucket: str) -> list:
+        items = self.redis.lrange(f"{self.prefix}:vectors:{bucket}", 0, -1)
+        return [
+            (key, {int(k): v for k, v in vector.items()}, words)
+            for key, vector, words in map(json.loads, items)
+        ]
+
+# -------------------- Response Cache --------------------
+@dataclass
+class CacheStats:
+    exact_hits: int = 0
+    semantic_hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.exact_hits + self.semantic_hits + self.misses
+        return (self.exact_hits + self.semantic_hits) / total if total else 0.0
+
+class ResponseCache:
+    """
+    Two-tier response cache in front of the LLM.
+    The exact tier is keyed by the normalized prompt plus a hash of the preceding context.
+    The semantic tier compares hashing-vectorizer embeddings of prompts that share the same
+    context, so rephrasings ("how do I reset my password" / "how can I reset my password")
+    also hit. Lexical similarity cannot tell "reset my password" from "reset my username",
+    so a semantic hit additionally requires both prompts to have the same content words.
+    """
+
+    def __init__(self, backend, ttl: int = CACHE_TTL_SECONDS, threshold: float = SIMILARITY_THRESHOLD):
+        self.backend = backend
+        self.ttl = ttl
+        self.threshold = threshold
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+
+    def _keys(self, messages: list):
+        prompt = normalize_prompt(str(messages[-1].content))
+        bucket = context_hash(messages[:-1])
+        key = hashlib.sha256(f"{bucket}:{prompt}".encode()).hexdigest()
+        return prompt, bucket, key
+
+    def _count(self, field: str):
+        with self._lock:
+            setattr(self.stats, field, getattr(self.stats, field) + 1)
+
+    def lookup(self, messages: list):
+        """Return the cached response text for this prompt, or None on a miss."""
+        prompt, bucket, key = self._keys(messages)
+        value = self.backend.get(key)
+        if value is not None:
+            self._count("exact_hits")
+            return value
+
+        vector, words = embed(strip_punctuation(prompt)), content_words(prompt)
+        best_key, best_score = None, self.threshold
+        for candidate_key, candidate, candidate_words in self.backend.vectors(bucket):
+            if candidate_words != words:
+                continue
+            score = cosine(vector, candidate)
+            if score >= best_score:
+                best_key, best_score = candidate_key, score
+        if best_key is not None:
+            value = self.backend.get(best_key)
+            if value is not None:
+                self._count("semantic_hits")
+                logger.info("Semantic cache hit (similarity %.3f).", best_score)
+                return value
+
+        self._count("misses")
+        return None
+
+    def store(self, messages: list, response: str):
+        """Cache the LLM response for this prompt in both tiers."""
+        prompt, bucket, key = self._keys(messages)
+        self.backend.set(key, response, self.ttl)
+        self.backend.add_vector(bucket, key, embed(strip_punctuation(prompt)), content_words(prompt))
+
+    async def alookup(self, messages: list):
+        """lookup() for the event loop: off it when the backend blocks."""
+        if self.backend.run_inline:
+            return self.lookup(messages)
+        return await asyncio.to_thread(self.lookup, messages)
+
+    async def astore(self, messages: list, response: str):
+        if self.backend.run_inline:
+            self.store(messages, response)
+        else:
+            await asyncio.to_thread(self.store, messages, response)
+
+def create_response_cache(backend: str = "memory"):
+    """
+    Build the response cache for the given backend name: 'memory', 'redis' or 'off'.
+    The Redis backend reuses the client created in redis_checkpoint.py.
+    """
+    if backend == "off":
+        return None
+    if backend == "redis":
+        from redis_checkpoint import get_redis_client
+        return ResponseCache(RedisCacheBackend(get_redis_client()))
+    return ResponseCache(InMemoryCacheBackend())
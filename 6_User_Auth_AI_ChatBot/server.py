@@ -0,0 +1,254 @@
+"""
+Headless HTTP entry point for the chat agent.
+
+    POST /chat          {"thread_id": "...", "message": "..."}  -> {"thread_id": "...", "response": "..."}
+    POST /chat/stream   same body -> server-sent events: one `token` event per LLM token, then `done`
+                        (both answer 429 with Retry-After once the client's rate limit is used up,
+                        and 409 when another turn of the thread is still running after THREAD_LOCK_WAIT)
+                        A duplicate of a turn still in flight (same thread and message, no reply
+                        in between) gets the original's response instead of running the graph
+                        again; so does any submission repeating an Idempotency-Key header sent
+                        less than IDEMPOTENCY_TTL seconds after the original was answered.
+                        Retrying a turn that failed does not add its message to the thread twice.
+    GET  /health
+    GET  /metrics       Prometheus text format: node, LLM and checkpointer latency, tokens, payload sizes
+
+Every request in a worker process shares the same compiled graph (async_chat_agent) and the
+same checkpointer connections (the Redis pool, or the SQLite file). Run with `python server.py`, or with FAKE_LLM=1 to load-test offline.
+To run several worker processes with each thread's turns kept on one of them, use front_router.py.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from contextlib import AsyncExitStack, asynccontextmanager
+from os import getenv
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from langchain_core.messages import HumanMessage
+from pydantic import BaseModel
+
+from agent import (acheck_rate_limit, adrop_unanswered_input, checkpoint_backend, get_async_chat_agent,
+                   get_idempotency_store, get_thread_locks, llm_resilience, llm_scheduler, model_router)
+from idempotency import TurnClaim, TurnInProgressError, turn_key
+from instrumentation import TURN_DURATION, registry
+from thread_lock import ThreadBusyError
+
+# -------------------- Setup Logging --------------------
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# -------------------- Server Configuration --------------------
+SERVER_HOST = getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(getenv("SERVER_PORT", 8000))
+SERVER_WORKERS = int(getenv("SERVER_WORKERS", 1))  # Worker processes, each with its own event loop
+MAX_CONCURRENT_REQUESTS = int(getenv("MAX_CONCURRENT_REQUESTS", 64))  # Graph runs in flight per worker
+MAX_QUEUED_REQUESTS = int(getenv("MAX_QUEUED_REQUESTS", 256))  # Requests waiting for a slot before 503
+logger.info("Server config: workers=%d, max concurrent=%d, max queued=%d",
+            SERVER_WORKERS, MAX_CONCURRENT_REQUESTS, MAX_QUEUED_REQUESTS)
+
+# -------------------- Concurrency Limiter --------------------
+class ConcurrencyLimiter:
+    """Caps in-flight graph runs and rejects requests once too many are waiting for a slot."""
+
+    def __init__(self, limit: int, max_queued: int):
+        self._semaphore = asyncio.Semaphore(limit)
+        self.max_queued = max_queued
+        self.in_flight = 0
+        self.queued = 0
+
+    async def acquire(self):
+        if self.queued >= self.max_queued:
+            raise HTTPException(status_code=503, detail="Server is busy, retry later.")
+        self.queued += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+        self.in_flight += 1
+
+    def release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+limiter = ConcurrencyLimiter(MAX_CONCURRENT_REQUESTS, MAX_QUEUED_REQUESTS)
+
+# -------------------- Request / Response Models --------------------
+class ChatRequest(BaseModel):
+    message: str
+    thread_id: str | None = None  # A new thread is started when omitted
+
+class ChatResponse(BaseModel):
+    thread_id: str
+    response: str
+
+def agent_input(request: ChatRequest):
+    thread_id = request.thread_id or str(uuid.uuid4())
+    config = {"configurable": {"thread_id": thread_id}}
+    return thread_id, {"messages": [HumanMessage(content=request.message)]}, config
+
+async def enforce_rate_limit(request: ChatRequest, http_request: Request):
+    """
+    Reject the request with 429 once the client's per-minute/day allowance is used up.
+    API clients are anonymous and limited per address. The Redis check runs in a thread: a
+    healthy Redis answers in under a millisecond, but an unreachable one would hold the event
+    loop for its connect timeout and retries before the limiter falls back to process memory.
+    """
+    client = http_request.client.host if http_request.client else "unknown"
+    decision = await acheck_rate_limit(f"anonymous:{client}", request.message)
+    if decision is not None and not decision.allowed:
+        raise HTTPException(status_code=429, detail=f"Rate limit exceeded ({decision.limit}).",
+                            headers={"Retry-After": str(max(1, round(decision.retry_after)))})
+
+@asynccontextmanager
+async def thread_turn(thread_id: str):
+    """Run the block as the only turn of the thread, across worker processes (see thread_lock.py)."""
+    thread_locks = get_thread_locks()
+    if thread_locks is None:
+        yield
+        return
+    try:
+        async with thread_locks.hold(thread_id):
+            yield
+    except ThreadBusyError:
+        raise HTTPException(status_code=409, detail="Another turn of this thread is in progress, retry later.")
+
+@asynccontextmanager
+async def idempotent_turn(request: ChatRequest, http_request: Request, thread_id: str, config: dict):
+    """
+    Claim the submission's turn (see idempotency.py), identified by the Idempotency-Key header
+    when the client sends one. For a duplicate, claim.duplicate is set and claim.response is
+    the original's; otherwise the block runs the turn and sets it.
+    """
+    store = get_idempotency_store()
+    if store is None or request.thread_id is None:
+        # A new thread has no earlier submission to repeat
+        yield TurnClaim(thread_id)
+        return
+    state = await get_async_chat_agent().aget_state(config)
+    try:
+        key = turn_key(thread_id, state.values.get("messages", []), request.message,
+                       http_request.headers.get("idempotency-key"))
+        async with store.aturn(key) as claim:
+            yield claim
+    except TurnInProgressError:
+        raise HTTPException(status_code=409, detail="This message is still being answered, retry later.")
+
+async def retry_cleanup(request: ChatRequest, config: dict):
+    """
+    Drop the user message a failed run of this submission left unanswered, so its retry does
+    not add it twice. Called with the turn claimed and the thread locked: nothing else runs it.
+    """
+    if get_idempotency_store() is not None and request.thread_id is not None:
+        await adrop_unanswered_input(config, request.message)
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+class TurnStreamingResponse(StreamingResponse):
+    """
+    Holds the turn's concurrency slot, thread lock and idempotency claim (`turn`) until the
+    response is over, however it ended: streamed out, the client gone mid-stream or before the
+    body was read. A turn left without a response is released to its duplicates.
+    """
+
+    def __init__(self, content, turn: AsyncExitStack, **kwargs):
+        super().__init__(content, **kwargs)
+        self.turn = turn
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.turn.aclose()
+
+# -------------------- ASGI Application --------------------
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the graph and bind the async checkpointer to this worker's event loop before serving,
+    # so the first request does not pay for it
+    get_async_chat_agent()
+    await checkpoint_backend.setup_async_checkpoint_saver()
+    yield
+
+app = FastAPI(title="AI Chatbot API", lifespan=lifespan)
+
+@app.get("/health")
+async def health():
+    thread_locks, idempotency = get_thread_locks(), get_idempotency_store()
+    return {
+        "status": "ok",
+        "pid": os.getpid(),
+        "in_flight": limiter.in_flight,
+        "queued": limiter.queued,
+        "redis_pools": checkpoint_backend.redis_pool_stats(),
+        "checkpoint_cache": checkpoint_backend.checkpoint_cache_stats(),
+        "llm_scheduler": llm_scheduler.stats(),
+        "router": model_router.stats(),
+        "llm_resilience": llm_resilience.stats(),
+        "thread_locks": thread_locks.stats() if thread_locks is not None else None,
+        "idempotency": idempotency.stats() if idempotency is not None else None,
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat(request: ChatRequest, http_request: Request):
+    await enforce_rate_limit(request, http_request)
+    thread_id, inputs, config = agent_input(request)
+    async with idempotent_turn(request, http_request, thread_id, config) as claim:
+        if not claim.duplicate:
+            # The thread's lock is taken before a concurrency slot, so waiting for it does not hold a slot
+            async with thread_turn(thread_id):
+                await retry_cleanup(request, config)
+                await limiter.acquire()
+                try:
+                    result = await get_async_chat_agent().ainvoke(inputs, config=config)
+                finally:
+                    limiter.release()
+            claim.response = result["messages"][-1].content
+    return ChatResponse(thread_id=thread_id, response=claim.response)
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest, http_request: Request):
+    await enforce_rate_limit(request, http_request)
+    thread_id, inputs, config = agent_input(request)
+    async with AsyncExitStack() as stack:
+        claim = await stack.enter_async_context(idempotent_turn(request, http_request, thread_id, config))
+        if not claim.duplicate:
+            await stack.enter_async_context(thread_turn(thread_id))
+            await retry_cleanup(request, config)
+            await limiter.acquire()
+            stack.callback(limiter.release)
+        # Held until the response is over, see TurnStreamingResponse
+        turn = stack.pop_all()
+
+    async def events():
+        tokens = []
+        start = time.perf_counter()
+        if claim.duplicate:
+            # The original's response, in one piece
+            yield sse_event("token", {"token": claim.response})
+        else:
+            async for chunk, metadata in get_async_chat_agent().astream(inputs, config=config,
+                                                                         stream_mode="messages"):
+                if metadata.get("langgraph_node") != "chatbot" or not chunk.content:
+                    continue
+                if not tokens:
+                    TURN_DURATION.observe(time.perf_counter() - start, stage="ttft")
+                tokens.append(chunk.content)
+                yield sse_event("token", {"token": chunk.content})
+            claim.response = "".join(tokens)
+            TURN_DURATION.observe(time.perf_counter() - start, stage="total")
+        yield sse_event("done", {"thread_id": thread_id, "response": claim.response})
+
+    return TurnStreamingResponse(events(), turn, media_type="text/event-stream", headers={"X-Thread-Id": thread_id})
+
+if __name__ == "__main__":
+    uvicorn.run("server:app", host=SERVER_HOST, port=SERVER_PORT, workers=SERVER_WORKERS)
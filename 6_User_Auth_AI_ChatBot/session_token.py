@@ -0,0 +1,55 @@
+import base64
+import hashlib
+import hmac
+import json
+import secrets
+import time
+import logging
+from os import getenv
+
+# -------------------- Setup Logging --------------------
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# -------------------- Session Token Configuration --------------------
+SESSION_TOKEN_TTL = int(getenv("SESSION_TOKEN_TTL", 8 * 3600))  # Seconds a login stays valid
+# Signing key shared by every replica. Without it a random key is generated, so tokens are
+# only valid in the process that issued them and all sessions end when it restarts.
+SESSION_SECRET = getenv("SESSION_SECRET")
+
+# -------------------- Signed Session Tokens --------------------
+class SessionTokens:
+    """
+    Stateless session tokens: `payload.signature`, where the payload holds the username and
+    the expiry, and the signature is an HMAC-SHA256 of it. Checking one costs a few
+    microseconds, against tens of milliseconds for a password check, so the password is
+    verified once per login and every later rerun only checks the token.
+    """
+
+    def __init__(self, secret: str | None = SESSION_SECRET, ttl: int = SESSION_TOKEN_TTL):
+        if not secret:
+            logger.warning("SESSION_SECRET is not set: session tokens will not survive a restart.")
+            secret = secrets.token_hex(32)
+        self._key = secret.encode()
+        self.ttl = ttl
+
+    def _sign(self, payload: bytes) -> str:
+        return base64.urlsafe_b64encode(hmac.new(self._key, payload, hashlib.sha256).digest()).decode().rstrip("=")
+
+    def issue(self, username: str) -> str:
+        payload = base64.urlsafe_b64encode(
+            json.dumps({"sub": username, "exp": int(time.time()) + self.ttl}).encode()
+        ).rstrip(b"=")
+        return f"{payload.decode()}.{self._sign(payload)}"
+
+    def verify(self, token: str | None) -> str | None:
+        """Return the username of a valid, unexpired token, or None."""
+        if not token or token.count(".") != 1:
+            return None
+        payload, signature = token.split(".")
+        if not hmac.compare_digest(signature, self._sign(payload.encode())):
+            return None
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        if claims["exp"] < time.time():
+            return None
+        return claims["sub"]
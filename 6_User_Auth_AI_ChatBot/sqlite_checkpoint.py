@@ -0,0 +1,363 @@
+import asyncio
+import sqlite3
+import threading
+import time
+import logging
+from functools import cache
+from os import getenv
+
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+from checkpoint_compaction import with_compaction
+from compact_serializer import compact_serializer
+from instrumentation import instrument_saver
+from thread_index import SQLiteThreadIndex
+from tiered_checkpoint import TieredCheckpointSaver, with_hot_cache
+
+# -------------------- Setup Logging --------------------
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# -------------------- SQLite Checkpoint Configuration --------------------
+# Embedded, durable checkpointer for single-node deployments: no server, no network hop per turn
+SQLITE_CHECKPOINT_PATH = getenv("SQLITE_CHECKPOINT_PATH", "checkpoints.db")
+SQLITE_CHECKPOINT_TTL = int(getenv("SQLITE_CHECKPOINT_TTL", 300))  # Seconds a thread lives after its last write, 0 = forever
+SQLITE_SWEEP_INTERVAL = float(getenv("SQLITE_SWEEP_INTERVAL", 60))  # Seconds between sweeps of expired threads
+SQLITE_MMAP_SIZE = int(getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))  # Bytes of the file read through mmap
+# NORMAL: a commit survives a crash of the app; the last ones may be lost on power loss. FULL syncs every commit.
+SQLITE_SYNCHRONOUS = getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_SWEEP_BATCH = 500  # Expired threads deleted per transaction
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT NOT NULL,
+    checkpoint BLOB NOT NULL,
+    metadata_type TEXT NOT NULL,
+    metadata BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    task_path TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT NOT NULL,
+    value BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id TEXT PRIMARY KEY,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS threads_by_expiry ON threads (expires_at);
+"""
+
+# -------------------- SQLite Saver --------------------
+class SQLiteSaver(BaseCheckpointSaver):
+    """
+    Checkpoints in a local SQLite file, keyed by (thread_id, checkpoint_ns, checkpoint_id).
+
+    The database runs in WAL mode with one connection per thread, so readers never block
+    the writer or each other, and reads go through a memory-mapped view of the file. The
+    latest checkpoint of a thread is one descending seek on the primary key.
+
+    Every put pushes the thread's expiry `ttl` seconds ahead; sweep_expired() deletes the
+    threads past it, in small transactions, like the TTL of the Redis and MongoDB savers
+    (start_sweeper() runs it periodically). Expired threads stay readable until swept.
+
+    The async methods run the sync ones on worker threads: each statement takes tens of
+    microseconds and needs no server round trip, so a native async driver gains nothing.
+    """
+
+    def __init__(self, path: str = SQLITE_CHECKPOINT_PATH, ttl: int = SQLITE_CHECKPOINT_TTL,
+                 mmap_size: int = SQLITE_MMAP_SIZE, synchronous: str = SQLITE_SYNCHRONOUS, serde=None):
+        super().__init__(serde=serde)
+        self.path = path
+        self.ttl = ttl
+        self.mmap_size = mmap_size
+        self.synchronous = synchronous
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._sweeper = None
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(f"PRAGMA synchronous={self.synchronous}")
+            connection.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def close(self):
+        """Stop the sweeper and close the connections of every thread."""
+        if self._sweeper is not None:
+            self._sweeper.set()
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+        self._local = threading.local()
+
+    # ---- Reads ----
+    def _to_tuple(self, connection: sqlite3.Connection, row: tuple) -> CheckpointTuple:
+        thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type_, checkpoint, metadata_type, metadata = row
+        writes = connection.execute(
+            "SELECT task_id, channel, type, value FROM writes"
+            " WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        config_values = {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}
+        parent_config = None
+        if parent_checkpoint_id:
+            parent_config = {"configurable": {**config_values, "checkpoint_id": parent_checkpoint_id}}
+        return CheckpointTuple(
+            {"configurable": config_values},
+            self.serde.loads_typed((type_, checkpoint)),
+            self.serde.loads_typed((metadata_type, metadata)),
+            parent_config,
+            [(task_id, channel, self.serde.loads_typed((value_type, value)))
+             for task_id, channel, value_type, value in writes],
+        )
+
+    def get_tuple(self, config):
+        connection = self._connection()
+        query = "SELECT * FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+        params = [config["configurable"]["thread_id"], config["configurable"].get("checkpoint_ns", "")]
+        if checkpoint_id := get_checkpoint_id(config):
+            query += " AND checkpoint_id = ?"
+            params.append(checkpoint_id)
+        else:
+            query += " ORDER BY checkpoint_id DESC LIMIT 1"
+        row = connection.execute(query, params).fetchone()
+        return self._to_tuple(connection, row) if row else None
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        connection = self._connection()
+        clauses, params = [], []
+        if config is not None:
+            for key in ("thread_id", "checkpoint_ns"):
+                if key in config["configurable"]:
+                    clauses.append(f"{key} = ?")
+                    params.append(config["configurable"][key])
+        if before is not None:
+            clauses.append("checkpoint_id < ?")
+            params.append(before["configurable"]["checkpoint_id"])
+        query = "SELECT * FROM checkpoints"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY checkpoint_id DESC"
+        if limit and not filter:
+            query += f" LIMIT {int(limit)}"
+        returned = 0
+        for row in connection.execute(query, params).fetchall():
+            checkpoint_tuple = self._to_tuple(connection, row)
+            # Metadata is serialized, so filters are applied after loading it
+            if filter and any(checkpoint_tuple.metadata.get(key) != value for key, value in filter.items()):
+                continue
+            yield checkpoint_tuple
+            returned += 1
+            if limit and returned >= limit:
+                return
+
+    def latest_checkpoint_id(self, thread_id: str, checkpoint_ns: str = "") -> str | None:
+        """Id of the latest checkpoint of the namespace, read from the primary key alone."""
+        row = self._connection().execute(
+            "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+            " ORDER BY checkpoint_id DESC LIMIT 1",
+            (thread_id, checkpoint_ns),
+        ).fetchone()
+        return row[0] if row else None
+
+    # ---- Writes ----
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        type_, serialized_checkpoint = self.serde.dumps_typed(checkpoint)
+        metadata_type, serialized_metadata = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                 type_, serialized_checkpoint, metadata_type, serialized_metadata),
+            )
+            if self.ttl:
+                connection.execute(
+                    "INSERT INTO threads VALUES (?, ?)"
+                    " ON CONFLICT(thread_id) DO UPDATE SET expires_at = excluded.expires_at",
+                    (thread_id, time.time() + self.ttl),
+                )
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        # Writes may only overwrite existing ones when they are all special (e.g. error) channels
+        verb = "INSERT OR REPLACE" if all(w[0] in WRITES_IDX_MAP for w in writes) else "INSERT OR IGNORE"
+        configurable = config["configurable"]
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, serialized_value = self.serde.dumps_typed(value)
+            rows.append((configurable["thread_id"], configurable["checkpoint_ns"], configurable["checkpoint_id"],
+                         task_id, WRITES_IDX_MAP.get(channel, idx), task_path, channel, type_, serialized_value))
+        if rows:
+            with self._connection() as connection:
+                connection.executemany(f"{verb} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def _delete_threads(self, connection: sqlite3.Connection, thread_ids: list):
+        marks = ",".join("?" * len(thread_ids))
+        for table in ("checkpoints", "writes", "threads"):
+            connection.execute(f"DELETE FROM {table} WHERE thread_id IN ({marks})", thread_ids)
+
+    def delete_thread(self, thread_id: str):
+        with self._connection() as connection:
+            self._delete_threads(connection, [thread_id])
+
+    def prune(self, thread_ids, *, strategy: str = "keep_latest", keep_last: int | None = None):
+        """Keep the latest `keep_last` checkpoints (and their writes) of every namespace of the given threads."""
+        if keep_last is None:
+            keep_last = 0 if strategy == "delete" else 1
+        with self._connection() as connection:
+            for thread_id in thread_ids:
+                namespaces = connection.execute(
+                    "SELECT DISTINCT checkpoint_ns FROM checkpoints WHERE thread_id = ?", (thread_id,)).fetchall()
+                for (checkpoint_ns,) in namespaces:
+                    query, params = "thread_id = ? AND checkpoint_ns = ?", [thread_id, checkpoint_ns]
+                    if keep_last:
+                        retained = connection.execute(
+                            "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+                            " ORDER BY checkpoint_id DESC LIMIT 1 OFFSET ?",
+                            (thread_id, checkpoint_ns, keep_last - 1),
+                        ).fetchone()
+                        if retained is None:
+                            continue
+                        query += " AND checkpoint_id < ?"
+                        params.append(retained[0])
+                    connection.execute(f"DELETE FROM checkpoints WHERE {query}", params)
+                    connection.execute(f"DELETE FROM writes WHERE {query}", params)
+
+    # ---- TTL ----
+    def sweep_expired(self, batch: int = SQLITE_SWEEP_BATCH) -> int:
+        """Delete every thread whose TTL has passed; returns the number of threads deleted."""
+        connection, deleted = self._connection(), 0
+        while True:
+            with connection:
+                thread_ids = [row[0] for row in connection.execute(
+                    "SELECT thread_id FROM threads WHERE expires_at < ? LIMIT ?", (time.time(), batch))]
+                if thread_ids:
+                    self._delete_threads(connection, thread_ids)
+            deleted += len(thread_ids)
+            if len(thread_ids) < batch:
+                return deleted
+
+    def start_sweeper(self, interval: float = SQLITE_SWEEP_INTERVAL):
+        """Sweep expired threads every `interval` seconds from a daemon thread (once per saver)."""
+        if self._sweeper is not None or not self.ttl:
+            return
+        self._sweeper = stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                try:
+                    if count := self.sweep_expired():
+                        logger.info("Swept %d expired threads from %s.", count, self.path)
+                except sqlite3.Error:
+                    logger.exception("Sweeping expired threads failed.")
+
+        threading.Thread(target=run, name="sqlite-checkpoint-sweeper", daemon=True).start()
+
+    # ---- Async ----
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        for checkpoint_tuple in await asyncio.to_thread(
+                lambda: list(self.list(config, filter=filter, before=before, limit=limit))):
+            yield checkpoint_tuple
+
+    async def alatest_checkpoint_id(self, thread_id: str, checkpoint_ns: str = "") -> str | None:
+        return await asyncio.to_thread(self.latest_checkpoint_id, thread_id, checkpoint_ns)
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str):
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    async def aprune(self, thread_ids, *, strategy: str = "keep_latest", keep_last: int | None = None):
+        await asyncio.to_thread(self.prune, thread_ids, strategy=strategy, keep_last=keep_last)
+
+# -------------------- Initialize SQLite Savers --------------------
+# Same getters as redis_checkpoint.py, so the agent can use either module as its checkpoint backend
+@cache
+def get_sqlite_saver() -> SQLiteSaver:
+    """The SQLiteSaver itself, without wrappers; sweeps expired threads in the background."""
+    sqlite_saver = SQLiteSaver(serde=compact_serializer())  # Opt in with CHECKPOINT_SERIALIZER=compact
+    sqlite_saver.start_sweeper()
+    logger.info("SQLite checkpoint saver on %s (TTL %ss).", sqlite_saver.path, sqlite_saver.ttl or "off")
+    return sqlite_saver
+
+@cache
+def get_checkpoint_saver() -> BaseCheckpointSaver:
+    """The checkpointer of the sync graph."""
+    sqlite_saver = get_sqlite_saver()
+    # Compaction, hot cache and metrics as for the other backends
+    return instrument_saver(
+        with_hot_cache(with_compaction(sqlite_saver), "sqlite", probe=sqlite_saver.latest_checkpoint_id),
+        "sqlite",
+    )
+
+@cache
+def get_async_checkpoint_saver() -> BaseCheckpointSaver:
+    """The checkpointer of the async graph, on the same file."""
+    sqlite_saver = get_sqlite_saver()
+    return instrument_saver(
+        with_hot_cache(with_compaction(sqlite_saver), "sqlite", aprobe=sqlite_saver.alatest_checkpoint_id),
+        "sqlite",
+    )
+
+@cache
+def get_thread_index() -> SQLiteThreadIndex:
+    """Per-user list of threads, in the same file; threads drop out with their checkpoints' TTL."""
+    return SQLiteThreadIndex(get_sqlite_saver().path, max_age=SQLITE_CHECKPOINT_TTL or None)
+
+async def setup_async_checkpoint_saver():
+    """Nothing to set up: the schema is created with the saver. Kept for parity with redis_checkpoint."""
+    get_async_checkpoint_saver()
+
+def checkpoint_cache_stats() -> dict:
+    """Hit ratio and size of the sync and async hot caches (empty when CHECKPOINT_CACHE_SIZE=0)."""
+    return {
+        name: saver.saver.stats()
+        for name, saver in (("sync", get_checkpoint_saver()), ("async", get_async_checkpoint_saver()))
+        if isinstance(saver.saver, TieredCheckpointSaver)
+    }
+
+def redis_pool_stats() -> None:
+    """No Redis connection pools: checkpoints are in a local file."""
+    return None
@@ -0,0 +1,169 @@
+"""
+Duplicate submissions of a chat turn through server.py, with the fake LLM, SQLite checkpoints
+and the in-process idempotency store. Run with `python -m pytest test_idempotency.py`.
+"""
+import asyncio
+import os
+import tempfile
+import uuid
+
+os.environ.update({
+    "FAKE_LLM": "1",
+    "FAKE_LLM_LATENCY": "0.2",
+    "CHECKPOINT_BACKEND": "sqlite",
+    "SQLITE_CHECKPOINT_PATH": os.path.join(tempfile.mkdtemp(), "checkpoints.db"),
+    "IDEMPOTENCY_BACKEND": "memory",
+    "THREAD_LOCK_BACKEND": "memory",
+    "RATE_LIMIT_BACKEND": "off",
+    "RESPONSE_CACHE_BACKEND": "off",  # Would answer repeated prompts without the LLM
+    "LLM_COALESCE": "false",  # Would share the LLM call of concurrent duplicates
+})
+
+import httpx
+import pytest
+
+import agent
+import server
+from fake_llm import FakeChatModel
+from idempotency import InMemoryIdempotencyStore, RedisIdempotencyStore, turn_key
+
+@pytest.fixture(scope="module")
+def run():
+    # One event loop for the module: the async checkpointer is bound to the loop it was set up on
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(agent.checkpoint_backend.setup_async_checkpoint_saver())
+    yield loop.run_until_complete
+    loop.close()
+
+@pytest.fixture
+def llm_calls(monkeypatch):
+    """Number the fake LLM's calls; every call replies "reply <n>"."""
+    calls = [0]
+    for name in ("_agenerate", "_astream"):
+        method = getattr(FakeChatModel, name)
+
+        def counted(self, *args, _method=method, **kwargs):
+            calls[0] += 1
+            return _method(self, *args, **kwargs)
+
+        monkeypatch.setattr(FakeChatModel, name, counted)
+    monkeypatch.setattr(FakeChatModel, "_text", lambda self: f"reply {calls[0]}")
+    return calls
+
+async def chat(message: str, thread_id: str, path: str = "/chat", headers: dict | None = None) -> str:
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=30) as client:
+        response = await client.post(path, json={"message": message, "thread_id": thread_id}, headers=headers)
+    response.raise_for_status()
+    if path == "/chat":
+        return response.json()["response"]
+    return response.text
+
+async def user_messages(thread_id: str) -> list:
+    state = await agent.get_async_chat_agent().aget_state({"configurable": {"thread_id": thread_id}})
+    return [message.content for message in state.values["messages"] if message.type == "human"]
+
+def new_thread(run) -> str:
+    thread_id = f"test:{uuid.uuid4()}"
+    run(chat("hello", thread_id))
+    return thread_id
+
+def test_concurrent_duplicates_run_the_graph_once(run, llm_calls):
+    thread_id = new_thread(run)
+    calls = llm_calls[0]
+
+    async def submit_twice():
+        return await asyncio.gather(chat("continue", thread_id), chat("continue", thread_id))
+
+    first, duplicate = run(submit_twice())
+    assert run(user_messages(thread_id)) == ["hello", "continue"]
+    assert llm_calls[0] - calls == 1
+    assert duplicate == first
+
+def test_duplicate_stream_gets_the_original_reply(run, llm_calls):
+    thread_id = new_thread(run)
+
+    async def submit_twice():
+        original = asyncio.create_task(chat("continue", thread_id))
+        await asyncio.sleep(0.05)  # The original's user message is checkpointed, its reply is not
+        return await asyncio.gather(original, chat("continue", thread_id, path="/chat/stream"))
+
+    first, stream = run(submit_twice())
+    assert run(user_messages(thread_id)) == ["hello", "continue"]
+    assert f'"response": "{first}"' in stream
+
+def test_repeated_prompt_after_the_reply_is_a_new_turn(run, llm_calls):
+    thread_id = new_thread(run)
+    first = run(chat("continue", thread_id))
+    second = run(chat("continue", thread_id))
+    assert run(user_messages(thread_id)) == ["hello", "continue", "continue"]
+    assert second != first
+
+def test_idempotency_key_replays_the_answered_turn(run, llm_calls):
+    thread_id = new_thread(run)
+    headers = {"Idempotency-Key": str(uuid.uuid4())}
+    first = run(chat("continue", thread_id, headers=headers))
+    calls = llm_calls[0]
+    assert run(chat("continue", thread_id, headers=headers)) == first
+    assert llm_calls[0] == calls
+    assert run(user_messages(thread_id)) == ["hello", "continue"]
+
+def test_retry_of_a_failed_turn_replaces_its_input(run, llm_calls, monkeypatch):
+    thread_id = new_thread(run)
+
+    def down(self, *args, **kwargs):
+        raise ValueError("LLM down")
+
+    with monkeypatch.context() as outage:
+        outage.setattr(FakeChatModel, "_agenerate", down)
+        outage.setattr(FakeChatModel, "_astream", down)
+        with pytest.raises(ValueError):
+            run(chat("continue", thread_id))
+    assert run(user_messages(thread_id)) == ["hello", "continue"]  # Checkpointed before the LLM failed
+
+    reply = run(chat("continue", thread_id, path="/chat/stream"))
+    assert run(user_messages(thread_id)) == ["hello", "continue"]
+    assert '"response": "reply' in reply
+
+# -------------------- Stores --------------------
+def stores() -> list:
+    """Two handles on the same store, as two server processes would have."""
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    return [RedisIdempotencyStore(fakeredis.FakeRedis(server=server), ttl=5, wait=2) for _ in range(2)]
+
+@pytest.mark.parametrize("backend", ["memory", "redis"])
+def test_stores_attach_duplicates_and_take_over_failed_turns(backend):
+    first, second = stores() if backend == "redis" else [InMemoryIdempotencyStore(ttl=5, wait=2)] * 2
+    runs = []
+
+    async def submit(store, name: str, key: str, fails: bool = False, after: float = 0):
+        await asyncio.sleep(after)  # Claims race in worker threads: the original goes first
+        async with store.aturn(key) as claim:
+            if not claim.duplicate:
+                runs.append(name)
+                await asyncio.sleep(0.2)
+                if fails:
+                    raise RuntimeError("LLM down")
+                claim.response = f"reply by {name}"
+        return claim.response
+
+    async def scenario():
+        replies = await asyncio.gather(submit(first, "a", "t:1:x"), submit(second, "b", "t:1:x", after=0.05))
+        failed, retried = await asyncio.gather(submit(first, "c", "t:2:x", fails=True),
+                                               submit(second, "d", "t:2:x", after=0.05), return_exceptions=True)
+        return replies, failed, retried
+
+    replies, failed, retried = asyncio.run(scenario())
+    assert replies == ["reply by a", "reply by a"]
+    assert isinstance(failed, RuntimeError) and retried == "reply by d"
+    assert runs == ["a", "c", "d"]
+
+def test_turn_key_counts_answered_turns_only():
+    from langchain_core.messages import AIMessage, HumanMessage
+
+    answered = [HumanMessage("hello"), AIMessage("hi"), HumanMessage("continue"), AIMessage("...")]
+    in_flight = answered[:3]
+    assert turn_key("t", in_flight, "continue") == turn_key("t", answered[:2], "continue")
+    assert turn_key("t", answered, "continue") != turn_key("t", in_flight, "continue")
+    assert turn_key("t", answered, "continue", "key-1") == turn_key("t", in_flight, "continue", "key-1")
@@ -0,0 +1,158 @@
+import sqlite3
+import threading
+import time
+import logging
+from dataclasses import dataclass
+from os import getenv
+
+# -------------------- Setup Logging --------------------
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# -------------------- Thread Index Configuration --------------------
+THREAD_INDEX_MAX_THREADS = int(getenv("THREAD_INDEX_MAX_THREADS", 50))  # Most recent threads kept per user
+THREAD_TITLE_LENGTH = 60  # Characters of the first prompt used as the thread title
+
+@dataclass
+class ThreadSummary:
+    thread_id: str
+    title: str
+    last_active: float  # Unix timestamp of the last turn
+
+def thread_title(prompt: str) -> str:
+    title = " ".join(prompt.split())
+    return title if len(title) <= THREAD_TITLE_LENGTH else title[:THREAD_TITLE_LENGTH - 1] + "…"
+
+# -------------------- Per-User Thread Index --------------------
+class ThreadIndex:
+    """
+    Conversations of every user, most recently active first, so a user can resume a thread
+    after logging in again.
+
+    Per user, a sorted set maps thread ids to their last-activity timestamp and a hash maps
+    them to their title. Listing reads only that user's keys (ZREVRANGE + HMGET), never the
+    checkpoint keys. Both keys share the `{username}` hash tag, so they live in the same
+    Redis Cluster slot and are updated in one MULTI/EXEC.
+
+    Threads whose checkpoints have expired (`max_age` seconds without activity, matching the
+    checkpointer TTL) are dropped from the index as well.
+    """
+
+    def __init__(self, redis_client, prefix: str = "chat_threads", max_threads: int = THREAD_INDEX_MAX_THREADS,
+                 max_age: float | None = None):
+        self.redis = redis_client
+        self.prefix = prefix
+        self.max_threads = max_threads
+        self.max_age = max_age
+
+    def _keys(self, username: str) -> tuple:
+        base = f"{self.prefix}:{{{username}}}"
+        return base, f"{base}:titles"
+
+    def touch(self, username: str, thread_id: str, prompt: str):
+        """Record a turn: bump the thread's last activity and name it after its first prompt."""
+        threads_key, titles_key = self._keys(username)
+        now = time.time()
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.zadd(threads_key, {thread_id: now})
+        pipe.hsetnx(titles_key, thread_id, thread_title(prompt))
+        # Keep the newest max_threads; their titles are removed lazily in list()
+        pipe.zremrangebyrank(threads_key, 0, -self.max_threads - 1)
+        if self.max_age:
+            pipe.zremrangebyscore(threads_key, "-inf", now - self.max_age)
+            pipe.expire(threads_key, int(self.max_age))
+            pipe.expire(titles_key, int(self.max_age))
+        pipe.execute()
+
+    def list(self, username: str, limit: int | None = None) -> list:
+        """The user's threads, most recently active first."""
+        threads_key, titles_key = self._keys(username)
+        min_score = time.time() - self.max_age if self.max_age else "-inf"
+        entries = self.redis.zrevrangebyscore(threads_key, "+inf", min_score, start=0,
+                                              num=limit or self.max_threads, withscores=True)
+        if not entries:
+            return []
+        thread_ids = [thread_id.decode() if isinstance(thread_id, bytes) else thread_id for thread_id, _ in entries]
+        titles = self.redis.hmget(titles_key, thread_ids)
+        if self.redis.hlen(titles_key) > self.max_threads:
+            self._drop_stale_titles(username)
+        return [
+            ThreadSummary(thread_id, title.decode() if isinstance(title, bytes) else (title or "Untitled"), score)
+            for thread_id, title, (_, score) in zip(thread_ids, titles, entries)
+        ]
+
+    def _drop_stale_titles(self, username: str):
+        threads_key, titles_key = self._keys(username)
+        live = set(self.redis.zrange(threads_key, 0, -1))
+        stale = [field for field in self.redis.hkeys(titles_key) if field not in live]
+        if stale:
+            self.redis.hdel(titles_key, *stale)
+
+    def remove(self, username: str, thread_id: str):
+        threads_key, titles_key = self._keys(username)
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.zrem(threads_key, thread_id)
+        pipe.hdel(titles_key, thread_id)
+        pipe.execute()
+
+class SQLiteThreadIndex:
+    """
+    The same index in a table of a local SQLite file (the checkpoint file, for single-node
+    deployments without a Redis server): one row per (user, thread), listed through an index
+    on (username, last_active). Like ThreadIndex, it keeps the newest `max_threads` threads
+    per user and drops threads idle for more than `max_age` seconds, the checkpointer TTL.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS thread_index (
+        username TEXT NOT NULL,
+        thread_id TEXT NOT NULL,
+        title TEXT NOT NULL,
+        last_active REAL NOT NULL,
+        PRIMARY KEY (username, thread_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS thread_index_by_activity ON thread_index (username, last_active);
+    """
+
+    def __init__(self, path: str, max_threads: int = THREAD_INDEX_MAX_THREADS, max_age: float | None = None):
+        self.path = path
+        self.max_threads = max_threads
+        self.max_age = max_age
+        self._local = threading.local()
+        self._connection().executescript(self.SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread; the file is in WAL mode (set by the checkpointer)
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+        return connection
+
+    def touch(self, username: str, thread_id: str, prompt: str):
+        """Record a turn: bump the thread's last activity and name it after its first prompt."""
+        now = time.time()
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT INTO thread_index VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (username, thread_id) DO UPDATE SET last_active = excluded.last_active",
+                (username, thread_id, thread_title(prompt), now))
+            connection.execute(
+                "DELETE FROM thread_index WHERE username = ? AND thread_id NOT IN"
+                " (SELECT thread_id FROM thread_index WHERE username = ? ORDER BY last_active DESC LIMIT ?)",
+                (username, username, self.max_threads))
+            if self.max_age:
+                connection.execute("DELETE FROM thread_index WHERE username = ? AND last_active < ?",
+                                   (username, now - self.max_age))
+
+    def list(self, username: str, limit: int | None = None) -> list:
+        """The user's threads, most recently active first."""
+        min_active = time.time() - self.max_age if self.max_age else 0
+        rows = self._connection().execute(
+            "SELECT thread_id, title, last_active FROM thread_index"
+            " WHERE username = ? AND last_active >= ? ORDER BY last_active DESC LIMIT ?",
+            (username, min_active, limit or self.max_threads)).fetchall()
+        return [ThreadSummary(*row) for row in rows]
+
+    def remove(self, username: str, thread_id: str):
+        with self._connection() as connection:
+            connection.execute("DELETE FROM thread_index WHERE username = ? AND thread_id = ?", (username, thread_id))
@@ -0,0 +1,172 @@
+import asyncio
+import random
+import time
+import uuid
+import logging
+from contextlib import asynccontextmanager
+from os import getenv
+
+from redis.exceptions import RedisError
+
+# -------------------- Setup Logging --------------------
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# -------------------- Thread Lock Configuration --------------------
+THREAD_LOCK_TTL = float(getenv("THREAD_LOCK_TTL", 30))  # Lease in seconds, renewed while the turn runs
+THREAD_LOCK_WAIT = float(getenv("THREAD_LOCK_WAIT", 60))  # Longest wait for a turn of the same thread to end
+THREAD_LOCK_POLL = 0.05  # First retry delay while another process holds the lock; doubles up to 1s
+
+class ThreadBusyError(TimeoutError):
+    """Another turn of the thread was still running after THREAD_LOCK_WAIT seconds."""
+
+# -------------------- Lease Scripts --------------------
+# The lock is a key holding the owner's random token; only the owner may extend or delete it,
+# so a turn that outlived its lease (e.g. a stalled process) cannot release someone else's lock
+RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# -------------------- Per-Thread Locks --------------------
+class InMemoryThreadLocks:
+    """
+    One turn at a time per conversation thread, within this process: concurrent turns of a
+    thread wait for each other in arrival order instead of interleaving their checkpoint
+    writes. Locks exist only while a turn of their thread runs or waits.
+    """
+
+    backend = "memory"
+
+    def __init__(self, wait: float = THREAD_LOCK_WAIT):
+        self.wait = wait
+        self._locks = {}  # thread_id -> [asyncio.Lock, turns running or waiting]
+
+    @asynccontextmanager
+    async def hold(self, thread_id: str):
+        """Run the block as the only turn of `thread_id`; raises ThreadBusyError after `wait` seconds."""
+        deadline = time.monotonic() + self.wait
+        entry = self._locks.setdefault(thread_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            try:
+                await asyncio.wait_for(entry[0].acquire(), self.wait)
+            except asyncio.TimeoutError:
+                raise ThreadBusyError(f"Thread {thread_id} is busy.") from None
+            try:
+                async with self._hold_shared(thread_id, deadline):
+                    yield
+            finally:
+                entry[0].release()
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[thread_id]
+
+    @asynccontextmanager
+    async def _hold_shared(self, thread_id: str, deadline: float):
+        # No other process to exclude
+        yield
+
+    def stats(self) -> dict:
+        return {"backend": self.backend, "threads": len(self._locks)}
+
+class RedisThreadLocks(InMemoryThreadLocks):
+    """
+    One turn at a time per conversation thread across every worker process sharing Redis.
+
+    Turns of a thread within this process queue on the in-process lock first, so only one of
+    them at a time polls Redis. The Redis lock is a lease of `ttl` seconds (SET NX PX with a
+    random token), renewed every ttl/3 while the turn runs: a crashed process frees its threads
+    after at most `ttl`. When Redis is unreachable, turns run under the in-process lock only
+    rather than failing.
+    """
+
+    backend = "redis"
+
+    def __init__(self, redis_client, ttl: float = THREAD_LOCK_TTL, wait: float = THREAD_LOCK_WAIT,
+                 prefix: str = "thread_lock"):
+        super().__init__(wait)
+        self.redis = redis_client
+        self.ttl = ttl
+        self.prefix = prefix
+        self._renew = redis_client.register_script(RENEW_SCRIPT)
+        self._release = redis_client.register_script(RELEASE_SCRIPT)
+        self._degraded = False  # Running without the Redis lock since the last Redis error
+        self.contended = 0  # Acquisitions that had to wait for another process
+
+    def _redis_failed(self, error: RedisError):
+        if not self._degraded:
+            logger.warning("Thread locks falling back to this process only: %s", error)
+            self._degraded = True
+
+    async def _acquire(self, key: str, token: str, deadline: float) -> bool:
+        """Take the Redis lock, waiting until `deadline`; False when Redis is unreachable."""
+        delay = THREAD_LOCK_POLL
+        while True:
+            try:
+                if await self.redis.set(key, token, nx=True, px=int(self.ttl * 1000)):
+                    if self._degraded:
+                        logger.info("Thread locks back on Redis.")
+                        self._degraded = False
+                    return True
+            except RedisError as error:
+                self._redis_failed(error)
+                return False
+            if delay == THREAD_LOCK_POLL:
+                self.contended += 1
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise ThreadBusyError(f"Thread {key} is busy in another process.")
+            await asyncio.sleep(min(delay * random.uniform(0.5, 1.0), remaining))
+            delay = min(delay * 2, 1.0)
+
+    async def _keep_alive(self, key: str, token: str):
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            try:
+                if not await self._renew(keys=[key], args=[token, int(self.ttl * 1000)]):
+                    logger.warning("Lost the lock of %s: the turn outlived its lease.", key)
+                    return
+            except RedisError as error:
+                self._redis_failed(error)
+
+    @asynccontextmanager
+    async def _hold_shared(self, thread_id: str, deadline: float):
+        key, token = f"{self.prefix}:{thread_id}", uuid.uuid4().hex
+        if not await self._acquire(key, token, deadline):
+            yield
+            return
+        keep_alive = asyncio.create_task(self._keep_alive(key, token))
+        try:
+            yield
+        finally:
+            keep_alive.cancel()
+            try:
+                await self._release(keys=[key], args=[token])
+            except RedisError as error:
+                self._redis_failed(error)  # The lease runs out on its own
+
+    def stats(self) -> dict:
+        return {**super().stats(), "contended": self.contended, "degraded": self._degraded}
+
+def create_thread_locks(backend: str = "redis"):
+    """
+    Build the per-thread turn lock for the given backend name: 'redis', 'memory' or 'off'.
+    The Redis backend reuses the async client created in redis_checkpoint.py, so it must be
+    used from the event loop that client is bound to.
+    """
+    if backend == "off":
+        return None
+    if backend == "redis":
+        from redis_checkpoint import get_async_redis_client
+        return RedisThreadLocks(get_async_redis_client())
+    return InMemoryThreadLocks()
@@ -0,0 +1,226 @@
+import base64
+import hashlib
+import hmac
+import secrets
+import sqlite3
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from os import getenv
+
+# -------------------- Setup Logging --------------------
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# -------------------- User Store Configuration --------------------
+USER_STORE_BACKEND = getenv("USER_STORE_BACKEND", "sqlite")  # 'sqlite' or 'redis'
+USER_DB_PATH = getenv("USER_DB_PATH", "users.db")  # SQLite file of the sqlite backend
+
+# scrypt cost: N (CPU/memory cost, a power of two), r (block size) and p (parallelism).
+# One hash takes 128 * N * r bytes of memory: 16 MiB with the defaults. Raising N makes
+# offline guessing and every login proportionally slower; see bench_user_store.py.
+PASSWORD_SCRYPT_N = int(getenv("PASSWORD_SCRYPT_N", 2 ** 14))
+PASSWORD_SCRYPT_R = int(getenv("PASSWORD_SCRYPT_R", 8))
+PASSWORD_SCRYPT_P = int(getenv("PASSWORD_SCRYPT_P", 1))
+AUTH_WORKERS = int(getenv("AUTH_WORKERS", 4))  # Password checks run concurrently per process
+
+# Users created when the store is empty, so the demo app can be logged into out of the box
+DEMO_USERS = {
+    "alice": "password123",
+    "bob": "securepass",
+}
+
+# -------------------- Password Hashing --------------------
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+class PasswordHasher:
+    """
+    Salted scrypt hashes, encoded as `scrypt$N$r$p$salt$hash`.
+    The cost is stored with every hash, so existing hashes keep verifying after the cost
+    settings change; needs_rehash() tells when one should be upgraded at the next login.
+    """
+
+    def __init__(self, n: int = PASSWORD_SCRYPT_N, r: int = PASSWORD_SCRYPT_R, p: int = PASSWORD_SCRYPT_P):
+        if n < 2 or n & (n - 1):
+            raise ValueError("scrypt N must be a power of two greater than 1")
+        self.n, self.r, self.p = n, r, p
+
+    @staticmethod
+    def _derive(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+        # OpenSSL refuses to use more than maxmem; allow what the parameters need plus headroom
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, dklen=32,
+                              maxmem=128 * n * r * (p + 1) + 2 ** 20)
+
+    def hash(self, password: str) -> str:
+        salt = secrets.token_bytes(16)
+        key = self._derive(password, salt, self.n, self.r, self.p)
+        return f"scrypt${self.n}${self.r}${self.p}${_b64encode(salt)}${_b64encode(key)}"
+
+    def verify(self, password: str, encoded: str) -> bool:
+        try:
+            algorithm, n, r, p, salt, key = encoded.split("$")
+            if algorithm != "scrypt":
+                return False
+            expected = _b64decode(key)
+            actual = self._derive(password, _b64decode(salt), int(n), int(r), int(p))
+        except ValueError:  # Malformed hash
+            return False
+        return hmac.compare_digest(actual, expected)
+
+    def needs_rehash(self, encoded: str) -> bool:
+        return not encoded.startswith(f"scrypt${self.n}${self.r}${self.p}$")
+
+# -------------------- User Store Backends --------------------
+class SQLiteUserStore:
+    """Users in a local SQLite file; one connection per thread, WAL so readers never block."""
+
+    def __init__(self, path: str = USER_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS users ("
+                " username TEXT PRIMARY KEY,"
+                " password_hash TEXT NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def get_password_hash(self, username: str) -> str | None:
+        row = self._connection().execute(
+            "SELECT password_hash FROM users WHERE username = ?", (username,)).fetchone()
+        return row[0] if row else None
+
+    def set_password_hash(self, username: str, password_hash: str):
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT INTO users (username, password_hash, created_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(username) DO UPDATE SET password_hash = excluded.password_hash",
+                (username, password_hash, time.time()),
+            )
+
+    def delete_user(self, username: str):
+        with self._connection() as connection:
+            connection.execute("DELETE FROM users WHERE username = ?", (username,))
+
+    def count(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+class RedisUserStore:
+    """Users in Redis (one hash per user), shared by every app replica."""
+
+    def __init__(self, redis_client, prefix: str = "users"):
+        self.redis = redis_client
+        self.prefix = prefix
+
+    def get_password_hash(self, username: str) -> str | None:
+        value = self.redis.hget(f"{self.prefix}:{username}", "password_hash")
+        return value.decode() if isinstance(value, bytes) else value
+
+    def set_password_hash(self, username: str, password_hash: str):
+        key = f"{self.prefix}:{username}"
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.hset(key, "password_hash", password_hash)
+        pipe.hsetnx(key, "created_at", time.time())
+        pipe.sadd(f"{self.prefix}:index", username)
+        pipe.execute()
+
+    def delete_user(self, username: str):
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.delete(f"{self.prefix}:{username}")
+        pipe.srem(f"{self.prefix}:index", username)
+        pipe.execute()
+
+    def count(self) -> int:
+        return self.redis.scard(f"{self.prefix}:index")
+
+def create_user_store(backend: str = USER_STORE_BACKEND):
+    """
+    Build the user store for the given backend name: 'sqlite' or 'redis'.
+    The Redis backend reuses the client created in redis_checkpoint.py.
+    """
+    if backend == "redis":
+        from redis_checkpoint import get_redis_client
+        return RedisUserStore(get_redis_client())
+    if backend == "sqlite":
+        return SQLiteUserStore()
+    raise ValueError(f"Unknown user store backend: {backend!r}")
+
+# -------------------- Authenticator --------------------
+class Authenticator:
+    """
+    Checks passwords against the user store on a small thread pool.
+
+    scrypt is deliberately slow and memory-hard, so checks run on at most `workers` threads:
+    a burst of logins queues there instead of starving the threads serving chat sessions
+    of CPU and memory. Unknown users are checked against a dummy hash, so response times do
+    not reveal which usernames exist.
+    """
+
+    def __init__(self, store, hasher: PasswordHasher | None = None, workers: int = AUTH_WORKERS):
+        self.store = store
+        self.hasher = hasher or PasswordHasher()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="auth")
+        self._dummy_hash = self.hasher.hash(secrets.token_urlsafe(16))
+
+    def _check(self, username: str, password: str) -> bool:
+        encoded = self.store.get_password_hash(username)
+        if not self.hasher.verify(password, encoded or self._dummy_hash) or encoded is None:
+            return False
+        if self.hasher.needs_rehash(encoded):
+            # Upgrade to the current cost now that the plain password is at hand
+            self.store.set_password_hash(username, self.hasher.hash(password))
+            logger.info("Password hash of %s upgraded to the current cost.", username)
+        return True
+
+    def submit(self, username: str, password: str):
+        """Queue a password check; returns a Future resolving to True when the credentials match."""
+        return self._pool.submit(self._check, username, password)
+
+    def authenticate(self, username: str, password: str, timeout: float | None = None) -> bool:
+        return self.submit(username, password).result(timeout)
+
+    def create_user(self, username: str, password: str):
+        self.store.set_password_hash(username, self.hasher.hash(password))
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
+
+def seed_demo_users(authenticator: Authenticator):
+    """Create DEMO_USERS when the store has no users yet."""
+    if authenticator.store.count() == 0:
+        for username, password in DEMO_USERS.items():
+            authenticator.create_user(username, password)
+        logger.info("User store was empty: created demo users %s.", ", ".join(DEMO_USERS))
+
+# -------------------- Command Line --------------------
+if __name__ == "__main__":
+    # python user_store.py add|remove <username>
+    import argparse
+    import getpass
+
+    parser = argparse.ArgumentParser(description="Manage the users of the chatbot.")
+    parser.add_argument("action", choices=["add", "remove"])
+    parser.add_argument("username")
+    args = parser.parse_args()
+
+    authenticator = Authenticator(create_user_store(), workers=1)
+    if args.action == "add":
+        authenticator.create_user(args.username, getpass.getpass(f"Password for {args.username}: "))
+        print(f"User {args.username} saved.")
+    else:
+        authenticator.store.delete_user(args.username)
+        print(f"User {args.username} removed.")
+    authenticator.shutdown()
@@ -0,0 +1,140 @@
+"""
+Put/get latency and turns/sec of the checkpoint backends: the embedded SQLite saver
+(sqlite_checkpoint.py), RedisSaver (redis_checkpoint.py) and MongoDBSaver (mongo_checkpoint.py).
+
+Each backend runs in its own process and serves the same minimal chat graph (no LLM: the
+reply is a fixed number of words), so the numbers are the checkpointer's own cost. The
+savers are used bare, without the compaction, hot cache and metrics wrappers. N sessions of
+M turns are played from a pool of threads; every turn reads the thread's latest checkpoint
+and writes new ones, so checkpoints grow with the conversation as in the apps.
+
+Backends:
+    sqlite    a fresh file in a temporary directory
+    redis     Redis Stack on REDIS_HOST/REDIS_PORT (reported as an error when unreachable)
+    mongodb   mongomock in-process (default) or MONGODB_URI with --mongo uri
+
+Reported per backend: turns/sec, p50/p99 latency of get_tuple, put and put_writes.
+
+Usage:
+    python benchmark/bench_checkpointers.py [--backends sqlite redis mongodb] [--sessions 50]
+        [--turns 10] [--concurrency 8] [--response-words 60] [--mongo mongomock|uri]
+"""
+import argparse
+import importlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Annotated, TypedDict
+
+import standins
+from run_benchmark import RESULT_PREFIX, percentile
+
+BACKENDS = {
+    # backend -> (variant, module, getter of the bare saver)
+    "sqlite": ("6", "sqlite_checkpoint", "get_sqlite_saver"),
+    "redis": ("6", "redis_checkpoint", "get_redis_saver"),
+    "mongodb": ("5", "mongo_checkpoint", "get_mongodb_saver"),
+}
+TIMED_METHODS = ("get_tuple", "put", "put_writes")
+
+def timed(saver) -> dict:
+    """Record the latency of the saver's reads and writes, per method."""
+    samples = {name: [] for name in TIMED_METHODS}
+    for name in TIMED_METHODS:
+        method = getattr(saver, name)
+
+        def wrapper(*args, _method=method, _samples=samples[name], **kwargs):
+            start = time.perf_counter()
+            try:
+                return _method(*args, **kwargs)
+            finally:
+                _samples.append(time.perf_counter() - start)
+
+        setattr(saver, name, wrapper)
+    return samples
+
+def build_graph(saver, response_words: int):
+    from langchain_core.messages import AIMessage
+    from langgraph.graph import END, StateGraph, add_messages
+
+    class ChatState(TypedDict):
+        messages: Annotated[list, add_messages]
+
+    reply = " ".join(f"word{i % 100}" for i in range(response_words))
+    graph = StateGraph(ChatState)
+    graph.add_node("chatbot", lambda state: {"messages": [AIMessage(content=reply)]})
+    graph.set_entry_point("chatbot")
+    graph.add_edge("chatbot", END)
+    return graph.compile(checkpointer=saver)
+
+def run_backend(args) -> dict:
+    variant, module_name, getter = BACKENDS[args.worker]
+    variant_dir = standins.REPO_ROOT / standins.VARIANTS[variant]
+    sys.path.insert(0, str(variant_dir))
+    if args.worker == "sqlite":
+        os.environ["SQLITE_CHECKPOINT_PATH"] = os.path.join(tempfile.mkdtemp(), "checkpoints.db")
+    if args.worker == "mongodb" and args.mongo == "mongomock":
+        standins.install_mongomock()
+    from langchain_core.messages import HumanMessage
+
+    saver = getattr(importlib.import_module(module_name), getter)()
+    chat_agent = build_graph(saver, args.response_words)
+    run_id = uuid.uuid4().hex[:8]
+    chat_agent.invoke({"messages": [HumanMessage(content="warm-up")]},
+                      {"configurable": {"thread_id": f"bench-{run_id}-warm-up"}})
+    samples = timed(saver)
+
+    def session(index: int):
+        config = {"configurable": {"thread_id": f"bench-{run_id}-{index}"}}
+        for turn in range(args.turns):
+            chat_agent.invoke({"messages": [HumanMessage(content=f"Question {turn} of session {index}")]}, config)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(session, range(args.sessions)))
+    wall = time.perf_counter() - start
+    result = {"backend": args.worker, "turns_per_sec": args.sessions * args.turns / wall}
+    for name, values in samples.items():
+        result[f"{name}_p50"] = percentile(values, 50)
+        result[f"{name}_p99"] = percentile(values, 99)
+    return result
+
+def spawn(backend: str, argv: list) -> dict:
+    completed = subprocess.run([sys.executable, __file__, *argv, "--worker", backend], capture_output=True, text=True)
+    for line in completed.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    error = completed.stderr.strip().splitlines()
+    return {"backend": backend, "error": error[-1] if error else "no result"}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", choices=list(BACKENDS), default=list(BACKENDS))
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--response-words", type=int, default=60)
+    parser.add_argument("--mongo", choices=["mongomock", "uri"], default="mongomock")
+    parser.add_argument("--worker", choices=list(BACKENDS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        print(RESULT_PREFIX + json.dumps(run_backend(args)))
+        return
+
+    columns = [f"{name} {stat}" for name in TIMED_METHODS for stat in ("p50", "p99")]
+    print(f"{'backend':<9} {'turns/s':>9} " + " ".join(f"{column:>15}" for column in columns))
+    for backend in args.backends:
+        result = spawn(backend, sys.argv[1:])
+        if "error" in result:
+            print(f"{backend:<9} error: {result['error']}")
+            continue
+        timings = [result[f"{name}_{stat}"] * 1000 for name in TIMED_METHODS for stat in ("p50", "p99")]
+        print(f"{backend:<9} {result['turns_per_sec']:>9.1f} " + " ".join(f"{value:>13.3f}ms" for value in timings))
+
+if __name__ == "__main__":
+    main()
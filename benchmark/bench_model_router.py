@@ -0,0 +1,106 @@
+"""
+Routing mix, router overhead and expected savings of model_router.py on a synthetic
+traffic mix (greetings, short questions, follow-ups, how-to questions, code and pasted
+documents, in the proportions below).
+
+Each turn is classified as the router node would classify it, then priced and timed with
+the per-model figures given on the command line (defaults: gpt-4-turbo vs gpt-4o-mini list
+prices, typical end-to-end latencies). Reports the share of turns per route and reason,
+the router's own cost per turn, and the mean latency and cost per turn against sending
+every turn to the large model.
+
+Usage:
+    python benchmark/bench_model_router.py [--turns 10000] [--policy heuristic]
+        [--large-latency 1.8] [--small-latency 0.6] [--large-price 10 30] [--small-price 0.15 0.6]
+        [--completion-tokens 200] [--seed 42]
+"""
+import argparse
+import importlib.util
+import random
+import time
+from collections import Counter
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.messages.utils import count_tokens_approximately
+
+from standins import REPO_ROOT, VARIANTS
+
+# (share of traffic, prompt generator)
+TRAFFIC_MIX = [
+    (0.20, lambda rng: rng.choice(["Hi!", "Hello there", "Thanks!", "Thank you, that helps.", "ok", "Good morning"])),
+    (0.35, lambda rng: rng.choice(["What is the capital of {0}?", "When was {0} founded?",
+                                   "Who is the president of {0}?", "What currency does {0} use?"])
+     .format(rng.choice(["France", "Japan", "Brazil", "Kenya", "Canada"]))),
+    (0.10, lambda rng: rng.choice(["And what about the population?", "Can you give another example?",
+                                   "Is that still true today?", "Shorter please."])),
+    (0.20, lambda rng: rng.choice(["Explain why the sky is blue.", "Compare TCP and UDP for video streaming.",
+                                   "Write a cover letter for a data analyst job.",
+                                   "Plan a 3-day trip to Rome, step by step."])),
+    (0.10, lambda rng: "Why does this fail?\n```python\n" + "for i in range(10): print(i / (i - 5))\n" * 3 + "```"),
+    (0.05, lambda rng: "Here is our meeting transcript: " + " ".join(rng.choice(["budget", "roadmap", "hiring",
+                                                                              "launch", "risk"]) for _ in range(300))),
+]
+
+def load_model_router():
+    spec = importlib.util.spec_from_file_location("bench_model_router", REPO_ROOT / VARIANTS["6"] / "model_router.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def build_turns(turns: int, seed: int) -> list:
+    """Conversations of 1 to 15 turns, each turn's message list as the router would see it."""
+    rng = random.Random(seed)
+    weights, generators = zip(*TRAFFIC_MIX)
+    workload, history = [], []
+    for _ in range(turns):
+        if not history or rng.random() < 1 / 8:
+            history = []
+        history = history + [HumanMessage(content=rng.choices(generators, weights)[0](rng))]
+        workload.append(history)
+        history = history + [AIMessage(content="An answer of a typical length. " * 12)]
+    return workload
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=10_000)
+    parser.add_argument("--policy", default="heuristic", choices=["heuristic", "small", "large"])
+    parser.add_argument("--large-latency", type=float, default=1.8, help="Seconds per turn on the large model")
+    parser.add_argument("--small-latency", type=float, default=0.6, help="Seconds per turn on the small model")
+    parser.add_argument("--large-price", type=float, nargs=2, default=[10, 30], metavar=("IN", "OUT"),
+                        help="USD per million prompt / completion tokens")
+    parser.add_argument("--small-price", type=float, nargs=2, default=[0.15, 0.6], metavar=("IN", "OUT"))
+    parser.add_argument("--completion-tokens", type=int, default=200, help="Completion tokens per turn")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    model_router = load_model_router()
+    router = model_router.ModelRouter(policy=args.policy)
+    workload = build_turns(args.turns, args.seed)
+
+    start = time.perf_counter()
+    decisions = [router.route(messages) for messages in workload]
+    overhead = (time.perf_counter() - start) / len(workload)
+
+    latency = {model_router.LARGE: args.large_latency, model_router.SMALL: args.small_latency}
+    price = {model_router.LARGE: args.large_price, model_router.SMALL: args.small_price}
+    routed = {"latency": 0.0, "cost": 0.0}
+    baseline = {"latency": 0.0, "cost": 0.0}
+    for messages, decision in zip(workload, decisions):
+        tokens = count_tokens_approximately(messages)
+        for totals, route in ((routed, decision.route), (baseline, model_router.LARGE)):
+            totals["latency"] += latency[route]
+            totals["cost"] += (tokens * price[route][0] + args.completion_tokens * price[route][1]) / 1e6
+
+    reasons = Counter((decision.route, decision.reason) for decision in decisions)
+    print(f"{'route':>6} {'reason':>8} {'share':>7}")
+    for (route, reason), count in sorted(reasons.items()):
+        print(f"{route:>6} {reason:>8} {count / len(decisions):>7.1%}")
+    print(f"Router overhead: {overhead * 1e6:.1f}us per turn")
+    print(f"{'':>12} {'mean latency':>13} {'cost / 1k turns':>16}")
+    for label, totals in (("all large", baseline), (f"routed", routed)):
+        print(f"{label:>12} {totals['latency'] / len(workload):>12.2f}s "
+              f"{totals['cost'] / len(workload) * 1000:>15.2f}$")
+    print(f"Latency {routed['latency'] / baseline['latency'] - 1:+.0%}, cost {routed['cost'] / baseline['cost'] - 1:+.0%}")
+
+if __name__ == "__main__":
+    main()
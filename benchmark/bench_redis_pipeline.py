@@ -0,0 +1,138 @@
+"""
+Round trips and latency per turn of the Redis checkpointer of 4_Memory_Redis_TTL_AI_ChatBot
+(RedisSaver with ttl_config, refresh_on_read on), with and without pipelined writes
+(redis_checkpoint.with_pipelined_writes / REDIS_PIPELINE).
+
+The saver talks to Redis Stack on --redis through a TCP proxy that delays every chunk by
+half of --rtt in each direction, like a Redis server on another host. Every session plays
+--turns turns of the same minimal chat graph as bench_checkpointers.py (no LLM), one session
+at a time, so every command's latency is paid in full. Round trips are counted as requests
+written by redis-py: one per command, one per pipeline.
+
+Modes:
+    off        RedisSaver as is: one round trip per EXPIRE, per pointer update, ...
+    pipeline   queued writes sent in one pipeline per get_tuple / put / put_writes
+    multi      the same pipeline wrapped in MULTI/EXEC
+
+Usage:
+    python benchmark/bench_redis_pipeline.py [--redis localhost:6379] [--rtt 0 1 5]
+        [--modes off pipeline multi] [--sessions 20] [--turns 10] [--response-words 60]
+"""
+import argparse
+import asyncio
+import sys
+import threading
+import time
+import uuid
+
+import standins
+from bench_checkpointers import build_graph
+from run_benchmark import percentile
+
+sys.path.insert(0, str(standins.REPO_ROOT / standins.VARIANTS["4"]))
+
+class DelayProxy:
+    """TCP proxy from a local port to Redis, delaying every chunk by `delay` seconds each way."""
+
+    def __init__(self, host: str, port: int, delay: float):
+        self.host, self.port, self.delay = host, port, delay
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        self.server = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(self.connect, "127.0.0.1", 0), self.loop).result()
+        self.local_port = self.server.sockets[0].getsockname()[1]
+
+    async def connect(self, client_reader, client_writer):
+        server_reader, server_writer = await asyncio.open_connection(self.host, self.port)
+        await asyncio.gather(self.forward(client_reader, server_writer), self.forward(server_reader, client_writer))
+
+    async def forward(self, reader, writer):
+        # Chunks are delivered `delay` after they arrived, in order, without queuing behind each other's delay
+        queue = asyncio.Queue()
+
+        async def deliver():
+            while (item := await queue.get()) is not None:
+                deliver_at, data = item
+                await asyncio.sleep(max(0.0, deliver_at - self.loop.time()))
+                writer.write(data)
+                await writer.drain()
+            writer.close()
+
+        delivery = asyncio.create_task(deliver())
+        try:
+            while data := await reader.read(65536):
+                queue.put_nowait((self.loop.time() + self.delay, data))
+        except ConnectionError:
+            pass
+        queue.put_nowait(None)
+        await delivery
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.server.close)
+
+def count_round_trips() -> list:
+    """Count the requests redis-py writes: one per command, one per pipeline."""
+    from redis.connection import AbstractConnection
+
+    counter = [0]
+    send_packed_command = AbstractConnection.send_packed_command
+
+    def counted(self, command, *args, **kwargs):
+        counter[0] += 1
+        return send_packed_command(self, command, *args, **kwargs)
+
+    AbstractConnection.send_packed_command = counted
+    return counter
+
+def run_mode(mode: str, port: int, args, counter: list) -> dict:
+    import redis
+    from langchain_core.messages import HumanMessage
+    from langgraph.checkpoint.redis import RedisSaver
+
+    import redis_checkpoint
+
+    saver = RedisSaver(redis_client=redis.Redis(host="127.0.0.1", port=port, db=redis_checkpoint.REDIS_DB),
+                       ttl=redis_checkpoint.ttl_config)
+    saver.setup()
+    if mode != "off":
+        redis_checkpoint.with_pipelined_writes(saver, transaction=mode == "multi")
+    chat_agent = build_graph(saver, args.response_words)
+    run_id = uuid.uuid4().hex[:8]
+    chat_agent.invoke({"messages": [HumanMessage(content="warm-up")]},
+                      {"configurable": {"thread_id": f"bench-{run_id}-warm-up"}})
+
+    latencies, round_trips = [], 0
+    for session in range(args.sessions):
+        config = {"configurable": {"thread_id": f"bench-{run_id}-{session}"}}
+        for turn in range(args.turns):
+            before = counter[0]
+            start = time.perf_counter()
+            chat_agent.invoke({"messages": [HumanMessage(content=f"Question {turn}")]}, config)
+            latencies.append(time.perf_counter() - start)
+            round_trips += counter[0] - before
+    return {"round_trips": round_trips / len(latencies), "p50": percentile(latencies, 50),
+            "p99": percentile(latencies, 99), "turns_per_sec": len(latencies) / sum(latencies)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--redis", default="localhost:6379", help="Redis Stack host:port")
+    parser.add_argument("--rtt", type=float, nargs="+", default=[0, 1, 5], help="Injected round-trip delays (ms)")
+    parser.add_argument("--modes", nargs="+", choices=["off", "pipeline", "multi"], default=["off", "pipeline", "multi"])
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--response-words", type=int, default=60)
+    args = parser.parse_args()
+    host, _, port = args.redis.partition(":")
+
+    counter = count_round_trips()
+    print(f"{'rtt':>6} {'mode':>9} {'round trips/turn':>17} {'p50':>10} {'p99':>10} {'turns/s':>8}")
+    for rtt in args.rtt:
+        proxy = DelayProxy(host, int(port or 6379), rtt / 2000)
+        for mode in args.modes:
+            result = run_mode(mode, proxy.local_port, args, counter)
+            print(f"{rtt:>4.1f}ms {mode:>9} {result['round_trips']:>17.1f} {result['p50'] * 1000:>8.2f}ms "
+                  f"{result['p99'] * 1000:>8.2f}ms {result['turns_per_sec']:>8.1f}")
+        proxy.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Cold-start cost of the six chatbot variants: how long a fresh process takes before it can
+serve its first turn, split into phases.
+
+    import      `import agent` (module-level code of agent.py and its imports; langgraph's
+                checkpoint base is already loaded by the stand-ins at that point)
+    llm         first get_llm(): importing langchain_openai and building the ChatOpenAI client
+    graph       first get_chat_agent(): compiling the graph and building the checkpointer
+    first turn  first turn through the graph, with the fake model of run_benchmark.py
+
+Every repetition runs in a new interpreter, so nothing is shared between samples; medians
+are reported. No network calls are made: the OpenAI client is built but never used, and
+--saver memory (default) replaces Redis and MongoDB by in-process savers as in
+run_benchmark.py.
+
+Usage:
+    python benchmark/measure_cold_start.py [--variants 1 2 3 4 5 6] [--repeats 5] [--saver memory|local]
+"""
+import argparse
+import importlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import standins
+
+RESULT_PREFIX = "COLD_START_RESULT "
+PHASES = ["import", "llm", "graph", "first_turn"]
+
+# -------------------- Worker: one cold start per process --------------------
+def cold_start(args) -> dict:
+    from langchain_core.messages import HumanMessage
+
+    variant = args.worker
+    variant_dir = standins.REPO_ROOT / standins.VARIANTS[variant]
+    os.chdir(variant_dir)
+    sys.path.insert(0, str(variant_dir))
+    os.environ.setdefault("OPENAI_API_KEY", "sk-offline-benchmark")
+    if args.saver == "memory":
+        standins.install_memory_savers(variant)
+    elif variant in standins.MONGO_VARIANTS:
+        standins.install_mongomock()
+
+    timings = {}
+    start = time.perf_counter()
+    agent = importlib.import_module("agent")
+    timings["import"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    agent.get_llm()
+    timings["llm"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    chat_agent = agent.get_chat_agent()
+    timings["graph"] = time.perf_counter() - start
+
+    standins.install_fake_llm(agent, latency=0, latency_jitter=0, tokens_per_second=None,
+                              response_words=20, seed=0)
+    start = time.perf_counter()
+    chat_agent.invoke({"messages": [HumanMessage(content="Hello!")]},
+                      config={"configurable": {"thread_id": "cold-start"}})
+    timings["first_turn"] = time.perf_counter() - start
+    return timings
+
+# -------------------- Driver --------------------
+def spawn(variant: str, saver: str) -> dict:
+    completed = subprocess.run([sys.executable, __file__, "--saver", saver, "--worker", variant],
+                               capture_output=True, text=True)
+    for line in completed.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    error = completed.stderr.strip().splitlines()
+    return {"error": error[-1] if error else "no result"}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--variants", nargs="+", default=sorted(standins.VARIANTS), choices=sorted(standins.VARIANTS))
+    parser.add_argument("--repeats", type=int, default=5, help="Fresh processes per variant")
+    parser.add_argument("--saver", choices=["memory", "local"], default="memory")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        print(RESULT_PREFIX + json.dumps(cold_start(args)))
+        return
+
+    print(f"{'variant':<34}" + "".join(f"{phase:>12}" for phase in PHASES) + f"{'total':>12}")
+    for variant in args.variants:
+        samples = [spawn(variant, args.saver) for _ in range(args.repeats)]
+        failed = [sample["error"] for sample in samples if "error" in sample]
+        if failed:
+            print(f"{standins.VARIANTS[variant]:<34} failed: {failed[0]}")
+            continue
+        medians = {phase: statistics.median(sample[phase] for sample in samples) for phase in PHASES}
+        print(f"{standins.VARIANTS[variant]:<34}"
+              + "".join(f"{medians[phase] * 1000:>10.0f}ms" for phase in PHASES)
+              + f"{sum(medians.values()) * 1000:>10.0f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Offline benchmark of the six chatbot variants.
+
+Each variant is loaded in its own process with ChatOpenAI replaced by a fake model, then
+N simulated sessions of M turns each are driven through `chat_agent.stream`, as the
+Streamlit apps do, from a pool of worker threads.
+
+Checkpointers:
+    --saver memory   Redis and MongoDB savers replaced by in-process InMemorySavers (default)
+    --saver local    the variants' own savers: Redis Stack on REDIS_HOST/REDIS_PORT, and MongoDB
+                     through mongomock (or MONGODB_URI with --mongo uri)
+                     (with CHECKPOINT_BACKEND=sqlite, variants 5 and 6 use a local SQLite file instead)
+
+Reported per variant: turns/sec, time to first token and turn latency percentiles,
+checkpoint bytes per session and resident memory per session. Workloads are
+deterministic for a given --seed (prompts, response sizes and per-prompt latencies), so
+results can be saved with --output and later compared with --baseline, which fails when
+throughput or p95 latency regress by more than --tolerance.
+
+Usage:
+    python benchmark/run_benchmark.py [--variants 1 2 3 4 5 6] [--sessions 50] [--turns 5]
+        [--concurrency 16] [--latency 0.05] [--latency-jitter 0.05] [--tokens-per-second 200]
+        [--response-words 60] [--saver memory|local] [--seed 42] [--output results.json]
+        [--baseline results.json] [--tolerance 0.15]
+"""
+import argparse
+import gc
+import importlib
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import standins
+
+RESULT_PREFIX = "BENCHMARK_RESULT "
+
+# -------------------- Measurements --------------------
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:  # Not Linux: fall back to the peak
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def percentile(samples: list, pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))]
+
+def play_turn(chat_agent, session: int, turn: int) -> tuple:
+    """Run one turn and return (time to first token, total time)."""
+    from langchain_core.messages import HumanMessage
+
+    config = {"configurable": {"thread_id": f"bench-{session}"}}
+    prompt = f"Session {session}, turn {turn}: tell me something I do not know yet."
+    start = time.perf_counter()
+    first_token = None
+    for chunk, metadata in chat_agent.stream({"messages": [HumanMessage(content=prompt)]},
+                                             config=config, stream_mode="messages"):
+        if first_token is None and metadata.get("langgraph_node") == "chatbot" and chunk.content:
+            first_token = time.perf_counter() - start
+    total = time.perf_counter() - start
+    return first_token if first_token is not None else total, total
+
+# -------------------- Worker: one variant per process --------------------
+def run_variant(args) -> dict:
+    variant = args.worker
+    variant_dir = standins.REPO_ROOT / standins.VARIANTS[variant]
+    os.chdir(variant_dir)
+    sys.path.insert(0, str(variant_dir))
+    os.environ.setdefault("OPENAI_API_KEY", "sk-offline-benchmark")
+
+    if args.saver == "memory":
+        standins.install_memory_savers(variant)
+    elif variant in standins.MONGO_VARIANTS and args.mongo == "mongomock":
+        standins.install_mongomock()
+
+    agent = importlib.import_module("agent")
+    standins.install_fake_llm(agent, args.latency, args.latency_jitter, args.tokens_per_second or None,
+                              args.response_words, args.seed)
+    chat_agent = agent.get_chat_agent()
+    saver = getattr(chat_agent, "checkpointer", None)
+
+    play_turn(chat_agent, -1, 0)  # Warm-up: lazy imports and connections
+    gc.collect()
+    rss_before = rss_bytes()
+    bytes_before = standins.checkpoint_bytes(saver) if saver else None
+
+    def session(index: int) -> list:
+        return [play_turn(chat_agent, index, turn) for turn in range(args.turns)]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        samples = [sample for result in pool.map(session, range(args.sessions)) for sample in result]
+    wall = time.perf_counter() - start
+
+    gc.collect()
+    bytes_after = standins.checkpoint_bytes(saver) if saver else None
+    ttft = [first for first, _ in samples]
+    total = [turn for _, turn in samples]
+    return {
+        "variant": standins.VARIANTS[variant],
+        "turns": len(samples),
+        "turns_per_sec": len(samples) / wall,
+        "ttft_p50": percentile(ttft, 50),
+        "ttft_p95": percentile(ttft, 95),
+        "latency_p50": percentile(total, 50),
+        "latency_p95": percentile(total, 95),
+        "latency_p99": percentile(total, 99),
+        "latency_mean": statistics.fmean(total),
+        "checkpoint_bytes_per_session": (
+            (bytes_after - bytes_before) / args.sessions if bytes_after is not None else None
+        ),
+        "rss_bytes_per_session": (rss_bytes() - rss_before) / args.sessions,
+    }
+
+# -------------------- Driver --------------------
+def spawn(variant: str, argv: list) -> dict:
+    env = {**os.environ, "PYTHONHASHSEED": "0"}
+    completed = subprocess.run([sys.executable, __file__, *argv, "--worker", variant],
+                               capture_output=True, text=True, env=env)
+    for line in completed.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    error = completed.stderr.strip().splitlines()
+    return {"variant": standins.VARIANTS[variant], "error": error[-1] if error else "no result"}
+
+def print_table(results: list):
+    print(f"{'variant':<34} {'turns/s':>9} {'ttft p50':>9} {'p50':>8} {'p95':>8} {'p99':>8} "
+          f"{'ckpt B/sess':>12} {'RSS B/sess':>11}")
+    for result in results:
+        if "error" in result:
+            print(f"{result['variant']:<34} failed: {result['error']}")
+            continue
+        checkpoint = result["checkpoint_bytes_per_session"]
+        checkpoint = f"{checkpoint:,.0f}" if checkpoint is not None else "-"
+        print(f"{result['variant']:<34} {result['turns_per_sec']:>9.1f} {result['ttft_p50'] * 1000:>7.1f}ms "
+              f"{result['latency_p50'] * 1000:>6.1f}ms {result['latency_p95'] * 1000:>6.1f}ms "
+              f"{result['latency_p99'] * 1000:>6.1f}ms {checkpoint:>12} "
+              f"{result['rss_bytes_per_session']:>11,.0f}")
+
+def regressions(results: list, baseline: list, tolerance: float) -> list:
+    previous = {result["variant"]: result for result in baseline if "error" not in result}
+    found = []
+    for result in results:
+        before = previous.get(result["variant"])
+        if before is None or "error" in result:
+            continue
+        if result["turns_per_sec"] < before["turns_per_sec"] * (1 - tolerance):
+            found.append(f"{result['variant']}: turns/sec {before['turns_per_sec']:.1f} -> {result['turns_per_sec']:.1f}")
+        if result["latency_p95"] > before["latency_p95"] * (1 + tolerance):
+            found.append(f"{result['variant']}: p95 {before['latency_p95'] * 1000:.1f}ms -> "
+                         f"{result['latency_p95'] * 1000:.1f}ms")
+    return found
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--variants", nargs="+", default=sorted(standins.VARIANTS), choices=sorted(standins.VARIANTS))
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=16, help="Worker threads driving sessions")
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake LLM latency to first token (s)")
+    parser.add_argument("--latency-jitter", type=float, default=0.05, help="Extra random latency, up to (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=200, help="Streaming rate, 0 = instant")
+    parser.add_argument("--response-words", type=int, default=60, help="Fake response size in words")
+    parser.add_argument("--saver", choices=["memory", "local"], default="memory")
+    parser.add_argument("--mongo", choices=["mongomock", "uri"], default="mongomock")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=Path, help="Write the results as JSON")
+    parser.add_argument("--baseline", type=Path, help="Compare against results saved with --output")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative regression")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if args.worker:
+        print(RESULT_PREFIX + json.dumps(run_variant(args)))
+        return
+
+    # Every worker process gets the same workload settings
+    results = [spawn(variant, sys.argv[1:]) for variant in args.variants]
+    print_table(results)
+    if args.output:
+        args.output.write_text(json.dumps({"settings": vars(args) | {"output": None, "baseline": None},
+                                           "results": results}, indent=2, default=str))
+    if args.baseline:
+        found = regressions(results, json.loads(args.baseline.read_text())["results"], args.tolerance)
+        for regression in found:
+            print("REGRESSION", regression)
+        sys.exit(1 if found else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Local stand-ins used by run_benchmark.py to load a chatbot variant without OpenAI and,
+optionally, without Redis or MongoDB.
+
+Everything here must be installed before the variant's `agent` module is imported.
+"""
+import importlib.util
+import os
+import sys
+import types
+from pathlib import Path
+
+from langgraph.checkpoint.memory import InMemorySaver
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+VARIANTS = {
+    "1": "1_Basic_AI_ChatBot",
+    "2": "2_Memory_AI_ChatBot",
+    "3": "3_Memory_Redis_AI_ChatBot",
+    "4": "4_Memory_Redis_TTL_AI_ChatBot",
+    "5": "5_Memory_MongoDB_TTL_AI_ChatBot",
+    "6": "6_User_Auth_AI_ChatBot",
+}
+REDIS_VARIANTS = {"3", "4", "6"}
+MONGO_VARIANTS = {"5"}
+
+# -------------------- Fake LLM --------------------
+def load_fake_chat_model():
+    """FakeChatModel from 6_User_Auth_AI_ChatBot/fake_llm.py, loaded without touching sys.path."""
+    spec = importlib.util.spec_from_file_location("bench_fake_llm", REPO_ROOT / VARIANTS["6"] / "fake_llm.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.FakeChatModel
+
+def install_fake_llm(agent, latency: float, latency_jitter: float, tokens_per_second: float | None,
+                     response_words: int, seed: int):
+    """
+    Replace the variant's ChatOpenAI instances (large and small models); nodes look them up
+    through get_llm() at call time.
+    """
+    fake = load_fake_chat_model()(
+        latency=latency, latency_jitter=latency_jitter, tokens_per_second=tokens_per_second,
+        response_words=response_words, seed=seed,
+    )
+    # Keep callbacks attached to the real model (e.g. metrics)
+    fake.callbacks = getattr(agent.get_llm(), "callbacks", None)
+    agent.llm = agent.small_llm = fake
+    return fake
+
+# -------------------- Checkpointer Stand-ins --------------------
+def install_memory_savers(variant: str):
+    """Serve the variant's Redis/Mongo checkpoint module from in-process InMemorySavers."""
+    if variant in REDIS_VARIANTS:
+        module = types.ModuleType("redis_checkpoint")
+        saver, async_saver = InMemorySaver(), InMemorySaver()
+        module.SESSION_TTL = 1
+        module.get_checkpoint_saver = lambda: saver
+        module.get_async_checkpoint_saver = lambda: async_saver
+        module.get_redis_client = lambda: None
+
+        async def setup_async_checkpoint_saver():
+            pass
+
+        module.setup_async_checkpoint_saver = setup_async_checkpoint_saver
+        module.redis_pool_stats = lambda: {}
+        module.checkpoint_cache_stats = lambda: {}
+        sys.modules["redis_checkpoint"] = module
+    elif variant in MONGO_VARIANTS:
+        module = types.ModuleType("mongo_checkpoint")
+        saver, async_saver = InMemorySaver(), InMemorySaver()
+        module.get_mongodb_memory = lambda: saver
+        module.get_async_mongodb_memory = lambda: async_saver
+        sys.modules["mongo_checkpoint"] = module
+
+def install_mongomock():
+    """Point pymongo.MongoClient at mongomock so the real MongoDB savers run in-process."""
+    import mongomock
+    import pymongo
+
+    def bulk_write(self, operations, **kwargs):
+        # mongomock does not understand the UpdateOne objects of recent pymongo releases
+        for operation in operations:
+            self.update_one(operation._filter, operation._doc, upsert=operation._upsert)
+
+    mongomock.collection.Collection.bulk_write = bulk_write
+    pymongo.MongoClient = mongomock.MongoClient
+    os.environ["MONGODB_URI"] = "mongodb://mongomock"
+
+# -------------------- Storage Accounting --------------------
+def _serialized_bytes(value) -> int:
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(_serialized_bytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_serialized_bytes(v) for v in value)
+    return 0
+
+def checkpoint_bytes(saver) -> int | None:
+    """Bytes held by a saver's checkpoints and writes, or None when it cannot be measured."""
+    while getattr(saver, "saver", None) is not None:  # Compaction / instrumentation wrappers
+        saver = saver.saver
+    if isinstance(saver, InMemorySaver):
+        return sum(_serialized_bytes(store) for store in (saver.storage, saver.writes, saver.blobs))
+    if hasattr(saver, "checkpoint_collection"):
+        import bson
+        return sum(
+            len(bson.encode(doc))
+            for collection in (saver.checkpoint_collection, saver.writes_collection)
+            for doc in collection.find()
+        )
+    if hasattr(saver, "_redis"):
+        keys = list(saver._redis.scan_iter(match="checkpoint*", count=1000))
+        return sum(saver._redis.memory_usage(key) or 0 for key in keys)
+    if hasattr(saver, "sweep_expired"):  # SQLiteSaver
+        connection = saver._connection()
+        return sum(connection.execute(query).fetchone()[0] or 0 for query in (
+            "SELECT SUM(LENGTH(checkpoint) + LENGTH(metadata)) FROM checkpoints",
+            "SELECT SUM(LENGTH(value)) FROM writes",
+        ))
+    return None